@@ -0,0 +1,70 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Measure the time of many independent calls sent one by one and with
+`BatchExecutor`, against a local stand-in server which delays its
+responses to emulate a round trip.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_batch.py [calls] [rtt_ms]
+"""
+
+import sys
+import time
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas.batch import BatchExecutor
+from qingcloud.iaas.connection import APIConnection
+
+
+class DelayHandler(LocalRequestHandler):
+    # seconds
+    rtt = 0.06
+
+    def do_GET(self):
+        time.sleep(self.rtt)
+        LocalRequestHandler.do_GET(self)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    DelayHandler.rtt = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.06
+    server = LocalHTTPServer(DelayHandler)
+    conn = APIConnection('access_key_id', 'secret_access_key', 'pek3a',
+                         host='127.0.0.1', port=server.port, protocol='http')
+    calls = [('modify_instance_attributes',
+              {'instance': 'i-%08x' % i, 'instance_name': 'web-%d' % i})
+             for i in range(count)]
+    try:
+        start = time.time()
+        for (action, kwargs) in calls:
+            getattr(conn, action)(**kwargs)
+        print('%-12s %8.2fs' % ('sequential', time.time() - start))
+        for workers in (4, 16, 32):
+            with BatchExecutor(conn, workers=workers) as executor:
+                executor.map(calls)
+                stats = executor.stats()
+            print('%-12s %8.2fs %8.1f calls/s  p50 %.0fms  p99 %.0fms' % (
+                'workers=%d' % workers, stats['elapsed'], stats['throughput'],
+                stats['latency_p50'] * 1000, stats['latency_p99'] * 1000))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Measure bytes on the wire and end-to-end latency of large describe
+responses with and without gzip, against a local stand-in server which
+throttles its writes to emulate a WAN link.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_compression.py [mbit_per_second]
+"""
+
+import sys
+import json
+import time
+import gzip
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas.connection import APIConnection
+
+
+def describe_instances_body(count):
+    instances = []
+    for i in range(count):
+        instances.append({
+            "instance_id": "i-%08x" % i,
+            "instance_name": "web-server-%d" % i,
+            "instance_type": "c1m1",
+            "status": "running",
+            "transition_status": "",
+            "create_time": "2016-01-01T00:00:00Z",
+            "status_time": "2016-01-01T00:00:00Z",
+            "image": {"image_id": "centos7x64", "platform": "linux",
+                      "os_family": "centos", "processor_type": "64bit"},
+            "vxnets": [{"vxnet_id": "vxnet-%07x" % (i % 64),
+                        "vxnet_name": "vxnet %d" % (i % 64),
+                        "private_ip": "192.168.%d.%d" % (i // 250 % 250,
+                                                         i % 250 + 2),
+                        "nic_id": "52:54:%02x:%02x:%02x:%02x" % (
+                            i >> 24 & 255, i >> 16 & 255, i >> 8 & 255,
+                            i & 255)}],
+            "security_group": {"is_default": 1,
+                               "security_group_id": "sg-0000000a"},
+            "memory_current": 1024, "vcpus_current": 1,
+            "description": None, "tags": [],
+        })
+    return json.dumps({"action": "DescribeInstancesResponse",
+                       "instance_set": instances, "ret_code": 0,
+                       "total_count": count}).encode()
+
+
+class DescribeHandler(LocalRequestHandler):
+    plain = b""
+    compressed = b""
+    # bytes per second, 0 for no throttling
+    bandwidth = 0
+    sent = []
+
+    def do_GET(self):
+        body = self.plain
+        self.send_response(200)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = self.compressed
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.sent.append(len(body))
+        step = 64 * 1024
+        for i in range(0, len(body), step):
+            self.wfile.write(body[i:i + step])
+            if self.bandwidth:
+                time.sleep(float(step) / self.bandwidth)
+
+
+def run(port, compress, requests):
+    conn = APIConnection('access_key_id', 'secret_access_key', 'pek3a',
+                         host='127.0.0.1', port=port, protocol='http',
+                         compress_response=compress)
+    DescribeHandler.sent = []
+    start = time.time()
+    for _ in range(requests):
+        ret = conn.describe_instances(verbose=1)
+        assert ret['ret_code'] == 0
+    elapsed = (time.time() - start) * 1000 / requests
+    return sum(DescribeHandler.sent) / len(DescribeHandler.sent), elapsed
+
+
+def main():
+    mbit = float(sys.argv[1]) if len(sys.argv) > 1 else 100
+    DescribeHandler.bandwidth = mbit * 1000 * 1000 / 8
+    server = LocalHTTPServer(DescribeHandler)
+    print('link: %.0f Mbit/s' % mbit)
+    print('%-10s %8s %14s %14s %14s' % ('instances', 'gzip', 'wire bytes',
+                                        'json bytes', 'ms / request'))
+    for count in (1000, 5000, 20000):
+        DescribeHandler.plain = describe_instances_body(count)
+        DescribeHandler.compressed = gzip.compress(DescribeHandler.plain)
+        for compress in (False, True):
+            wire, elapsed = run(server.port, compress, 5)
+            print('%-10d %8s %14d %14d %14.1f' % (
+                count, compress, wire, len(DescribeHandler.plain), elapsed))
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
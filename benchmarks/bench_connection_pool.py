@@ -0,0 +1,137 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Compare get/put throughput of the connection pool with the former
+list based `ConnectionQueue`.
+
+    PYTHONPATH=. python benchmarks/bench_connection_pool.py [ops_per_thread]
+"""
+
+import sys
+import time
+import threading
+
+from qingcloud.conn.connection import ConnectionQueue, ConnectionPool
+
+
+class ListConnectionQueue(ConnectionQueue):
+    """ The list based queue used before, kept here for comparison.
+    """
+
+    def __init__(self, timeout=60, maxsize=None):
+        self.queue = []
+        self.timeout = timeout
+
+    def get_conn(self):
+        for _ in range(len(self.queue)):
+            (conn, _) = self.queue.pop(0)
+            if self._is_conn_ready(conn):
+                return conn
+            else:
+                self.put_conn(conn)
+
+    def put_conn(self, conn):
+        self.queue.append((conn, time.time()))
+
+    def clear(self):
+        count = 0
+        while self.queue and self._is_conn_expired(self.queue[0]):
+            self.queue.pop(0)
+            count += 1
+        return count
+
+
+class ListConnectionPool(object):
+    """ The pool used before, with one lock for all hosts.
+    """
+
+    CLEAR_INTERVAL = 5.0
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+        self.last_clear_time = time.time()
+        self.lock = threading.Lock()
+        self.pool = {}
+
+    def put_conn(self, host, port, conn):
+        with self.lock:
+            queue = self.pool.setdefault((host, port),
+                                         ListConnectionQueue(self.timeout))
+            queue.put_conn(conn)
+
+    def get_conn(self, host, port):
+        self._clear()
+        with self.lock:
+            key = (host, port)
+            if key in self.pool:
+                return self.pool[key].get_conn()
+
+    def _clear(self):
+        with self.lock:
+            curr_time = time.time()
+            if self.last_clear_time + self.CLEAR_INTERVAL > curr_time:
+                return
+            for key in list(self.pool):
+                self.pool[key].clear()
+                if self.pool[key].size() == 0:
+                    del self.pool[key]
+            self.last_clear_time = curr_time
+
+
+class FakeConn(object):
+
+    def close(self):
+        pass
+
+
+def run(pool_factory, threads, ops):
+    pool = pool_factory()
+    # a warm pool with some idle connections to scan through
+    for _ in range(threads * 4):
+        pool.put_conn('api.qingcloud.com', 443, FakeConn())
+
+    def worker():
+        for _ in range(ops):
+            conn = pool.get_conn('api.qingcloud.com', 443) or FakeConn()
+            pool.put_conn('api.qingcloud.com', 443, conn)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.time()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.time() - start
+    return threads * ops / elapsed
+
+
+def main():
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print('%-8s %14s %14s %14s %8s' % ('threads', 'list (ops/s)',
+                                       'deque (ops/s)', 'reaper (ops/s)',
+                                       'speedup'))
+    for threads in (1, 8, 64):
+        n = ops // threads or 1
+        before = run(ListConnectionPool, threads, n)
+        after = run(ConnectionPool, threads, n)
+        reaper = run(lambda: ConnectionPool(reaper=True), threads, n)
+        print('%-8d %14.0f %14.0f %14.0f %7.2fx' % (
+            threads, before, after, reaper, max(after, reaper) / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Measure the startup cost of `APIConnection`: the time to import
+`qingcloud.iaas` and call one action in a fresh interpreter, and the
+time to construct a connection, with the action classes loaded lazily
+and eagerly as before.
+
+    PYTHONPATH=. python benchmarks/bench_construction.py [runs]
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+from qingcloud.iaas.connection import APIConnection
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY = """
+import qingcloud.iaas
+conn = qingcloud.iaas.connect_to_zone('pek3a', 'key', 'secret')
+conn.describe_instances
+"""
+
+# all action modules imported and instantiated as before
+EAGER = LAZY + """
+conn.actions
+"""
+
+
+class EagerAPIConnection(APIConnection):
+
+    def __init__(self, *args, **kwargs):
+        super(EagerAPIConnection, self).__init__(*args, **kwargs)
+        self.actions
+
+
+def startup_ms(code, runs):
+    best = None
+    for _ in range(runs):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', code], cwd=ROOT)
+        elapsed = (time.time() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def construct_us(connection_class, runs):
+    start = time.time()
+    for _ in range(runs):
+        connection_class('access_key_id', 'secret_access_key', 'pek3a')
+    return (time.time() - start) * 1e6 / runs
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print('%-36s %12s %12s' % ('', 'eager', 'lazy'))
+    print('%-36s %12.1f %12.1f' % (
+        'interpreter startup + first call (ms)',
+        startup_ms(EAGER, runs), startup_ms(LAZY, runs)))
+    print('%-36s %12.1f %12.1f' % (
+        'APIConnection() (us)',
+        construct_us(EagerAPIConnection, runs * 1000),
+        construct_us(APIConnection, runs * 1000)))
+
+
+if __name__ == '__main__':
+    main()
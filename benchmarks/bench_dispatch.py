@@ -0,0 +1,69 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Measure the overhead of looking up an action method on `APIConnection`
+for a method of each action class, against the former linear search
+through `actions`.
+
+    PYTHONPATH=. python benchmarks/bench_dispatch.py [lookups]
+"""
+
+import sys
+import time
+
+from qingcloud.iaas.connection import APIConnection
+from qingcloud.iaas.errors import InvalidAction
+
+
+class LinearAPIConnection(APIConnection):
+    """ The lookup used before, kept here for comparison.
+    """
+
+    def __getattr__(self, attr):
+        for action in self.actions:
+            if hasattr(action, attr):
+                return getattr(action, attr)
+        raise InvalidAction(attr)
+
+
+def ns_per_lookup(conn, name, lookups):
+    start = time.time()
+    for _ in range(lookups):
+        getattr(conn, name)
+    return (time.time() - start) * 1e9 / lookups
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    args = ('access_key_id', 'secret_access_key', 'pek3a')
+    linear = LinearAPIConnection(*args)
+    conn = APIConnection(*args)
+
+    print('%-22s %-34s %12s %12s %8s' % ('action class', 'method',
+                                         'linear (ns)', 'table (ns)',
+                                         'speedup'))
+    for action in conn.actions:
+        name = sorted(n for n in dir(action)
+                      if not n.startswith('_') and n != 'conn')[0]
+        before = ns_per_lookup(linear, name, lookups)
+        after = ns_per_lookup(conn, name, lookups)
+        print('%-22s %-34s %12.0f %12.0f %7.2fx' % (
+            type(action).__name__, name, before, after, before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Compare the response handling of `APIConnection.send_request` before
+and after it parsed responses once, straight from bytes, on a 5MB
+describe_instances payload, with each JSON backend installed.
+
+    PYTHONPATH=. python benchmarks/bench_json.py [runs]
+"""
+
+import sys
+import time
+import json
+import tracemalloc
+
+from bench_compression import describe_instances_body
+from qingcloud.misc import json_tool
+from qingcloud.misc.json_tool import json_load
+
+
+def before(body):
+    # decoded to str, parsed to check ret_code then parsed again
+    resp_str = body.decode()
+    if resp_str and json.loads(resp_str).get("ret_code") in (5000, 5100):
+        pass
+    return json.loads(resp_str)
+
+
+def after(body):
+    resp = json_load(body)
+    if body and resp.get("ret_code") in (5000, 5100):
+        pass
+    return resp
+
+
+def measure(func, body, runs):
+    best = None
+    for _ in range(runs):
+        start = time.time()
+        func(body)
+        elapsed = (time.time() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    func(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 1024.0 / 1024
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    # grow the result set up to a 5MB payload
+    count = int(5 * 1024 * 1024 / len(describe_instances_body(100)) * 100)
+    body = describe_instances_body(count)
+    print('payload: %.1f MB, %d instances' % (len(body) / 1024.0 / 1024,
+                                              count))
+    print('%-28s %10s %14s' % ('', 'ms', 'peak MB'))
+    print('%-28s %10.1f %14.1f' % (('before (json)', ) +
+                                   measure(before, body, runs)))
+    for name in json_tool.BACKENDS:
+        try:
+            json_tool.set_json_backend(name)
+        except ImportError:
+            print('%-28s %25s' % ('after (%s)' % name, 'not installed'))
+            continue
+        print('%-28s %10.1f %14.1f' % (('after (%s)' % name, ) +
+                                       measure(after, body, runs)))
+
+
+if __name__ == '__main__':
+    main()
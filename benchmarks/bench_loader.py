@@ -0,0 +1,101 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Measure many threads looking up instances one ID at a time, with
+`describe_instances` per ID and with a `ResourceLoader`, against a local
+stand-in server which delays its responses to emulate a round trip.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_loader.py [lookups] [threads] [rtt_ms]
+"""
+
+import sys
+import json
+import time
+import threading
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas.connection import APIConnection
+
+
+class InstancesHandler(LocalRequestHandler):
+    # seconds
+    rtt = 0.06
+    requests = 0
+
+    def do_GET(self):
+        InstancesHandler.requests += 1
+        params = parse_qs(urlparse(self.path).query)
+        instances = [{"instance_id": value[0], "status": "running"}
+                     for (key, value) in sorted(params.items())
+                     if key.startswith('instances.')]
+        body = json.dumps({"action": "DescribeInstancesResponse",
+                           "ret_code": 0, "total_count": len(instances),
+                           "instance_set": instances}).encode()
+        time.sleep(self.rtt)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run(lookup, lookups, threads):
+    ids = ['i-%08x' % i for i in range(lookups)]
+
+    def worker(n):
+        for instance_id in ids[n::threads]:
+            assert lookup(instance_id)['instance_id'] == instance_id
+
+    workers = [threading.Thread(target=worker, args=(n, ))
+               for n in range(threads)]
+    start = time.time()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.time() - start
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    InstancesHandler.rtt = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.06
+    server = LocalHTTPServer(InstancesHandler)
+    conn = APIConnection('access_key_id', 'secret_access_key', 'pek3a',
+                         host='127.0.0.1', port=server.port, protocol='http')
+    loader = conn.loader('describe_instances', window=0.01)
+    try:
+        print('%-16s %8s %9s' % ('mode', 'seconds', 'requests'))
+        for name, lookup in (
+                ('per id', lambda instance_id: conn.describe_instances(
+                    instances=[instance_id])['instance_set'][0]),
+                ('loader', loader.load)):
+            InstancesHandler.requests = 0
+            elapsed = run(lookup, lookups, threads)
+            print('%-16s %8.2f %9d' % (name, elapsed,
+                                       InstancesHandler.requests))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Measure the time to list every instance with `APIConnection.paginate`,
+page by page and with pages requested concurrently, against a local
+stand-in server which delays its responses to emulate a round trip.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_paginate.py [instances] [rtt_ms]
+"""
+
+import sys
+import json
+import time
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas.connection import APIConnection
+
+
+class PagesHandler(LocalRequestHandler):
+    instances = []
+    # seconds
+    rtt = 0.06
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        offset = int(params['offset'][0])
+        limit = min(int(params['limit'][0]), 100)
+        body = json.dumps({
+            "action": "DescribeInstancesResponse", "ret_code": 0,
+            "total_count": len(self.instances),
+            "instance_set": self.instances[offset:offset + limit],
+        }).encode()
+        time.sleep(self.rtt)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    PagesHandler.rtt = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.06
+    PagesHandler.instances = [{"instance_id": "i-%08x" % i,
+                               "status": "running"} for i in range(count)]
+    server = LocalHTTPServer(PagesHandler)
+    try:
+        print('%-24s %10s %12s' % ('mode', 'seconds', 'instances'))
+        for (workers, ordered) in ((1, True), (4, True), (16, True),
+                                   (16, False)):
+            conn = APIConnection('access_key_id', 'secret_access_key',
+                                 'pek3a', host='127.0.0.1',
+                                 port=server.port, protocol='http')
+            start = time.time()
+            listed = sum(1 for _ in conn.paginate(
+                'describe_instances', page_size=100, workers=workers,
+                ordered=ordered))
+            mode = 'workers=%d%s' % (workers, '' if ordered else ' unordered')
+            print('%-24s %10.2f %12d' % (mode, time.time() - start, listed))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
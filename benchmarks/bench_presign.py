@@ -0,0 +1,64 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Compare presigning QingStor urls one by one with `get_auth_parameters`
+against `Bucket.generate_presigned_urls`, which signs them in bulk.
+
+    PYTHONPATH=. python benchmarks/bench_presign.py
+"""
+
+import time
+
+from qingcloud.qingstor.connection import QSConnection
+
+
+def one_by_one(conn, bucket, keys, expires):
+    # the way urls were presigned before, one signature per call
+    handler = conn._auth_handler
+    base = "https://%s" % conn.style_format.build_host(conn.host, bucket)
+    urls = []
+    for key in keys:
+        params = handler.get_auth_parameters(
+            "GET", conn.style_format.build_auth_path(bucket, key), expires)
+        urls.append("%s%s?%s" % (base,
+                                 conn.style_format.build_path_base(bucket, key),
+                                 conn._build_params(params)))
+    return urls
+
+
+def main():
+    conn = QSConnection("access_key_id", "secret_access_key")
+    bucket = conn.get_bucket("mybucket", validate=False)
+    print('%-8s %16s %16s %8s' % ('keys', 'single (url/s)', 'batch (url/s)',
+                                  'speedup'))
+    for count in (10000, 100000):
+        keys = ["photos/2016/%08d.jpg" % i for i in range(count)]
+
+        start = time.time()
+        one_by_one(conn, bucket.name, keys, 3600)
+        before = count / (time.time() - start)
+
+        start = time.time()
+        bucket.generate_presigned_urls(keys, 3600)
+        after = count / (time.time() - start)
+
+        print('%-8d %16.0f %16.0f %7.2fx' % (count, before, after,
+                                             after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Measure the SERVER BUSY responses and the failed calls of many threads
+calling a local stand-in server which accepts a limited rate of
+requests, with and without a shared `RateLimiter`.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_ratelimit.py [threads] [server_rate]
+"""
+
+import sys
+import time
+import threading
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas.connection import APIConnection
+from qingcloud.iaas.ratelimit import RateLimiter, TokenBucket
+
+
+class BusyHandler(LocalRequestHandler):
+    """Answer with ret_code 5100 above the rate of `bucket`."""
+    bucket = None
+    busy = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        body = b'{"ret_code":0}'
+        with self.lock:
+            # a token is taken only when available
+            if self.bucket.reserve():
+                self.bucket.tokens += 1
+                BusyHandler.busy += 1
+                body = b'{"ret_code":5100}'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run(server, threads, calls, limiter):
+    BusyHandler.busy = 0
+    failed = []
+
+    def worker():
+        conn = APIConnection('access_key_id', 'secret_access_key', 'pek3a',
+                             host='127.0.0.1', port=server.port,
+                             protocol='http', rate_limiter=limiter)
+        for _ in range(calls):
+            resp = conn.describe_instances()
+            if resp['ret_code']:
+                failed.append(resp)
+
+    start = time.time()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.time() - start, BusyHandler.busy, len(failed)
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    calls = 20
+    server = LocalHTTPServer(BusyHandler)
+    try:
+        print('%-22s %8s %8s %8s' % ('mode', 'seconds', '5100', 'failed'))
+        for name, limiter in (
+                ('no limiter', None),
+                ('static limiter', RateLimiter(rate=rate, decrease=1)),
+                ('adaptive limiter', RateLimiter(rate=rate * 2))):
+            BusyHandler.bucket = TokenBucket(rate)
+            elapsed, busy, failed = run(server, threads, calls, limiter)
+            print('%-22s %8.2f %8d %8d' % (name, elapsed, busy, failed))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
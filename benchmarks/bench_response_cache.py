@@ -0,0 +1,70 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Measure repeated identical describe calls with and without a
+`ResponseCache`, against a local stand-in server which delays its
+responses to emulate a round trip.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_response_cache.py [calls] [rtt_ms]
+"""
+
+import sys
+import time
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas.cache import ResponseCache
+from qingcloud.iaas.connection import APIConnection
+
+
+class DelayHandler(LocalRequestHandler):
+    # seconds
+    rtt = 0.06
+    body = b'{"action":"DescribeZonesResponse","ret_code":0,"total_count":3,' \
+        b'"zone_set":[{"zone_id":"pek3a","status":"active"},' \
+        b'{"zone_id":"sh1a","status":"active"},' \
+        b'{"zone_id":"gd2","status":"active"}]}'
+
+    def do_GET(self):
+        time.sleep(self.rtt)
+        LocalRequestHandler.do_GET(self)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    DelayHandler.rtt = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.06
+    server = LocalHTTPServer(DelayHandler)
+    try:
+        for response_cache in (None, ResponseCache(ttl=60)):
+            conn = APIConnection('access_key_id', 'secret_access_key',
+                                 'pek3a', host='127.0.0.1', port=server.port,
+                                 protocol='http', response_cache=response_cache)
+            start = time.time()
+            for _ in range(calls):
+                conn.describe_zones()
+            elapsed = time.time() - start
+            print('%-10s %8.3fs %10.0fus/call %s' % (
+                'cache' if response_cache else 'no cache', elapsed,
+                elapsed * 1e6 / calls,
+                response_cache.stats() if response_cache else ''))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Compare `_calc_signature` and `add_auth` of `QuerySignatureAuthHandler`
+with the former signer, which quoted every key and value on each call
+and url-encoded POST bodies a second time.
+
+    PYTHONPATH=. python benchmarks/bench_signer.py [seconds_per_case]
+"""
+
+import sys
+import time
+
+try:
+    import urllib.parse as urllib
+except ImportError:
+    import urllib
+
+from qingcloud.conn.auth import QuerySignatureAuthHandler
+from qingcloud.conn.connection import HTTPRequest
+from qingcloud.misc.utils import get_utf8_value, get_ts
+
+
+class LegacySignatureAuthHandler(QuerySignatureAuthHandler):
+    """ The signer used before, kept here for comparison.
+    """
+
+    def _calc_signature(self, params, verb, path):
+        string_to_sign = '%s\n%s\n' % (verb, path)
+        params['signature_method'] = self.algorithm()
+        keys = sorted(params.keys())
+        pairs = []
+        for key in keys:
+            val = get_utf8_value(params[key])
+            key = key.encode()
+            pairs.append(urllib.quote(key, safe='') + '=' +
+                         urllib.quote(val, safe='-_~'))
+        qs = '&'.join(pairs)
+        string_to_sign += qs
+        b64 = self.sign_string(string_to_sign)
+        return (qs, b64)
+
+    def add_auth(self, req, **kwargs):
+        req.params['access_key_id'] = self.qy_access_key_id
+        req.params['signature_version'] = self.SignatureVersion
+        req.params['version'] = self.APIVersion
+        req.params['time_stamp'] = get_ts()
+        qs, signature = self._calc_signature(req.params, req.method,
+                                             req.auth_path)
+        if req.method == 'POST':
+            params = req.params.copy()
+            params["signature"] = signature
+            req.body = urllib.urlencode(params)
+        else:
+            req.body = ''
+            req.params["signature"] = signature
+            req.path = req.path.split('?')[0]
+            req.path = (req.path + '?' + qs +
+                        '&signature=' + urllib.quote_plus(signature))
+
+
+def small_params():
+    return {'action': 'DescribeInstances', 'zone': 'pek3a',
+            'instances.1': 'i-12345678', 'verbose': 1}
+
+
+def medium_params():
+    params = {'action': 'RunInstances', 'zone': 'pek3a',
+              'image_id': 'centos7x64', 'instance_type': 'c1m1',
+              'instance_name': 'web server', 'count': 1,
+              'login_mode': 'passwd', 'login_passwd': 'Passw0rd@()',
+              'security_group': 'sg-12345678', 'need_userdata': 0}
+    for i in range(1, 11):
+        params['vxnets.%d' % i] = 'vxnet-%07d' % i
+    return params
+
+
+def list_params():
+    params = {'action': 'DescribeInstances', 'zone': 'pek3a'}
+    for i in range(1, 1001):
+        params['instances.%d' % i] = 'i-%08x' % i
+    return params
+
+
+def rate(func, seconds):
+    count = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        for _ in range(10):
+            func()
+        count += 10
+    return count / (time.time() - start)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    args = ('api.qingcloud.com', 'access_key_id', 'secret_access_key')
+    legacy = LegacySignatureAuthHandler(*args)
+    handler = QuerySignatureAuthHandler(*args)
+
+    print('%-32s %14s %14s %8s' % ('case', 'legacy (op/s)', 'fast (op/s)',
+                                   'speedup'))
+    for name, make_params in (('small', small_params),
+                              ('medium', medium_params),
+                              ('1000-item list', list_params)):
+        params = make_params()
+
+        def calc(signer):
+            return lambda: signer._calc_signature(dict(params), 'GET',
+                                                  '/iaas/')
+
+        def auth(signer, method):
+            return lambda: signer.add_auth(HTTPRequest(
+                method, 'https', {}, 'api.qingcloud.com', 443, '/iaas/',
+                dict(params)))
+
+        for case, before, after in (
+                ('_calc_signature', calc(legacy), calc(handler)),
+                ('add_auth GET', auth(legacy, 'GET'), auth(handler, 'GET')),
+                ('add_auth POST', auth(legacy, 'POST'),
+                 auth(handler, 'POST'))):
+            before = rate(before, seconds)
+            after = rate(after, seconds)
+            print('%-32s %14.0f %14.0f %7.2fx' % (
+                '%s %s' % (name, case), before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Measure many threads calling the same describe action at once, with and
+without coalescing the identical requests in flight, against a local
+stand-in server which delays its responses to emulate a round trip.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_singleflight.py [threads] [rtt_ms]
+"""
+
+import sys
+import time
+import threading
+
+from bench_compression import describe_instances_body
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas.connection import APIConnection
+
+
+class DelayHandler(LocalRequestHandler):
+    # seconds
+    rtt = 0.06
+    requests = 0
+
+    def do_GET(self):
+        DelayHandler.requests += 1
+        time.sleep(self.rtt)
+        LocalRequestHandler.do_GET(self)
+
+
+def run(conn, threads):
+    barrier = threading.Barrier(threads)
+
+    def describe():
+        barrier.wait()
+        conn.describe_instances(instances=['i-00000001'], verbose=1)
+
+    workers = [threading.Thread(target=describe) for _ in range(threads)]
+    start = time.time()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.time() - start
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    DelayHandler.rtt = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.06
+    DelayHandler.body = describe_instances_body(500)
+    server = LocalHTTPServer(DelayHandler)
+    try:
+        print('%-16s %8s %9s' % ('mode', 'seconds', 'requests'))
+        for single_flight in (None, True):
+            conn = APIConnection('access_key_id', 'secret_access_key',
+                                 'pek3a', host='127.0.0.1', port=server.port,
+                                 protocol='http', single_flight=single_flight)
+            DelayHandler.requests = 0
+            elapsed = run(conn, threads)
+            print('%-16s %8.3f %9d' % (
+                'single flight' if single_flight else 'no coalescing',
+                elapsed, DelayHandler.requests))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Measure the cost of opening a new https connection per request against a
+local TLS stand-in server:
+
+    - a new SSL context and a full handshake for every connection (before)
+    - a shared SSL context with full handshakes
+    - a shared SSL context resuming TLS sessions
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_tls_handshake.py [requests]
+"""
+
+import ssl
+import sys
+import time
+try:
+    import httplib
+except:
+    import http.client as httplib
+
+from tests import LOCALHOST_PEM, LocalHTTPServer, LocalRequestHandler
+from qingcloud.conn.connection import HttpConnection
+
+
+def run(new_conn, port, requests):
+    resumed = 0
+    start = time.time()
+    for _ in range(requests):
+        conn = new_conn('localhost', port)
+        conn.request('GET', '/')
+        conn.getresponse().read()
+        resumed += conn.sock.session_reused
+        conn.close()
+    return (time.time() - start) * 1000 / requests, resumed
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    server = LocalHTTPServer(LocalRequestHandler, tls=True)
+
+    def per_connection_context(host, port):
+        context = ssl.create_default_context(cafile=LOCALHOST_PEM)
+        return httplib.HTTPSConnection(host, port, context=context)
+
+    context = ssl.create_default_context(cafile=LOCALHOST_PEM)
+    shared = HttpConnection(None, None, 'localhost', server.port,
+                            ssl_context=context, tls_session_cache=False)
+    resuming = HttpConnection(None, None, 'localhost', server.port,
+                              ssl_context=context)
+
+    print('%-28s %14s %10s' % ('mode', 'ms / request', 'resumed'))
+    for name, new_conn in [('context per connection', per_connection_context),
+                           ('shared context', shared._new_conn),
+                           ('shared context + sessions', resuming._new_conn)]:
+        cost, resumed = run(new_conn, server.port, requests)
+        print('%-28s %14.3f %10d' % (name, cost, resumed))
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -14,4 +14,5 @@
 # limitations under the License.
 # =========================================================================
 
-__import__('pkg_resources').declare_namespace(__name__)
+# pkgutil-style namespace package, importing pkg_resources is too slow
+__path__ = __import__('pkgutil').extend_path(__path__, __name__)
@@ -0,0 +1,297 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+HTTP/1.1 transport on top of asyncio streams.
+"""
+
+import asyncio
+import errno
+import socket
+
+from qingcloud.conn.connection import (ConnectionPool, ConnectionQueue,
+                                       ContentDecoder, HttpConnection)
+
+
+class AsyncConnection(object):
+    """ A keep-alive connection made of an asyncio stream pair
+    """
+
+    def __init__(self, host, port, reader, writer):
+        self.host = host
+        self.port = port
+        self.reader = reader
+        self.writer = writer
+
+    def is_ready(self):
+        return not (self.writer.is_closing() or self.reader.at_eof())
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionQueue(ConnectionQueue):
+
+    def _is_conn_ready(self, conn):
+        return conn.is_ready()
+
+
+class AsyncConnectionPool(ConnectionPool):
+    """ Pool of `AsyncConnection` for multiple hosts.
+        Streams are bound to their event loop, so a pool must only be
+        used by connections running in the same loop.
+    """
+
+    queue_class = AsyncConnectionQueue
+
+    def __init__(self, timeout=60, max_idle_per_host=None, max_idle=None):
+        # a reaper thread can not close streams of the event loop
+        super(AsyncConnectionPool, self).__init__(
+            timeout, max_idle_per_host, max_idle, reaper=False)
+
+
+class AsyncHTTPResponse(object):
+    """ Response read by `AsyncHttpConnection.send`, the body is fully
+        read before the connection is put back into the pool.
+    """
+
+    def __init__(self, status, reason, headers, body=b""):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.length = len(body)
+
+    def getheader(self, name, default=None):
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return default
+
+    def getheaders(self):
+        return self.headers
+
+    async def read(self):
+        return self.body
+
+
+class AsyncHttpConnection(HttpConnection):
+    """ Connection control to restful service with an asyncio transport.
+        `send` is a coroutine and never blocks the event loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Accept the parameters of the connection class it's mixed with, and
+
+        @param async_pool - the `AsyncConnectionPool`
+        """
+        async_pool = kwargs.pop('async_pool', None)
+        super(AsyncHttpConnection, self).__init__(*args, **kwargs)
+        self._async_conn = async_pool or AsyncConnectionPool()
+
+    def set_proxy(self, host, port=None, headers=None, protocol="http"):
+        """ set http proxy, see `HttpConnection.set_proxy`,
+            https proxies (CONNECT tunnels) are not supported
+        """
+        if protocol == "https":
+            raise ValueError(
+                "https proxy is not supported by the asyncio transport")
+        super(AsyncHttpConnection, self).set_proxy(host, port, headers,
+                                                   protocol)
+
+    async def _get_async_conn(self, host, port):
+        """ Get connection from async pool
+        """
+        conn = self._async_conn.get_conn(host, port)
+        if conn is None:
+            conn = await self._new_async_conn(host, port)
+            self._async_conn.record(host, port, 'created')
+        return conn
+
+    async def _new_async_conn(self, host, port):
+        """ Open new connection
+        """
+        ssl_context = self.ssl_context if self.secure else None
+        addrs = [host]
+        if self.dns_cache is not None:
+            loop = asyncio.get_running_loop()
+            addrs = await loop.run_in_executor(None, self.dns_cache.resolve,
+                                               host, port)
+            addrs = [addr[4][0] for addr in addrs]
+        err = None
+        for addr in addrs:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(
+                        addr, port, ssl=ssl_context,
+                        server_hostname=host if ssl_context else None),
+                    self.http_socket_timeout)
+                break
+            except (OSError, asyncio.TimeoutError) as e:
+                err = e
+        else:
+            if self.dns_cache is not None:
+                self.dns_cache.invalidate(host)
+            raise err
+        self._set_socket_options(writer.get_extra_info('socket'))
+        return AsyncConnection(host, port, reader, writer)
+
+    def _set_socket_options(self, sock):
+        if sock is None:
+            return
+        for (level, optname, value) in self.socket_options or ():
+            try:
+                sock.setsockopt(level, optname, value)
+            except (OSError, socket.error) as e:
+                if e.errno != errno.ENOPROTOOPT:
+                    raise
+
+    async def send(self, method, path, params=None, headers=None, host=None,
+                   auth_path=None, data=""):
+        if not host:
+            host = self.host
+
+        await self._fetch_credentials()
+        request, conn_host, conn_port, request_path = self._build_request(
+            method, path, params, headers, host, auth_path, data)
+
+        conn = await self._get_async_conn(conn_host, conn_port)
+        try:
+            conn.writer.write(self._encode_request(
+                method, request_path, request.body, request.header, host))
+            response, keep_alive = await asyncio.wait_for(
+                self._read_response(conn.reader, method),
+                self.http_socket_timeout)
+        except BaseException:
+            conn.close()
+            raise
+
+        # Reuse the connection
+        if response.status < 500 and keep_alive:
+            self._async_conn.put_conn(conn_host, conn_port, conn)
+        else:
+            conn.close()
+            if response.status >= 500:
+                self._async_conn.record(conn_host, conn_port, 'dropped')
+
+        return response
+
+    async def _fetch_credentials(self):
+        """ Fetch the IAM credentials in a thread of the executor if getting
+            them from the provider would block the event loop
+        """
+        provider = self.credential_provider
+        if provider is None or self.qy_access_key_id or \
+                self.qy_secret_access_key:
+            return
+        if provider.would_block():
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, provider.get_credentials)
+
+    def _check_token(self):
+        # called by `_build_request` on the event loop, the credentials
+        # were fetched by `_fetch_credentials`, so take them as they are
+        if self.credential_provider is not None:
+            self._set_credentials(self.credential_provider.credentials)
+
+    def _encode_request(self, method, path, body, headers, host):
+        if body is None:
+            body = b""
+        elif not isinstance(body, bytes):
+            body = body.encode("utf-8")
+        headers = dict(headers or {})
+        if "Host" not in headers:
+            port = self.port
+            if port == (443 if self.secure else 80):
+                headers["Host"] = host
+            else:
+                headers["Host"] = "%s:%s" % (host, port)
+        if body or method in ("POST", "PUT"):
+            headers["Content-Length"] = str(len(body))
+        lines = ["%s %s HTTP/1.1" % (method, path)]
+        lines.extend("%s: %s" % (key, value) for key, value in headers.items())
+        head = "\r\n".join(lines) + "\r\n\r\n"
+        return head.encode("latin-1") + body
+
+    async def _read_response(self, reader, method):
+        """ Read the response
+            @return (response, whether the connection can be reused)
+        """
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("Remote end closed connection "
+                                      "without response")
+            version, status, reason = (line.decode("latin-1").rstrip("\r\n")
+                                       .split(" ", 2) + [""])[:3]
+            status = int(status)
+            headers = []
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers.append((key.strip(), value.strip()))
+            # skip informational responses
+            if status >= 200 or status == 101:
+                break
+
+        response = AsyncHTTPResponse(status, reason, headers)
+        connection = (response.getheader("Connection") or "").lower()
+        if version == "HTTP/1.0":
+            keep_alive = connection == "keep-alive"
+        else:
+            keep_alive = connection != "close"
+
+        if method == "HEAD" or status in (204, 304) or status < 200:
+            body = b""
+        elif (response.getheader("Transfer-Encoding") or "").lower() == "chunked":
+            body = await self._read_chunked(reader)
+        elif response.getheader("Content-Length") is not None:
+            body = await reader.readexactly(
+                int(response.getheader("Content-Length")))
+        else:
+            body = await reader.read()
+            keep_alive = False
+
+        encoding = (response.getheader("Content-Encoding") or "").lower()
+        if self.compress_response and encoding in ContentDecoder.ENCODINGS:
+            decoder = ContentDecoder(encoding)
+            body = decoder.decompress(body) + decoder.flush()
+
+        response.body = body
+        response.length = len(body)
+        return response, keep_alive
+
+    async def _read_chunked(self, reader):
+        chunks = []
+        while True:
+            line = await reader.readline()
+            size = int(line.split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                # skip trailers
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    async def close(self):
+        """ Close all idle connections of the async pool
+        """
+        self._async_conn.close()
@@ -14,6 +14,7 @@
 # limitations under the License.
 # =========================================================================
 
+import re
 import sys
 import hmac
 import base64
@@ -38,6 +39,36 @@ QSA_TO_SIGN = [
     "acl", "cors", "delete", "policy", "stats", "part_number", "uploads", "upload_id"
 ]
 
+# values made of these characters are left as is by `urllib.quote`
+UNRESERVED_RE = re.compile(r'[A-Za-z0-9_.~-]*\Z')
+
+# maximum number of quoted parameter names kept by `quote_key`
+QUOTED_KEYS_MAXSIZE = 4096
+_quoted_keys = {}
+
+
+def quote_key(key):
+    """ Percent-quote the name of a request parameter, memoized as the names
+        come from a small set ('action', 'zone', 'instances.1', ...)
+    """
+    quoted = _quoted_keys.get(key)
+    if quoted is None:
+        if len(_quoted_keys) >= QUOTED_KEYS_MAXSIZE:
+            _quoted_keys.clear()
+        quoted = urllib.quote(key.encode() if is_python3 else key, safe='')
+        _quoted_keys[key] = quoted
+    return quoted
+
+
+def quote_value(value):
+    """ Percent-quote the value of a request parameter
+    """
+    value = get_utf8_value(value)
+    if UNRESERVED_RE.match(value):
+        return value
+    return urllib.quote(value, safe='-_~')
+
+
 class HmacKeys(object):
     """ Key based Auth handler helper.
     """
@@ -68,15 +99,21 @@ class HmacKeys(object):
         else:
             return 'HmacSHA1'
 
-    def digest(self, string_to_digest):
+    def new_hmac(self, string_to_digest=None):
+        """ Get a copy of the keyed hmac, fed with `string_to_digest` if given
+        """
         if self._hmac_256:
             _hmac = self._hmac_256.copy()
         else:
             _hmac = self._hmac.copy()
-        if is_python3:
-            string_to_digest = string_to_digest.encode()
-        _hmac.update(string_to_digest)
-        return _hmac.digest()
+        if string_to_digest:
+            if is_python3:
+                string_to_digest = string_to_digest.encode()
+            _hmac.update(string_to_digest)
+        return _hmac
+
+    def digest(self, string_to_digest):
+        return self.new_hmac(string_to_digest).digest()
 
     def sign_string(self, string_to_sign):
         to_sign = self.digest(string_to_sign)
@@ -93,18 +130,10 @@ class QuerySignatureAuthHandler(HmacKeys):
     def _calc_signature(self, params, verb, path):
         """ calc signature for request
         """
-        string_to_sign = '%s\n%s\n' % (verb, path)
         params['signature_method'] = self.algorithm()
-        keys = sorted(params.keys())
-        pairs = []
-        for key in keys:
-            val = get_utf8_value(params[key])
-            if is_python3:
-                key = key.encode()
-            pairs.append(urllib.quote(key, safe='') + '=' +
-                         urllib.quote(val, safe='-_~'))
-        qs = '&'.join(pairs)
-        string_to_sign += qs
+        qs = '&'.join([quote_key(key) + '=' + quote_value(params[key])
+                       for key in sorted(params)])
+        string_to_sign = '%s\n%s\n%s' % (verb, path, qs)
         # print "string to sign:[%s]" % string_to_sign
         b64 = self.sign_string(string_to_sign)
         return (qs, b64)
@@ -124,10 +153,9 @@ class QuerySignatureAuthHandler(HmacKeys):
                                              req.auth_path)
         # print 'query_string: %s Signature: %s' % (qs, signature)
         if req.method == 'POST':
-            # req and retried req should not have signature
-            params = req.params.copy()
-            params["signature"] = signature
-            req.body = urllib.urlencode(params)
+            # req and retried req should not have signature,
+            # the signed query string is reused as the form body
+            req.body = qs + '&signature=' + urllib.quote_plus(signature)
             req.header = {
                 'Content-Length': str(len(req.body)),
                 'Content-Type': 'application/x-www-form-urlencoded',
@@ -232,8 +260,10 @@ class QSSignatureAuthHandler(HmacKeys):
         else:
             return params
 
-    def _generate_signature(self, method, auth_path, params, headers):
-
+    def _get_string_to_sign(self, method, params, headers):
+        """ Get the string to sign without the canonicalized resource,
+            and the canonicalized query appended to the resource
+        """
         params = self._parse_parameters(params)
 
         string_to_sign = "%s\n%s\n%s" % (method.upper(),
@@ -262,12 +292,19 @@ class QSSignatureAuthHandler(HmacKeys):
                 param_parts.append("%s=%s" % (param, value))
         canonicalized_query = "&".join(param_parts)
 
+        return string_to_sign + "\n", canonicalized_query
+
+    def _generate_signature(self, method, auth_path, params, headers):
+
+        string_to_sign, canonicalized_query = self._get_string_to_sign(
+            method, params, headers)
+
         # Generate canonicalized resource
         canonicalized_resource = auth_path
         if canonicalized_query:
             canonicalized_resource += "?%s" % canonicalized_query
 
-        string_to_sign += "\n%s" % canonicalized_resource
+        string_to_sign += canonicalized_resource
 
         signature = self.sign_string(string_to_sign)
 
@@ -285,22 +322,45 @@ class QSSignatureAuthHandler(HmacKeys):
 
     def get_auth_parameters(self, method, auth_path, expires, params=None, headers=None):
 
-        params = params or []
+        return self.get_batch_auth_parameters(method, [auth_path], expires,
+                                              params, headers)[0]
+
+    def get_batch_auth_parameters(self, method, auth_paths, expires,
+                                  params=None, headers=None):
+        """ Get the query authentication parameters of many resources,
+            signed with the same date, expires, params and headers.
+        @param auth_paths - the list of canonicalized resource paths
+        @return the list of parameters dicts, in the order of `auth_paths`
+        """
+        params = list(self._parse_parameters(params or []))
 
         auth_params = [
             ("X-QS-Algorithm", "QS-HMAC-SHA256"),
             ("X-QS-Credential", self.qy_access_key_id),
-            ("X-QS-Date", datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")),
+            ("X-QS-Date",
+             datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")),
             ("X-QS-Expires", str(expires)),
         ]
 
-        signature = self._generate_signature(method, auth_path,
-                                             params + auth_params,
-                                             headers or {})
+        string_to_sign, canonicalized_query = self._get_string_to_sign(
+            method, params + auth_params, headers or {})
+        suffix = "?%s" % canonicalized_query if canonicalized_query else ""
 
-        auth_params.append(("X-QS-Signature", signature))
+        # everything but the resource is digested once
+        prefix_hmac = self.new_hmac(string_to_sign)
+        result = []
+        for auth_path in auth_paths:
+            _hmac = prefix_hmac.copy()
+            resource = auth_path + suffix
+            if is_python3:
+                resource = resource.encode()
+            _hmac.update(resource)
+            signature = base64.b64encode(_hmac.digest()).strip()
+            if is_python3:
+                signature = signature.decode()
+            result.append(dict(auth_params, **{"X-QS-Signature": signature}))
 
-        return dict(auth_params)
+        return result
 
     def add_auth(self, req, **kwargs):
         if "auth_path" in kwargs:
@@ -14,44 +14,107 @@
 # limitations under the License.
 # =========================================================================
 
+import os
+import ssl
 import time
+import zlib
+import errno
+import socket
+import weakref
 import threading
+from collections import deque, OrderedDict
 try:
     import httplib
 except:
     import http.client as httplib
 
-from qingcloud.misc.json_tool import json_load
 from qingcloud.conn.auth import QuerySignatureAuthHandler
+from qingcloud.conn.resolver import default_dns_cache
 
 
 class ConnectionQueue(object):
-    """ Http connection queue
+    """ Http connection queue of one host.
+
+        Idle connections are kept in a deque ordered from the coldest (left)
+        to the warmest (right). `get_conn` hands out the warmest connection
+        first so that the sockets most likely to be alive are reused, and
+        the expired ones gather on the left where `clear` can drop them
+        without touching the rest of the queue.
+        The queue itself is not thread-safe, callers should hold `lock`.
     """
 
-    def __init__(self, timeout=60):
-        self.queue = []
+    # events counted in `stats`
+    STAT_EVENTS = ('hits', 'misses', 'created', 'not_ready', 'dropped',
+                   'expired', 'evicted', 'tunnels')
+
+    def __init__(self, timeout=60, maxsize=None, on_event=None):
+        """
+        @param timeout - seconds an idle connection is kept in the queue
+        @param maxsize - the maximum number of idle connections, unlimited if `None`
+        @param on_event - called as `on_event(event, count)` when an event
+                          in `STAT_EVENTS` is recorded
+        """
+        self.queue = deque()
         self.timeout = timeout
+        self.maxsize = maxsize
+        self.on_event = on_event
+        self.stats = dict.fromkeys(self.STAT_EVENTS, 0)
+        self.lock = threading.Lock()
+        # set when the queue is removed from its pool
+        self.retired = False
 
     def size(self):
         return len(self.queue)
 
+    def record(self, event, count=1):
+        self.stats[event] += count
+        if self.on_event is not None:
+            self.on_event(event, count)
+
     def get_conn(self):
         # get a valid connection or `None`
-        for _ in range(len(self.queue)):
-            (conn, _) = self.queue.pop(0)
-            if self._is_conn_ready(conn):
-                return conn
-            else:
-                self.put_conn(conn)
+        busy = []
+        try:
+            while self.queue:
+                conn_info = self.queue.pop()
+                if self._is_conn_ready(conn_info[0]):
+                    self.record('hits')
+                    return conn_info[0]
+                # the previous response of this connection is still being
+                # read by its owner, skip it for now
+                busy.append(conn_info)
+            self.record('misses')
+        finally:
+            if busy:
+                # put the busy connections back at the cold end, they are
+                # reused once their responses have been read
+                self.queue.extendleft(busy)
+                self.record('not_ready', len(busy))
 
     def put_conn(self, conn):
+        # put connection back as the warmest one,
+        # the coldest connection is closed if the queue is full
         self.queue.append((conn, time.time()))
+        if self.maxsize is not None and len(self.queue) > self.maxsize:
+            (cold_conn, _) = self.queue.popleft()
+            if self._is_conn_ready(cold_conn):
+                cold_conn.close()
+            self.record('evicted')
 
     def clear(self):
         # clear expired connections
+        # return the number of connections removed
+        count = 0
         while self.queue and self._is_conn_expired(self.queue[0]):
-            self.queue.pop(0)
+            (conn, _) = self.queue.popleft()
+            # a busy connection is dropped without closing,
+            # its response may still be read by its owner
+            if self._is_conn_ready(conn):
+                conn.close()
+            count += 1
+        if count:
+            self.record('expired', count)
+        return count
 
     def _is_conn_expired(self, conn_info):
         (_, time_stamp) = conn_info
@@ -64,53 +127,281 @@ class ConnectionQueue(object):
         return (response is None) or response.isclosed()
 
 
+class ConnectionReaper(threading.Thread):
+    """ Daemon thread which expires idle connections of a pool
+        in the background.
+    """
+
+    def __init__(self, pool, interval):
+        threading.Thread.__init__(self, name='qingcloud-connection-reaper')
+        self.daemon = True
+        # do not keep the pool alive only for the reaper
+        self.pool_ref = weakref.ref(pool)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            pool = self.pool_ref()
+            if pool is None:
+                return
+            pool.clear_expired()
+            del pool
+
+    def stop(self):
+        self.stopped.set()
+
+
 class ConnectionPool(object):
     """ Http connection pool for multiple hosts.
         It's thread-safe
+
+        Each (host, port) has its own queue and lock, `lock` of the pool
+        is only taken when a queue is created or removed.
+        Connections tunnelled through a proxy by CONNECT are kept apart
+        for each `tunnel`, the (host, port) of the target.
     """
 
     CLEAR_INTERVAL = 5.0
 
-    def __init__(self, timeout=60):
+    queue_class = ConnectionQueue
+
+    def __init__(self, timeout=60, max_idle_per_host=None, max_idle=None,
+                 reaper=False):
+        """
+        @param timeout - seconds an idle connection is kept in the pool
+        @param max_idle_per_host - the maximum number of idle connections
+                                   kept for each (host, port), unlimited if `None`
+        @param max_idle - the maximum number of idle connections kept
+                          for all hosts, unlimited if `None`
+        @param reaper - expire idle connections in a background thread
+                        instead of on the request path
+        """
         self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.max_idle = max_idle
+        self.reaper = reaper
         self.last_clear_time = time.time()
         self.lock = threading.Lock()
         self.pool = {}
+        self.callbacks = []
+        # stats of the queues removed from the pool
+        self._retired_stats = {}
+        self._reaper = None
+        self._pid = os.getpid()
+        # the number of idle connections of all queues
+        self._idle = 0
+        self._idle_lock = threading.Lock()
 
     def size(self):
-        with self.lock:
-            return sum([conn.size() for conn in self.pool.values()])
+        return self._idle
 
-    def put_conn(self, host, port, conn):
-        # put connection into host's connection pool
-        with self.lock:
-            key = (host, port)
-            queue = self.pool.setdefault(key, ConnectionQueue(self.timeout))
-            queue.put_conn(conn)
+    def _add_idle(self, count):
+        with self._idle_lock:
+            self._idle += count
 
-    def get_conn(self, host, port):
+    def _reserve_idle(self):
+        # count a connection about to be put, `False` if the pool is full
+        with self._idle_lock:
+            if self.max_idle is not None and self._idle >= self.max_idle:
+                return False
+            self._idle += 1
+            return True
+
+    def put_conn(self, host, port, conn, tunnel=None):
+        # put connection into host's connection pool
+        self._check_pid()
+        if self.reaper:
+            self._start_reaper()
+        queue = self._lock_queue(self._key(host, port, tunnel))
+        try:
+            if self._reserve_idle():
+                size = queue.size()
+                queue.put_conn(conn)
+                # the connection reserved, less the one evicted by the queue
+                self._add_idle(queue.size() - size - 1)
+            else:
+                # a busy connection is dropped without closing,
+                # its response may still be read by its owner
+                if queue._is_conn_ready(conn):
+                    conn.close()
+                queue.record('evicted')
+        finally:
+            queue.lock.release()
+
+    def get_conn(self, host, port, tunnel=None):
         # get connection from host's connection pool
         # return a valid connection or `None`
-        self._clear()
+        self._check_pid()
+        if not self.reaper:
+            self._clear()
+        queue = self._lock_queue(self._key(host, port, tunnel))
+        try:
+            conn = queue.get_conn()
+            if conn is not None:
+                self._add_idle(-1)
+            return conn
+        finally:
+            queue.lock.release()
+
+    def record(self, host, port, event, count=1, tunnel=None):
+        """ Record an event of connections to (host, port)
+        @param event - one of `ConnectionQueue.STAT_EVENTS`
+        @param tunnel - the (host, port) tunnelled to through the proxy (host, port)
+        """
+        queue = self._lock_queue(self._key(host, port, tunnel))
+        try:
+            queue.record(event, count)
+        finally:
+            queue.lock.release()
+
+    def add_callback(self, callback):
+        """ Add a callback called as `callback(event, host, port, count)`
+            for each recorded event, see `ConnectionQueue.STAT_EVENTS`.
+            Callbacks are called with the lock of the host held,
+            so they should be fast and must not use the pool.
+        """
+        self.callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self.callbacks.remove(callback)
+
+    def stats(self):
+        """ Get a snapshot of the pool statistics, such as:
+            {
+                'hits': 90, 'misses': 10, 'created': 10, 'not_ready': 0,
+                'dropped': 1, 'expired': 5, 'evicted': 0, 'tunnels': 2,
+                'idle': 4, 'hit_rate': 0.9, 'tunnel_hits': 40,
+                'hosts': {
+                    'api.qingcloud.com:443': {'hits': 50, ..., 'idle': 3},
+                    'api.qingcloud.com:443 via proxy:3128': {'hits': 40, ...},
+                },
+            }
+            `tunnels` counts the CONNECT tunnels established and `tunnel_hits`
+            the requests which reused one.
+        """
+        hosts = {}
+        with self.lock:
+            for key, stats in self._retired_stats.items():
+                hosts[key] = dict(stats, idle=0)
+            for key, queue in self.pool.items():
+                with queue.lock:
+                    hosts[key] = dict(queue.stats, idle=queue.size())
+        total = dict.fromkeys(ConnectionQueue.STAT_EVENTS + ('idle', ), 0)
+        tunnel_hits = 0
+        for key, host_stats in hosts.items():
+            for name in total:
+                total[name] += host_stats[name]
+            if len(key) > 2:
+                tunnel_hits += host_stats['hits']
+        requests = total['hits'] + total['misses']
+        total['hit_rate'] = float(total['hits']) / requests if requests else 0.0
+        total['tunnel_hits'] = tunnel_hits
+        total['hosts'] = dict((self._key_name(key), host_stats)
+                              for key, host_stats in hosts.items())
+        return total
+
+    def clear_expired(self):
+        # clear expired connections of all hosts
+        with self.lock:
+            for key, queue in list(self.pool.items()):
+                with queue.lock:
+                    self._add_idle(-queue.clear())
+                    if queue.size() == 0:
+                        self._retire_queue(key, queue)
+            self.last_clear_time = time.time()
+
+    def close(self):
+        # stop the reaper and close all idle connections
         with self.lock:
-            key = (host, port)
-            if key in self.pool:
-                return self.pool[key].get_conn()
+            if self._reaper is not None:
+                self._reaper.stop()
+                self._reaper = None
+            for key, queue in list(self.pool.items()):
+                with queue.lock:
+                    while queue.size():
+                        (conn, _) = queue.queue.pop()
+                        if queue._is_conn_ready(conn):
+                            conn.close()
+                        self._add_idle(-1)
+                    self._retire_queue(key, queue)
+
+    def _retire_queue(self, key, queue):
+        # remove queue from the pool and keep its stats,
+        # caller should hold both `self.lock` and `queue.lock`
+        queue.retired = True
+        del self.pool[key]
+        self._retired_stats[key] = queue.stats
+
+    def _lock_queue(self, key):
+        # get the queue of key with its lock acquired,
+        # caller should release `queue.lock`
+        while True:
+            queue = self.pool.get(key)
+            if queue is None:
+                with self.lock:
+                    queue = self.pool.get(key)
+                    if queue is None:
+                        queue = self.queue_class(self.timeout,
+                                                 self.max_idle_per_host,
+                                                 self._event_handler(key))
+                        if key in self._retired_stats:
+                            queue.stats = self._retired_stats.pop(key)
+                        self.pool[key] = queue
+            queue.lock.acquire()
+            # retry if the queue was removed by `clear_expired`
+            # after it was got
+            if not queue.retired:
+                return queue
+            queue.lock.release()
+
+    @staticmethod
+    def _key(host, port, tunnel=None):
+        if tunnel is None:
+            return (host, port)
+        return (host, port, tuple(tunnel))
+
+    @staticmethod
+    def _key_name(key):
+        if len(key) > 2:
+            return '%s:%s via %s:%s' % (key[2] + key[:2])
+        return '%s:%s' % key
+
+    def _event_handler(self, key):
+        (host, port) = key[:2]
+
+        def on_event(event, count):
+            for callback in self.callbacks:
+                callback(event, host, port, count)
+        return on_event
 
     def _clear(self):
-        # clear expired connections of all hosts
+        # clear expired connections at most every `CLEAR_INTERVAL` seconds
+        if self.last_clear_time + self.CLEAR_INTERVAL > time.time():
+            return
+        self.clear_expired()
+
+    def _start_reaper(self):
+        if self._reaper is not None:
+            return
         with self.lock:
-            curr_time = time.time()
-            if self.last_clear_time + self.CLEAR_INTERVAL > curr_time:
-                return
-            key_to_delete = []
-            for key in self.pool:
-                self.pool[key].clear()
-                if self.pool[key].size() == 0:
-                    key_to_delete.append(key)
-            for key in key_to_delete:
-                del self.pool[key]
-            self.last_clear_time = curr_time
+            if self._reaper is None:
+                self._reaper = ConnectionReaper(self, self.CLEAR_INTERVAL)
+                self._reaper.start()
+
+    def _check_pid(self):
+        # connections and reaper thread are not inherited by forked process,
+        # sockets shared with the parent are dropped without being closed
+        # the locks may be held by threads of the parent at fork time
+        pid = os.getpid()
+        if pid != self._pid:
+            self.lock = threading.Lock()
+            self.pool = {}
+            self._retired_stats = {}
+            self._reaper = None
+            self._idle = 0
+            self._idle_lock = threading.Lock()
+            self._pid = pid
 
 
 class HTTPRequest(object):
@@ -149,35 +440,302 @@ class HTTPRequest(object):
                                            self.path, self.params,
                                            self.body))
 
-    def authorize(self, connection, **kwargs):
-        # add authorize information to request
-        if connection.iam_access_key:
-            kwargs.update({'access_key': connection.iam_access_key,
-                           'token': connection._token,
+    def authorize(self, connection, iam=None, **kwargs):
+        """ add authorize information to request
+        @param iam - the (credentials, auth handler) of the IAM role to sign
+                     the request with, taken from `connection` if `None`
+        """
+        if iam is None:
+            iam = connection._iam
+        if iam is not None:
+            (credentials, auth_handler) = iam
+            kwargs.update({'access_key': credentials.access_key,
+                           'token': credentials.token,
                            'signature_version': 2})
-        if connection._auth_handler and (connection.qy_access_key_id or connection.iam_access_key):
+            auth_handler.add_auth(self, **kwargs)
+        elif connection._auth_handler and connection.qy_access_key_id:
             connection._auth_handler.add_auth(self, **kwargs)
 
 
+class ContentDecoder(object):
+    """ Incremental decoder of gzip and deflate content encodings
+    """
+
+    ENCODINGS = ('gzip', 'x-gzip', 'deflate')
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        # accept both gzip and zlib headers
+        self._obj = zlib.decompressobj(32 + zlib.MAX_WBITS)
+        self._first = True
+
+    def decompress(self, data):
+        if not data:
+            return b""
+        if self._first and self.encoding == 'deflate':
+            self._first = False
+            try:
+                return self._obj.decompress(data)
+            except zlib.error:
+                # some servers send raw deflate streams without zlib header
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._obj.decompress(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+
 class HTTPResponse(httplib.HTTPResponse):
 
+    # default chunk size of `iter_chunks`
+    CHUNK_SIZE = 64 * 1024
+
     def __init__(self, *args, **kwargs):
         httplib.HTTPResponse.__init__(self, *args, **kwargs)
         self._cached_response = ""
+        # set to `False` to stream the body instead of caching it
+        self.cache_body = True
+        # set to `True` to decode gzip and deflate content encodings
+        self.decode_content = False
+        self._decoder = None
+        self._decoded = b""
+        self._reading_raw = False
+        # the connection of the response, closed by `abort`, and the
+        # callback pooling the connection of a streamed response,
+        # called once the body has been read
+        self._conn = None
+        self._on_release = None
 
     def read(self, amt=None):
         """Read the response.
 
         If this method is called without amt argument, the response body
-        will be cached. Subsequent calls without arguments will return
-        the cached response.
+        will be cached unless `cache_body` is `False`. Subsequent calls
+        without arguments will return the cached response.
         """
         if amt is None:
+            if not self.cache_body:
+                return self._read()
             if not self._cached_response:
-                self._cached_response = httplib.HTTPResponse.read(self)
+                self._cached_response = self._read()
             return self._cached_response
         else:
-            return httplib.HTTPResponse.read(self, amt)
+            return self._read(amt)
+
+    def iter_chunks(self, size=None):
+        """Iterate over the rest of the body in chunks of at most
+        `size` bytes, the body is never cached.
+        """
+        size = size or self.CHUNK_SIZE
+        while True:
+            chunk = self._read(size)
+            if not chunk:
+                break
+            yield chunk
+
+    def readinto(self, b):
+        """Read up to len(b) bytes of the body into the caller-owned
+        buffer `b` and return the number of bytes read, 0 at the end.
+        """
+        if self._reading_raw or self._get_decoder() is None:
+            if hasattr(httplib.HTTPResponse, 'readinto'):
+                size = httplib.HTTPResponse.readinto(self, b)
+                self._check_release()
+                return size
+        data = self._read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def _get_decoder(self):
+        if self._decoder is None and self.decode_content:
+            encoding = (self.getheader('Content-Encoding') or '').strip().lower()
+            if encoding in ContentDecoder.ENCODINGS:
+                self._decoder = ContentDecoder(encoding)
+        return self._decoder
+
+    def _read_raw(self, amt=None):
+        # base `read` of some python versions calls `readinto`
+        self._reading_raw = True
+        try:
+            data = httplib.HTTPResponse.read(self, amt)
+        finally:
+            self._reading_raw = False
+        self._check_release()
+        return data
+
+    def _check_release(self):
+        # pool the connection of a streamed response once its body is read
+        if self._on_release is not None and self.isclosed():
+            self._conn = None
+            on_release, self._on_release = self._on_release, None
+            on_release()
+
+    def abort(self):
+        """Close the response and the socket of its connection without
+        reading the rest of the body, the connection is not reused.
+        """
+        conn, self._conn = self._conn, None
+        self._on_release = None
+        read = self.isclosed()
+        self.close()
+        if conn is not None and not read:
+            conn.close()
+
+    def _read(self, amt=None):
+        # read and decode the body
+        decoder = self._get_decoder()
+        if decoder is None:
+            return self._read_raw(amt)
+        if amt is None:
+            data = self._decoded + decoder.decompress(self._read_raw())
+            self._decoded = b""
+            return data + decoder.flush()
+        while len(self._decoded) < amt:
+            raw = self._read_raw(max(amt, 8192))
+            if not raw:
+                self._decoded += decoder.flush()
+                break
+            self._decoded += decoder.decompress(raw)
+        data, self._decoded = self._decoded[:amt], self._decoded[amt:]
+        return data
+
+
+class TLSSessionCache(object):
+    """ TLS sessions of the latest connections to each (host, port),
+        used to resume sessions with abbreviated handshakes.
+        It's thread-safe
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            return self.sessions.get(key)
+
+    def put(self, key, session):
+        with self.lock:
+            self.sessions.pop(key, None)
+            self.sessions[key] = session
+            while len(self.sessions) > self.maxsize:
+                self.sessions.popitem(last=False)
+
+
+def keepalive_socket_options(idle=30, interval=10, count=3):
+    """ Socket options which disable Nagle's algorithm and enable TCP
+        keepalive probes, so that idle pooled connections are not silently
+        dropped by NAT or load balancers.
+
+        @param idle - seconds of idleness before the first keepalive probe
+        @param interval - seconds between keepalive probes
+        @param count - the number of failed probes before the connection is dropped
+    """
+    options = [
+        (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    ]
+    # the keepalive tunables are not available on every platform
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle))
+    elif hasattr(socket, 'TCP_KEEPALIVE'):
+        # macOS
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle))
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval))
+    if hasattr(socket, 'TCP_KEEPCNT'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count))
+    return options
+
+
+DEFAULT_SOCKET_OPTIONS = keepalive_socket_options()
+
+
+class SocketOptionsMixin(object):
+    """ Apply `socket_options`, a list of (level, optname, value), to the
+        socket before the proxy tunnel or TLS is set up, and resolve the
+        host through `dns_cache` if given.
+    """
+    socket_options = None
+    dns_cache = None
+
+    def connect(self):
+        if self.dns_cache is not None:
+            create_connection = self.dns_cache.create_connection
+        else:
+            create_connection = socket.create_connection
+        self.sock = create_connection((self.host, self.port), self.timeout,
+                                      self.source_address)
+        for (level, optname, value) in self.socket_options or ():
+            try:
+                self.sock.setsockopt(level, optname, value)
+            except socket.error as e:
+                # might fail in OSs that don't implement the option
+                if e.errno != errno.ENOPROTOOPT:
+                    raise
+        if self._tunnel_host:
+            self._tunnel()
+
+
+class HTTPConnection(SocketOptionsMixin, httplib.HTTPConnection):
+
+    def __init__(self, host, port=None, socket_options=None, dns_cache=None,
+                 **kwargs):
+        httplib.HTTPConnection.__init__(self, host, port, **kwargs)
+        self.socket_options = socket_options
+        self.dns_cache = dns_cache
+
+
+class HTTPSConnection(SocketOptionsMixin, httplib.HTTPSConnection):
+    """ HTTPS connection which resumes the TLS session of the previous
+        connection to the same host when a session cache is given.
+    """
+
+    def __init__(self, host, port=None, session_cache=None,
+                 socket_options=None, dns_cache=None, **kwargs):
+        httplib.HTTPSConnection.__init__(self, host, port, **kwargs)
+        self.session_cache = session_cache
+        self.socket_options = socket_options
+        self.dns_cache = dns_cache
+
+    def _session_key(self):
+        if self._tunnel_host:
+            return (self._tunnel_host, self._tunnel_port)
+        return (self.host, self.port)
+
+    def connect(self):
+        SocketOptionsMixin.connect(self)
+        server_hostname = self._session_key()[0]
+        kwargs = {'server_hostname': server_hostname}
+        if self.session_cache is not None and hasattr(ssl, 'SSLSession'):
+            cached = self.session_cache.get(self._session_key())
+            # a session can only be resumed by the context which created it
+            if cached is not None and cached[0] is self._context:
+                kwargs['session'] = cached[1]
+        self.sock = self._context.wrap_socket(self.sock, **kwargs)
+        self._save_session()
+
+    def getresponse(self):
+        response = httplib.HTTPSConnection.getresponse(self)
+        # TLS 1.3 session tickets are only received after the handshake
+        self._save_session()
+        return response
+
+    def _save_session(self):
+        session = getattr(self.sock, 'session', None)
+        if self.session_cache is not None and session is not None:
+            self.session_cache.put(self._session_key(),
+                                   (self._context, session))
+
+
+def create_ssl_context():
+    """ Create the default SSL context shared by https connections
+    """
+    context = ssl.create_default_context()
+    if hasattr(context, 'set_alpn_protocols'):
+        context.set_alpn_protocols(['http/1.1'])
+    return context
 
 
 class HttpConnection(object):
@@ -187,7 +745,9 @@ class HttpConnection(object):
 
     def __init__(self, qy_access_key_id, qy_secret_access_key, host=None,
                  port=443, protocol="https", pool=None, expires=None,
-                 http_socket_timeout=10, debug=False, credential_proxy_host=None, credential_proxy_port=80):
+                 http_socket_timeout=10, debug=False, credential_proxy_host=None, credential_proxy_port=80,
+                 ssl_context=None, tls_session_cache=True, socket_options=None,
+                 dns_cache=None, compress_response=False, credential_provider=None):
         """
         @param qy_access_key_id - the access key id
         @param qy_secret_access_key - the secret access key
@@ -195,6 +755,20 @@ class HttpConnection(object):
         @param port - the port to use when connect to host
         @param protocol - the protocol to access to web server, "http" or "https"
         @param pool - the connection pool
+        @param ssl_context - the `ssl.SSLContext` shared by all https connections,
+                             created by `create_ssl_context` if not given
+        @param tls_session_cache - resume TLS sessions for new connections to the
+                                   same host, can be `True`, `False` or a `TLSSessionCache`
+        @param socket_options - list of (level, optname, value) set on new sockets,
+                                including the ones to proxies, `DEFAULT_SOCKET_OPTIONS`
+                                (TCP_NODELAY and keepalive) if `None`
+        @param dns_cache - the `DNSCache` used to resolve hosts, `True` to use the
+                           cache shared in the process, no cache if `None`
+        @param compress_response - ask for gzip or deflate compressed responses,
+                                   which are decoded transparently
+        @param credential_provider - the provider of IAM credentials, such as
+                                     `InstanceMetadataProvider`, used when no
+                                     access key is given
         """
         self.host = host
         self.port = port
@@ -211,12 +785,52 @@ class HttpConnection(object):
         self._proxy_port = None
         self._proxy_headers = None
         self._proxy_protocol = None
-        self._token = ''
-        self._token_exp = None
         self.credential_proxy_host = credential_proxy_host
         self.credential_proxy_port = credential_proxy_port
-        self.iam_access_key = None
-        self.iam_secret_key = None
+        self.credential_provider = credential_provider
+        # (credentials, auth handler) of the IAM role, replaced as a whole
+        # so that a request never mixes the keys of two credentials
+        self._iam = None
+        self._ssl_context = ssl_context
+        self._ssl_context_lock = threading.Lock()
+        if tls_session_cache is True:
+            tls_session_cache = TLSSessionCache()
+        self._tls_session_cache = tls_session_cache or None
+        if socket_options is None:
+            socket_options = DEFAULT_SOCKET_OPTIONS
+        self.socket_options = socket_options
+        if dns_cache is True:
+            dns_cache = default_dns_cache
+        self.dns_cache = dns_cache or None
+        self.compress_response = compress_response
+
+    @property
+    def iam_access_key(self):
+        iam = self._iam
+        return iam[0].access_key if iam is not None else None
+
+    @property
+    def iam_secret_key(self):
+        iam = self._iam
+        return iam[0].secret_key if iam is not None else None
+
+    @property
+    def _token(self):
+        iam = self._iam
+        return iam[0].token if iam is not None else ''
+
+    @property
+    def _token_exp(self):
+        iam = self._iam
+        return iam[0].expiration if iam is not None else None
+
+    @property
+    def ssl_context(self):
+        if self._ssl_context is None:
+            with self._ssl_context_lock:
+                if self._ssl_context is None:
+                    self._ssl_context = create_ssl_context()
+        return self._ssl_context
 
     def set_proxy(self, host, port=None, headers=None, protocol="http"):
         """ set http (https) proxy
@@ -235,26 +849,49 @@ class HttpConnection(object):
         self._proxy_headers = headers
         self._proxy_protocol = protocol
 
-    def _get_conn(self, host, port):
+    def _get_conn(self, host, port, tunnel=None):
         """ Get connection from pool
+        @param tunnel - the (host, port) to tunnel to through the proxy (host, port),
+                        pooled connections have their tunnel established already
         """
-        conn = self._conn.get_conn(host, port)
-        return conn or self._new_conn(host, port)
+        conn = self._conn.get_conn(host, port, tunnel)
+        if conn is None:
+            conn = self._new_conn(host, port)
+            self._conn.record(host, port, 'created', tunnel=tunnel)
+            if tunnel is not None:
+                # CONNECT is sent when the connection is established,
+                # the tunnel is kept until the connection is closed
+                conn.set_tunnel(tunnel[0], tunnel[1], self._proxy_headers)
+                self._conn.record(host, port, 'tunnels', tunnel=tunnel)
+        return conn
 
-    def _set_conn(self, conn):
+    def _set_conn(self, conn, tunnel=None):
         """ Set valid connection into pool
         """
-        self._conn.put_conn(conn.host, conn.port, conn)
+        self._conn.put_conn(conn.host, conn.port, conn, tunnel)
+
+    def _get_tunnel(self, host):
+        """ Get the (host, port) to tunnel to through the https proxy
+        """
+        if self._proxy_protocol == "https":
+            return (host, self.port)
+        return None
 
     def _new_conn(self, host, port):
         """ Create new connection
         """
         if self.secure:
-            conn = httplib.HTTPSConnection(
-                host, port, timeout=self.http_socket_timeout)
+            conn = HTTPSConnection(
+                host, port, timeout=self.http_socket_timeout,
+                context=self.ssl_context,
+                session_cache=self._tls_session_cache,
+                socket_options=self.socket_options,
+                dns_cache=self.dns_cache)
         else:
-            conn = httplib.HTTPConnection(
-                host, port, timeout=self.http_socket_timeout)
+            conn = HTTPConnection(
+                host, port, timeout=self.http_socket_timeout,
+                socket_options=self.socket_options,
+                dns_cache=self.dns_cache)
         # Use self-defined Response class
         conn.response_class = HTTPResponse
         return conn
@@ -264,9 +901,11 @@ class HttpConnection(object):
         raise NotImplementedError(
             "The build_http_request method must be implemented")
 
-    def send(self, method, path, params=None, headers=None, host=None,
-             auth_path=None, data=""):
-
+    def _build_request(self, method, path, params=None, headers=None,
+                       host=None, auth_path=None, data=""):
+        """ Build and authorize the request
+            @return (request, connection host, connection port, request path)
+        """
         if not params:
             params = {}
 
@@ -276,14 +915,22 @@ class HttpConnection(object):
         if not host:
             host = self.host
 
+        iam = None
         if not self.qy_access_key_id and not self.qy_secret_access_key:
-            if self._token:
+            self._check_token()
+            # read once, a refresh may replace it meanwhile
+            iam = self._iam
+            if iam is not None and iam[0].token:
                 path = '/iam/'
 
         # Build the http request
         request = self.build_http_request(method, path, params, auth_path,
                                           headers, host, data)
-        request.authorize(self)
+        request.authorize(self, iam)
+        if self.compress_response:
+            if request.header is None:
+                request.header = {}
+            request.header.setdefault('Accept-Encoding', 'gzip, deflate')
 
         conn_host = host
         conn_port = self.port
@@ -298,49 +945,68 @@ class HttpConnection(object):
         if self._proxy_protocol == "http":
             request_path = "%s://%s%s" % (self.protocol, host, request_path)
 
-        #: get connection
-        conn = self._get_conn(conn_host, conn_port)
+        return request, conn_host, conn_port, request_path
 
-        #: proxy - https
-        if self._proxy_protocol == "https":
-            conn.set_tunnel(host, self.port, self._proxy_headers)
+    def send(self, method, path, params=None, headers=None, host=None,
+             auth_path=None, data="", stream=False):
+        """ Send the request and return the `HTTPResponse`
+        @param stream - do not cache the response body, read it with
+                        `iter_chunks` or `readinto` to bound memory usage,
+                        the connection is pooled once the body is read
+                        and closed by `abort`
+        """
+
+        if not host:
+            host = self.host
 
-        # Send the request
-        conn.request(method, request_path, request.body, request.header)
+        request, conn_host, conn_port, request_path = self._build_request(
+            method, path, params, headers, host, auth_path, data)
 
-        # Receive the response
-        response = conn.getresponse()
+        #: get connection, tunnelled through the proxy - https
+        tunnel = self._get_tunnel(host)
+        conn = self._get_conn(conn_host, conn_port, tunnel)
+
+        try:
+            # Send the request
+            conn.request(method, request_path, request.body, request.header)
+
+            # Receive the response
+            response = conn.getresponse()
+        except BaseException:
+            # the connection may be broken, it is not reused
+            conn.close()
+            raise
+        if stream:
+            response.cache_body = False
+        response.decode_content = self.compress_response
 
         # Reuse the connection
-        if response.status < 500:
-            self._set_conn(conn)
+        response._conn = conn
+        if response.status < 500 and stream:
+            # pooled once the body is read, a streamed body may be read
+            # for long or be aborted
+            response._on_release = lambda: self._set_conn(conn, tunnel)
+            response._check_release()
+        elif response.status < 500:
+            self._set_conn(conn, tunnel)
+        else:
+            self._conn.record(conn_host, conn_port, 'dropped', tunnel=tunnel)
 
         return response
 
     def _check_token(self):
-        if not self._token or not self._token_exp or time.time() >= self._token_exp:
-            try:
-                conn = httplib.HTTPConnection(self.credential_proxy_host, self.credential_proxy_port, timeout=1)
-                conn.request("GET", "/latest/meta-data/security-credentials", headers={"Accept": "application/json"})
-                response = conn.getresponse()
-                # Reuse the connection
-                if response.status == 200:
-                    r = response.read()
-                    if r:
-                        # first reverse escape, then json_load
-                        r = json_load(eval(r))
-                        self._token = r.get('id_token')
-                        self._token_exp = r.get('expiration')
-                        self.iam_access_key = r.get('access_key')
-                        self.iam_secret_key = r.get('secret_key')
-
-                        self._auth_handler = QuerySignatureAuthHandler(self.host,
-                                                                       str(self.iam_access_key),
-                                                                       str(self.iam_secret_key))
-
-                elif response.status == 404:
-                    print("The current instance has no credentials")
-                    pass
-            except Exception as e:
-                print("Failed to get credentials due to error: %s" % e)
-                pass
+        """ Update the IAM credentials from the credential provider,
+            the provider refreshes them before they expire
+        """
+        if self.credential_provider is None:
+            return
+        self._set_credentials(self.credential_provider.get_credentials())
+
+    def _set_credentials(self, credentials):
+        iam = self._iam
+        if credentials is None or (iam is not None and credentials is iam[0]):
+            return
+        auth_handler = QuerySignatureAuthHandler(self.host,
+                                                 str(credentials.access_key),
+                                                 str(credentials.secret_key))
+        self._iam = (credentials, auth_handler)
@@ -0,0 +1,389 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Credentials of the IAM role attached to the instance, fetched from the
+metadata service.
+"""
+
+import os
+import time
+import weakref
+import tempfile
+import threading
+from contextlib import contextmanager
+try:
+    import httplib
+except:
+    import http.client as httplib
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows, the file cache is not locked there
+    fcntl = None
+
+from past.builtins import basestring
+
+from qingcloud.misc.json_tool import json_load, json_dump
+from qingcloud.misc.utils import local_ts
+
+
+class Credentials(object):
+    """ Temporary access key of an IAM role
+    """
+
+    def __init__(self, access_key, secret_key, token, expiration):
+        """
+        @param expiration - the unix time the credentials expire at
+        """
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.token = token
+        self.expiration = expiration
+
+    def __repr__(self):
+        return '<Credentials: %s expiration=%s>' % (self.access_key,
+                                                    self.expiration)
+
+    def expired(self):
+        return self.expiration is not None and time.time() >= self.expiration
+
+    def to_metadata(self):
+        return json_dump({'access_key': self.access_key,
+                          'secret_key': self.secret_key,
+                          'id_token': self.token,
+                          'expiration': self.expiration})
+
+    @classmethod
+    def from_metadata(cls, data):
+        """ Create credentials from the document of the metadata service,
+            it may be a JSON string escaped in a JSON string
+        """
+        if isinstance(data, bytes):
+            data = data.decode()
+        data = json_load(data)
+        if isinstance(data, basestring):
+            data = json_load(data)
+        expiration = data.get('expiration')
+        if isinstance(expiration, basestring):
+            expiration = local_ts(expiration) if not expiration.isdigit() \
+                else int(expiration)
+        return cls(data.get('access_key'), data.get('secret_key'),
+                   data.get('id_token'), expiration)
+
+
+class FileCredentialCache(object):
+    """ Credentials cached in a file shared by the processes of a host,
+        such as prefork workers, so that only one of them requests the
+        metadata service and the others start from the cached credentials.
+
+        The file is only readable by its owner and replaced atomically,
+        `lock` holds an exclusive lock on `path` + '.lock' across processes.
+    """
+
+    def __init__(self, path):
+        """
+        @param path - the path of the cache file
+        """
+        self.path = path
+        self.lock_path = path + '.lock'
+
+    def load(self):
+        """ Load the cached credentials
+            @return `Credentials` or `None` if there are none
+        """
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except (IOError, OSError):
+            return None
+        with os.fdopen(fd, 'rb') as f:
+            st = os.fstat(f.fileno())
+            # do not trust a file which others could have written
+            if hasattr(os, 'geteuid') and \
+                    (st.st_uid != os.geteuid() or st.st_mode & 0o077):
+                return None
+            data = f.read()
+        try:
+            return Credentials.from_metadata(data)
+        except Exception:
+            return None
+
+    def save(self, credentials):
+        """ Replace the cached credentials atomically
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        # created with mode 0600
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.credentials-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(credentials.to_metadata().encode())
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    @contextmanager
+    def lock(self):
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # closing the file releases the lock
+            os.close(fd)
+
+
+class CredentialRefresher(threading.Thread):
+    """ Daemon thread which refreshes the credentials of a provider
+        before they expire.
+    """
+
+    def __init__(self, provider):
+        threading.Thread.__init__(self, name='qingcloud-credential-refresher')
+        self.daemon = True
+        # do not keep the provider alive only for the refresher
+        self.provider_ref = weakref.ref(provider)
+        self.stopped = threading.Event()
+
+    def run(self):
+        while True:
+            provider = self.provider_ref()
+            if provider is None:
+                return
+            delay = max(provider.next_refresh - time.time(), 0)
+            del provider
+            if self.stopped.wait(delay):
+                return
+            provider = self.provider_ref()
+            if provider is None:
+                return
+            provider.refresh(force=False)
+            del provider
+
+    def stop(self):
+        self.stopped.set()
+
+
+class InstanceMetadataProvider(object):
+    """ Credentials provider of the metadata service.
+        It's thread-safe
+
+        The credentials are fetched once and shared by all the connections
+        using the provider. A background thread refreshes them
+        `refresh_before` seconds before they expire, and only one request
+        to the metadata service is in flight at any time. When a refresh
+        fails the cached credentials are still served (stale while
+        revalidate) and the refresh is retried after `retry_interval`.
+    """
+
+    PATH = '/latest/meta-data/security-credentials'
+
+    def __init__(self, host='169.254.169.254', port=80, timeout=1,
+                 refresh_before=300, retry_interval=10, background=True,
+                 cache=None):
+        """
+        @param host - the host of the metadata service
+        @param port - the port of the metadata service
+        @param timeout - seconds to wait for the metadata service
+        @param refresh_before - seconds before the expiration to refresh
+        @param retry_interval - seconds to wait before retrying a failed refresh
+        @param background - refresh in a background thread, otherwise the
+                            credentials are refreshed on demand
+        @param cache - the `FileCredentialCache` shared with other processes,
+                       the metadata service is only requested when the cached
+                       credentials are due to refresh
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.refresh_before = refresh_before
+        self.retry_interval = retry_interval
+        self.background = background
+        self.cache = cache
+        self.credentials = None
+        self.next_refresh = 0
+        self.last_error = None
+        # serializes the requests to the metadata service
+        self.lock = threading.Lock()
+        self._refresher = None
+        self._refresher_lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def get_credentials(self):
+        """ Get the cached credentials, fetch them first if there are none
+            or they are expired, or they are due to refresh without background
+            @return `Credentials` or `None` if they can not be fetched
+        """
+        self._check_pid()
+        credentials = self.credentials
+        if self._must_wait(credentials):
+            # wait for the refresh in flight rather than sending another
+            self.refresh(force=False)
+            credentials = self.credentials
+        if self.background:
+            self._start_refresher()
+        return credentials
+
+    def would_block(self):
+        """ Whether `get_credentials` would wait for the metadata service
+            or for a refresh in flight
+        """
+        self._check_pid()
+        return self._must_wait(self.credentials)
+
+    def _must_wait(self, credentials):
+        if credentials is not None and not credentials.expired() and \
+                self.background:
+            return False
+        return time.time() >= self.next_refresh or self.lock.locked()
+
+    def prefetch(self):
+        """ Fetch the credentials in the background without waiting
+        """
+        self._check_pid()
+        if self.background:
+            self._start_refresher()
+        else:
+            self.refresh()
+
+    def refresh(self, force=True):
+        """ Fetch the credentials from the metadata service
+        @param force - fetch even if the credentials were refreshed
+                       while waiting for the lock
+        """
+        started = time.time()
+        with self.lock:
+            if not force and self.next_refresh > started:
+                # refreshed by another thread in the meantime
+                return
+            if self.cache is None:
+                self._refresh()
+                return
+            try:
+                with self.cache.lock():
+                    # refreshed by another process in the meantime
+                    credentials = self.cache.load()
+                    if credentials is not None and \
+                            not self._is_due(credentials):
+                        self._update(credentials)
+                        return
+                    if self._refresh():
+                        self.cache.save(self.credentials)
+            except (IOError, OSError) as e:
+                # the cache is only an optimization
+                self.last_error = e
+                if time.time() >= self.next_refresh:
+                    self._refresh()
+
+    def _refresh(self):
+        # fetch and update the credentials, caller should hold `lock`
+        # return `True` if new credentials are fetched
+        try:
+            credentials = self.fetch()
+        except Exception as e:
+            self.last_error = e
+            self.next_refresh = time.time() + self.retry_interval
+            return False
+        self.last_error = None
+        if credentials is None:
+            self.next_refresh = time.time() + self.retry_interval
+            return False
+        self._update(credentials)
+        return True
+
+    def _update(self, credentials):
+        self.credentials = credentials
+        if credentials.expiration:
+            self.next_refresh = max(
+                credentials.expiration - self.refresh_before,
+                time.time() + self.retry_interval)
+        else:
+            self.next_refresh = time.time() + self.retry_interval
+
+    def _is_due(self, credentials):
+        return credentials.expiration is not None and \
+            time.time() >= credentials.expiration - self.refresh_before
+
+    def fetch(self):
+        """ Request the credentials from the metadata service
+            @return `Credentials` or `None` if the instance has no role
+        """
+        conn = httplib.HTTPConnection(self.host, self.port,
+                                      timeout=self.timeout)
+        try:
+            conn.request('GET', self.PATH,
+                         headers={'Accept': 'application/json'})
+            response = conn.getresponse()
+            body = response.read()
+        finally:
+            conn.close()
+        if response.status == 404:
+            # the instance has no credentials
+            return None
+        if response.status != 200:
+            raise httplib.HTTPException(
+                'metadata service returns %s' % response.status)
+        return Credentials.from_metadata(body) if body else None
+
+    def close(self):
+        # stop the background refresher
+        if self._refresher is not None:
+            self._refresher.stop()
+            self._refresher = None
+
+    def _start_refresher(self):
+        if self._refresher is not None:
+            return
+        with self._refresher_lock:
+            if self._refresher is None:
+                self._refresher = CredentialRefresher(self)
+                self._refresher.start()
+
+    def _check_pid(self):
+        # the lock may be held by a thread of the parent at fork time,
+        # and the refresher thread is not inherited
+        pid = os.getpid()
+        if pid != self._pid:
+            self.lock = threading.Lock()
+            self._refresher = None
+            self._refresher_lock = threading.Lock()
+            self._pid = pid
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_credential_provider(host='169.254.169.254', port=80, cache_path=None):
+    """ Get the provider of the metadata service at (host, port)
+        shared in the process
+    @param cache_path - the path of the `FileCredentialCache` shared with
+                        other processes, set on the provider if given
+    """
+    key = (host, port)
+    provider = _providers.get(key)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(key)
+            if provider is None:
+                provider = InstanceMetadataProvider(host, port)
+                _providers[key] = provider
+    if cache_path and provider.cache is None:
+        provider.cache = FileCredentialCache(cache_path)
+    return provider
@@ -0,0 +1,127 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import time
+import socket
+import threading
+from collections import OrderedDict
+
+
+class DNSCache(object):
+    """ In-process cache of resolved addresses.
+        It's thread-safe
+
+        `getaddrinfo` does not expose the TTL of records, so resolved
+        addresses are kept for `ttl` seconds and failed lookups for
+        `negative_ttl` seconds. Each lookup of a cached name returns its
+        addresses rotated by one, to spread connections over all records.
+    """
+
+    def __init__(self, ttl=60, negative_ttl=5, maxsize=1024,
+                 getaddrinfo=socket.getaddrinfo):
+        """
+        @param ttl - seconds resolved addresses are cached
+        @param negative_ttl - seconds failed lookups are cached, 0 to disable
+        @param maxsize - the maximum number of cached names, the least
+                         recently used ones are evicted first
+        @param getaddrinfo - the function doing the real lookups
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.getaddrinfo = getaddrinfo
+        self.lock = threading.Lock()
+        # key -> [expire time, addresses or error, next index]
+        self.cache = OrderedDict()
+
+    def size(self):
+        return len(self.cache)
+
+    def resolve(self, host, port, family=0, socktype=socket.SOCK_STREAM):
+        """ Resolve like `socket.getaddrinfo`, from the cache if possible
+        """
+        key = (host, port, family, socktype)
+        with self.lock:
+            entry = self.cache.pop(key, None)
+            if entry is not None and entry[0] > time.time():
+                # keep the recently used name at the end
+                self.cache[key] = entry
+                if isinstance(entry[1], Exception):
+                    raise entry[1]
+                addrs = entry[1]
+                index = entry[2] % len(addrs)
+                entry[2] = index + 1
+                return addrs[index:] + addrs[:index]
+
+        try:
+            addrs = list(self.getaddrinfo(host, port, family, socktype))
+        except socket.gaierror as e:
+            if self.negative_ttl > 0:
+                self._put(key, [time.time() + self.negative_ttl, e, 0])
+            raise
+        if addrs:
+            self._put(key, [time.time() + self.ttl, addrs, 1])
+        return addrs
+
+    def invalidate(self, host=None):
+        """ Remove cached addresses of host, or all if host is `None`
+        """
+        with self.lock:
+            if host is None:
+                self.cache.clear()
+                return
+            for key in list(self.cache):
+                if key[0] == host:
+                    del self.cache[key]
+
+    def create_connection(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
+                          source_address=None):
+        """ Same as `socket.create_connection` but resolves address
+            through the cache.
+        """
+        host, port = address
+        err = None
+        for res in self.resolve(host, port):
+            af, socktype, proto, _, sa = res
+            sock = None
+            try:
+                sock = socket.socket(af, socktype, proto)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sa)
+                return sock
+            except socket.error as e:
+                err = e
+                if sock is not None:
+                    sock.close()
+        # none of the cached addresses is reachable, resolve again next time
+        self.invalidate(host)
+        if err is not None:
+            raise err
+        raise socket.error("getaddrinfo returns an empty list")
+
+    def _put(self, key, entry):
+        with self.lock:
+            self.cache.pop(key, None)
+            self.cache[key] = entry
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+
+
+# cache shared by connections created with `dns_cache=True`
+default_dns_cache = DNSCache()
@@ -0,0 +1,281 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Index of the action classes, so that `APIConnection` only imports the
+module of an action class when one of its methods is first used.
+"""
+
+from importlib import import_module
+
+# (module, class, public methods) of the action classes, in the order the
+# methods are looked up. It must be updated with the action classes,
+# `tests/test_api_connection.py` checks it is up to date.
+ACTIONS = (
+    ('instance', 'InstanceAction', (
+        'describe_instances',
+        'run_instances',
+        'run_instances_by_configuration',
+        'terminate_instances',
+        'stop_instances',
+        'restart_instances',
+        'start_instances',
+        'reset_instances',
+        'resize_instances',
+        'modify_instance_attributes',
+        'upload_userdata',
+        'clone_instances',
+    )),
+    ('instance_groups', 'InstanceGroupsAction', (
+        'create_instance_groups',
+        'delete_instance_groups',
+        'join_instance_group',
+        'leave_instance_group',
+        'describe_instance_groups',
+    )),
+    ('volume', 'VolumeAction', (
+        'describe_volumes',
+        'create_volumes',
+        'delete_volumes',
+        'attach_volumes',
+        'detach_volumes',
+        'resize_volumes',
+        'modify_volume_attributes',
+        'clone_volumes',
+    )),
+    ('eip', 'EipAction', (
+        'describe_eips',
+        'associate_eip',
+        'dissociate_eips',
+        'allocate_eips',
+        'release_eips',
+        'change_eips_bandwidth',
+        'change_eips_billing_mode',
+        'modify_eip_attributes',
+    )),
+    ('router', 'RouterAction', (
+        'describe_routers',
+        'create_routers',
+        'delete_routers',
+        'update_routers',
+        'poweroff_routers',
+        'poweron_routers',
+        'join_router',
+        'leave_router',
+        'modify_router_attributes',
+        'describe_router_vxnets',
+        'modify_router_static_attributes',
+        'describe_router_statics',
+        'add_router_statics',
+        'delete_router_statics',
+        'modify_router_static_entry_attributes',
+        'describe_router_static_entries',
+        'add_router_static_entries',
+        'delete_router_static_entries',
+    )),
+    ('vxnet', 'VxnetAction', (
+        'describe_vxnets',
+        'create_vxnets',
+        'join_vxnet',
+        'leave_vxnet',
+        'delete_vxnets',
+        'modify_vxnet_attributes',
+        'describe_vxnet_instances',
+    )),
+    ('loadbalancer', 'LoadBalancerAction', (
+        'describe_loadbalancers',
+        'create_loadbalancer',
+        'delete_loadbalancers',
+        'stop_loadbalancers',
+        'start_loadbalancers',
+        'update_loadbalancers',
+        'associate_eips_to_loadbalancer',
+        'dissociate_eips_from_loadbalancer',
+        'modify_loadbalancer_attributes',
+        'describe_loadbalancer_listeners',
+        'add_listeners_to_loadbalancer',
+        'delete_loadbalancer_listeners',
+        'describe_loadbalancer_backends',
+        'add_backends_to_listener',
+        'delete_loadbalancer_backends',
+        'modify_loadbalancer_backend_attributes',
+        'modify_loadbalancer_listener_attributes',
+        'create_loadbalancer_policy',
+        'describe_loadbalancer_policies',
+        'modify_loadbalancer_policy_attributes',
+        'apply_loadbalancer_policy',
+        'delete_loadbalancer_policies',
+        'add_loadbalancer_policy_rules',
+        'describe_loadbalancer_policy_rules',
+        'modify_loadbalancer_policy_rule_attributes',
+        'delete_loadbalancer_policy_rules',
+    )),
+    ('keypair', 'KeypairAction', (
+        'describe_key_pairs',
+        'attach_keypairs',
+        'detach_keypairs',
+        'create_keypair',
+        'delete_keypairs',
+        'modify_keypair_attributes',
+    )),
+    ('security_group', 'SecurityGroupAction', (
+        'describe_security_groups',
+        'create_security_group',
+        'modify_security_group_attributes',
+        'apply_security_group',
+        'remove_security_group',
+        'delete_security_groups',
+        'describe_security_group_rules',
+        'add_security_group_rules',
+        'delete_security_group_rules',
+        'modify_security_group_rule_attributes',
+        'describe_security_group_ipsets',
+        'create_security_group_ipset',
+        'delete_security_group_ipsets',
+        'modify_security_group_ipset_attributes',
+    )),
+    ('snapshot', 'SnapshotAction', (
+        'describe_snapshots',
+        'create_snapshots',
+        'delete_snapshots',
+        'apply_snapshots',
+        'modify_snapshot_attributes',
+        'capture_instance_from_snapshot',
+        'create_volume_from_snapshot',
+    )),
+    ('image', 'ImageAction', (
+        'describe_images',
+        'capture_instance',
+        'delete_images',
+        'modify_image_attributes',
+    )),
+    ('tag', 'TagAction', (
+        'describe_tags',
+        'create_tag',
+        'delete_tags',
+        'modify_tag_attributes',
+        'attach_tags',
+        'detach_tags',
+    )),
+    ('nic', 'NicAction', (
+        'describe_nics',
+        'create_nics',
+        'attach_nics',
+        'detach_nics',
+        'modify_nic_attributes',
+        'delete_nics',
+    )),
+    ('alarm_policy', 'AlarmPolicy', (
+        'describe_alarm_policies',
+        'create_alarm_policy',
+        'modify_alarm_policy_attributes',
+        'delete_alarm_policies',
+        'describe_alarm_policy_rules',
+        'add_alarm_policy_rules',
+        'modify_alarm_policy_rule_attributes',
+        'delete_alarm_policy_rules',
+        'describe_alarm_policy_actions',
+        'add_alarm_policy_actions',
+        'modify_alarm_policy_action_attributes',
+        'delete_alarm_policy_actions',
+        'associate_alarm_policy',
+        'dissociate_alarm_policy',
+        'apply_alarm_policy',
+        'describe_alarms',
+        'describe_alarm_history',
+    )),
+    ('s2', 'S2Action', (
+        'create_s2_server',
+        'describe_s2_servers',
+        'modify_s2_server',
+        'resize_s2_servers',
+        'delete_s2_servers',
+        'poweron_s2_servers',
+        'poweroff_s2_servers',
+        'update_s2_servers',
+        'change_s2_server_vxnet',
+        'create_s2_shared_target',
+        'describe_s2_shared_targets',
+        'delete_s2_shared_targets',
+        'enable_s2_shared_targets',
+        'disable_s2_shared_targets',
+        'modify_s2_shared_target_attributes',
+        'attach_to_s2_shared_target',
+        'detach_from_s2_shared_target',
+        'describe_s2_default_parameters',
+        'create_s2_group',
+        'describe_s2_groups',
+        'modify_s2_group',
+        'delete_s2_group',
+        'create_s2_account',
+        'describe_s2_accounts',
+        'modify_s2_account',
+        'delete_s2_accounts',
+        'associate_s2_account_group',
+        'dissociate_s2_account_group',
+    )),
+    ('cluster', 'ClusterAction', (
+        'start_clusters',
+        'stop_clusters',
+        'resize_cluster',
+        'describe_clusters',
+        'describe_cluster_jobs',
+        'add_cluster_nodes',
+        'delete_cluster_nodes',
+        'delete_clusters',
+        'deploy_app_version',
+    )),
+    ('sdwan', 'SdwanAction', (
+        'describe_wan_accesss',
+        'change_wan_access_bandwidth',
+        'upgrade_wan_access',
+        'get_wan_monitor',
+        'get_wan_info',
+    )),
+    ('migrate', 'MigrateAction', (
+        'migrate_resources',
+    )),
+    ('vpc_border', 'VpcBorder', (
+        'create_vpc_borders',
+        'delete_vpc_borders',
+        'describe_vpc_borders',
+        'join_border',
+        'leave_border',
+        'config_border',
+        'modify_border_attributes',
+        'describe_border_vxnets',
+        'associate_border',
+        'dissociate_border',
+        'add_border_statics',
+        'delete_border_statics',
+        'modify_border_static_attributes',
+        'describe_border_statics',
+        'cancel_border_static_changes',
+    )),
+)
+
+# method name -> (module, class) of the first class defining it
+ACTION_INDEX = {}
+for _module, _class, _methods in ACTIONS:
+    for _method in _methods:
+        ACTION_INDEX.setdefault(_method, (_module, _class))
+del _module, _class, _methods, _method
+
+
+def get_action_class(module, name):
+    """ Import the action class `name` of the module `module`
+    """
+    return getattr(import_module('%s.%s' % (__name__, module)), name)
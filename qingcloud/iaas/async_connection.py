@@ -0,0 +1,262 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import asyncio
+import contextlib
+import functools
+import inspect
+
+from qingcloud.conn.aio import AsyncHttpConnection
+from qingcloud.misc.json_tool import json_load
+from .batch import BoundedWindow
+from .cache import READ_ONLY_PREFIXES, request_key
+from .connection import APIConnection
+from .loader import ResourceLoader
+from .monitor import MonitorProcessor
+from .singleflight import SingleFlight
+
+
+def _coroutine(func):
+    """ Wrap an action so that calling it always returns a coroutine,
+        even when the parameters check fails and `None` is returned.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+    return wrapper
+
+
+class AsyncSingleFlight(SingleFlight):
+    """ `SingleFlight` of coroutines, for the connections running in the
+        same event loop
+    """
+
+    async def do(self, key, func):
+        """ Await `func()`, or the call in flight with the same key
+        @param func - returns a coroutine sending the request,
+                      which returns (raw body, parsed response)
+        @return the parsed response
+        """
+        task = self.flights.get(key)
+        leader = task is None
+        if leader:
+            # not cancelled with the caller, others may wait for it
+            task = self.flights[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: self.flights.pop(key, None))
+            self.calls += 1
+        else:
+            self.shared += 1
+        body, resp = await asyncio.shield(task)
+        return resp if leader else self._copy(body, resp)
+
+
+class AsyncResourceLoader(ResourceLoader):
+    """ `ResourceLoader` of coroutines, for the connections running in the
+        same event loop. `load`, `load_many` and `dispatch` are coroutines
+        and `batch` is an asynchronous context manager, e.g.
+        `instance = await conn.loader("describe_instances").load(...)`
+    """
+
+    def _new_future(self):
+        return asyncio.get_running_loop().create_future()
+
+    def _schedule(self):
+        return asyncio.get_running_loop().call_later(
+            self.window, lambda: asyncio.ensure_future(self.dispatch()))
+
+    async def load(self, resource_id):
+        future = self.submit(resource_id)
+        if self.batches:
+            await self.dispatch()
+        return await future
+
+    async def load_many(self, resource_ids):
+        futures = [self.submit(resource_id) for resource_id in resource_ids]
+        await self.dispatch()
+        return [await future for future in futures]
+
+    @contextlib.asynccontextmanager
+    async def batch(self):
+        with self.lock:
+            self.batches += 1
+            self._cancel_timer()
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batches -= 1
+                last = not self.batches
+            if last:
+                await self.dispatch()
+
+    async def dispatch(self):
+        # the chunks are described concurrently
+        await asyncio.gather(*[self._dispatch_chunk(chunk, pending)
+                               for (chunk, pending) in self._take_chunks()])
+
+    async def _dispatch_chunk(self, chunk, pending):
+        try:
+            resp = await getattr(self.conn, self.action_name)(
+                **self._params(chunk))
+        except Exception as e:
+            self._resolve(chunk, pending, error=e)
+        else:
+            self._resolve(chunk, pending, resp)
+
+
+class AsyncAPIConnection(AsyncHttpConnection, APIConnection):
+    """ Public connection to qingcloud service over asyncio.
+
+        It accepts the same parameters as `APIConnection`, plus
+        `async_pool`, the `AsyncConnectionPool` to use. Every action is a
+        coroutine, e.g. `await conn.describe_instances(...)`.
+    """
+
+    single_flight_class = AsyncSingleFlight
+    loader_class = AsyncResourceLoader
+
+    async def send_request(self, action, body, url="/iaas/", verb="GET"):
+        """ Send request
+        """
+        request = self._prepare_request_body(action, body)
+        scope = None
+        if self.response_cache is not None or self.single_flight is not None:
+            # the IAM credentials are part of the scope
+            await self._fetch_credentials()
+            scope = self._request_scope(url, verb)
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key, cached = self.response_cache.get(action, request, scope)
+            if cached is not None:
+                return json_load(cached)
+
+        if self.single_flight is not None and \
+                action.startswith(READ_ONLY_PREFIXES):
+            key = request_key(action, request, scope)
+            if key is not None:
+                return await self.single_flight.do(
+                    key, lambda: self._send_request(
+                        action, request, url, verb, cache_key))
+        return (await self._send_request(
+            action, request, url, verb, cache_key))[1]
+
+    async def _send_request(self, action, request, url, verb, cache_key):
+        """ Send request with retries, see `APIConnection._send_request`
+        """
+        retry_time = 0
+        while retry_time < self.retry_time:
+            next_sleep = self._backoff(retry_time)
+            try:
+                if self.rate_limiter is not None:
+                    delay = self.rate_limiter.reserve(action)
+                    if delay:
+                        await asyncio.sleep(delay)
+                # `send` closes the connection of a failed request,
+                # the body is read before the connection is pooled
+                response = await self.send(verb, url, request)
+                if response.status == 200:
+                    result = self._handle_response(
+                        action, await response.read(), retry_time, cache_key)
+                    if result is not None:
+                        return result
+            except Exception:
+                if self._is_last_attempt(retry_time):
+                    raise
+
+            await asyncio.sleep(next_sleep)
+            retry_time += 1
+        return None, None
+
+    def _bind_action(self, method):
+        """ Get api coroutines from each Action class
+        """
+        return _coroutine(method) if callable(method) else method
+
+    async def paginate(self, action_name, page_size=100, result_key=None,
+                       workers=1, ordered=True, **filters):
+        """ Asynchronous iterator of `APIConnection.paginate`, e.g.
+            `async for instance in conn.paginate("describe_instances")`,
+            the pages are requested concurrently in tasks of the event loop
+        """
+        method = getattr(self, action_name)
+        offset = filters.pop('offset', None) or 0
+        filters.pop('limit', None)
+        while offset is not None:
+            resp = await method(offset=offset, limit=page_size, **filters)
+            items, result_key, total_count = self._read_page(
+                action_name, resp, result_key)
+            for item in items:
+                yield item
+            if workers > 1 and items and total_count is not None:
+                break
+            offset = self._next_offset(offset, page_size, items, total_count)
+        else:
+            return
+
+        size = len(items)
+
+        async def fetch(offset):
+            resp = await method(offset=offset, limit=size, **filters)
+            return self._read_page(action_name, resp, result_key)[0]
+
+        window = BoundedWindow(lambda offset: asyncio.ensure_future(
+            fetch(offset)), range(offset + size, total_count, size), workers)
+        try:
+            while window:
+                if ordered:
+                    task = window.pending[0]
+                else:
+                    done, _ = await asyncio.wait(
+                        window.pending, return_when=asyncio.FIRST_COMPLETED)
+                    task = next(iter(done))
+                items = await task
+                window.take(task)
+                for item in items:
+                    yield item
+        finally:
+            window.cancel()
+
+    async def get_monitoring_data(self, resource, meters, step, start_time,
+                                  end_time, decompress=False, **ignore):
+        # the request is sent without decompress and decompressed after
+        # the response is awaited
+        resp = await _coroutine(APIConnection.get_monitoring_data)(
+            self, resource, meters, step, start_time, end_time)
+        if resp and resp.get('meter_set') and decompress:
+            p = MonitorProcessor(resp['meter_set'], start_time, end_time, step)
+            resp['meter_set'] = p.decompress_monitoring_data()
+        return resp
+
+    async def get_loadbalancer_monitoring_data(self, resource, meters, step,
+                                               start_time, end_time,
+                                               decompress=False, **ignore):
+        resp = await _coroutine(APIConnection.get_loadbalancer_monitoring_data)(
+            self, resource, meters, step, start_time, end_time)
+        if resp and resp.get('meter_set') and decompress:
+            p = MonitorProcessor(resp['meter_set'], start_time, end_time, step)
+            resp['meter_set'] = p.decompress_lb_monitoring_data()
+        return resp
+
+
+# expose the api methods of `APIConnection` as coroutines
+for _name, _func in list(vars(APIConnection).items()):
+    if (inspect.isfunction(_func) and not _name.startswith('_')
+            and _name not in ('send_request', 'build_http_request', 'loader')
+            and _name not in vars(AsyncAPIConnection)):
+        setattr(AsyncAPIConnection, _name, _coroutine(_func))
@@ -0,0 +1,240 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Run many independent API calls concurrently over one connection.
+"""
+
+import time
+import threading
+from collections import deque
+# a backport on python 2
+from concurrent import futures
+
+from .errors import APIError
+
+
+class BoundedWindow(object):
+    """ The futures of the calls started in order from `args`, at most
+        `size` of them are in flight or waiting to be taken, the next call
+        is started when one is taken
+    """
+
+    def __init__(self, start, args, size):
+        """
+        @param start - starts the call of an argument and returns its future
+        @param args - iterable of the arguments of the calls
+        @param size - the maximum number of futures not taken
+        """
+        self.start = start
+        self.args = iter(args)
+        self.pending = deque()
+        for _ in range(size):
+            self._start_next()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def _start_next(self):
+        for arg in self.args:
+            self.pending.append(self.start(arg))
+            return
+
+    def take(self, future):
+        """ Remove a future of the window and start the next call
+        """
+        self.pending.remove(future)
+        self._start_next()
+        return future
+
+    def cancel(self):
+        # stopped early or failed
+        for future in self.pending:
+            future.cancel()
+
+
+def run_bounded(start, args, size, ordered=True):
+    """ Run the calls of `args` through a `BoundedWindow`
+    @param ordered - yield the futures in the order of `args`,
+                     otherwise as soon as they are done
+    @return iterator of the done futures
+    """
+    window = BoundedWindow(start, args, size)
+    try:
+        while window:
+            if ordered:
+                future = window.pending[0]
+                futures.wait([future])
+            else:
+                future = next(iter(futures.wait(
+                    window.pending, return_when=futures.FIRST_COMPLETED).done))
+            yield window.take(future)
+    finally:
+        window.cancel()
+
+
+class BatchResult(object):
+    """ The outcome of a call of a batch
+    """
+
+    def __init__(self, index, action, kwargs):
+        """
+        @param index - the position of the call in the batch
+        @param action - the name of the method, or the callable, called
+        @param kwargs - the parameters of the call
+        """
+        self.index = index
+        self.action = action
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.latency = None
+
+    def __repr__(self):
+        return '<BatchResult: %s %s %s>' % (
+            self.index, getattr(self.action, '__name__', self.action),
+            'error=%r' % self.error if self.error else 'ok')
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class BatchExecutor(object):
+    """ Run API calls with bounded concurrency in a pool of threads.
+        It's thread-safe
+
+        The calls share the connection, and so its `ConnectionPool` and its
+        retry and backoff of `send_request`. Connections of other zones may
+        share the pool when created with `pool=conn._conn`, their methods
+        are passed as the actions of the calls.
+
+        Example:
+            with BatchExecutor(conn, workers=16) as executor:
+                for r in executor.run([('describe_volumes', {'volumes': [v]})
+                                       for v in volumes], ordered=False):
+                    print(r.index, r.error or r.result)
+                print(executor.stats())
+    """
+
+    def __init__(self, conn, workers=8):
+        """
+        @param conn - the `APIConnection` the calls are sent with
+        @param workers - the maximum number of calls in flight
+        """
+        self.conn = conn
+        self.workers = workers
+        self.executor = futures.ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def map(self, calls):
+        """ Run the calls and wait for all of them
+            @return the list of `BatchResult` in the order of the calls
+        """
+        return list(self.run(calls))
+
+    def run(self, calls, ordered=True):
+        """ Run the calls, at most `workers` of them are in flight or
+            waiting to be yielded
+
+        @param calls - iterable of (action, kwargs), the action is the name
+                       of a method of the connection or a callable
+        @param ordered - yield the results in the order of the calls,
+                         otherwise as soon as they are completed
+        @return iterator of `BatchResult`, errors are set on the results
+                instead of raised
+        """
+        def start(call):
+            (index, (action, kwargs)) = call
+            result = BatchResult(index, action, kwargs or {})
+            return self.executor.submit(self._call, result)
+
+        results = run_bounded(start, enumerate(calls), self.workers, ordered)
+        try:
+            for future in results:
+                yield future.result()
+        finally:
+            # the calls not started yet are cancelled if stopped early
+            results.close()
+
+    def _call(self, result):
+        action = result.action
+        if not callable(action):
+            action = getattr(self.conn, action)
+        started = time.time()
+        try:
+            result.result = resp = action(**result.kwargs)
+            if not resp:
+                raise APIError(None, 'no response')
+            if resp.get('ret_code'):
+                raise APIError(resp['ret_code'], resp.get('message'))
+        except Exception as e:
+            result.error = e
+        result.latency = time.time() - started
+        self._record(result, started)
+        return result
+
+    def _record(self, result, started):
+        with self.lock:
+            if self._started is None or started < self._started:
+                self._started = started
+            self._finished = max(self._finished, started + result.latency)
+            self._latencies.append(result.latency)
+            if result.error is not None:
+                self._errors += 1
+
+    def reset_stats(self):
+        with self.lock:
+            self._started = None
+            self._finished = 0
+            self._latencies = []
+            self._errors = 0
+
+    def stats(self):
+        """ Get the aggregate statistics of the calls completed since
+            the executor was created or `reset_stats`, such as:
+            {
+                'calls': 200, 'errors': 1, 'elapsed': 1.6,
+                'throughput': 125.0, 'latency_avg': 0.12,
+                'latency_p50': 0.1, 'latency_p95': 0.3,
+                'latency_p99': 0.4, 'latency_max': 0.5,
+            }
+            the throughput is in calls per second and the latencies
+            in seconds.
+        """
+        with self.lock:
+            latencies = sorted(self._latencies)
+            elapsed = self._finished - self._started if latencies else 0
+            errors = self._errors
+        count = len(latencies)
+        stats = {'calls': count, 'errors': errors, 'elapsed': elapsed,
+                 'throughput': count / elapsed if elapsed else 0}
+        stats['latency_avg'] = sum(latencies) / count if count else 0
+        for (name, q) in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            stats['latency_' + name] = \
+                latencies[min(int(count * q), count - 1)] if count else 0
+        stats['latency_max'] = latencies[-1] if count else 0
+        return stats
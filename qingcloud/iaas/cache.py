@@ -0,0 +1,217 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+In-memory cache of the responses of read-only actions.
+"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+
+from qingcloud.misc.json_tool import json_dump
+
+WORD_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+# parameters of the requests which are not part of the key
+VOLATILE_PARAMS = ('req_id', 'time_stamp', 'signature', 'expires')
+# actions which do not change resources
+READ_ONLY_PREFIXES = ('Describe', 'Get')
+
+
+def request_key(action, body, scope=None):
+    """ The key of the identical requests of an action, made of the action,
+        its parameters but the volatile ones, and the scope of the request
+        @param scope - the signing identity and the endpoint the request is
+                       sent to, see `APIConnection._request_scope`
+        @return (action, canonical parameters, scope) or `None` if the
+                parameters can not be serialized
+    """
+    params = json_dump(dict((k, v) for (k, v) in body.items()
+                            if k not in VOLATILE_PARAMS))
+    return (action, params, scope) if params is not None else None
+
+
+def resource_words(action):
+    """ The words of the resource type of an action, in lower case, e.g.
+        ['security', 'group'] of "DescribeSecurityGroups" and of
+        "ModifySecurityGroupAttributes"
+    """
+    words = [word.lower() for word in WORD_RE.findall(action)[1:]]
+    if words and words[-1] == 'attributes':
+        words.pop()
+    if words:
+        words[-1] = singular(words[-1])
+    return words
+
+
+def singular(word):
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('sses', 'ases', 'xes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+class ResponseCache(object):
+    """ LRU cache of the responses of read-only actions, with a TTL.
+        It's thread-safe, and can be shared by connections.
+
+        The "Describe" actions are cached for `ttl` seconds, or their TTL
+        in `action_ttls`. Responses are keyed on the action, its
+        parameters, zone included, and the scope of the request, i.e. the
+        access key and the endpoint of the connection, so that connections
+        of different accounts never share responses. Only successful
+        responses are cached.
+
+        The other actions, except "Get" ones, change resources and
+        invalidate the responses of the resource type they act on, e.g.
+        "ModifyImageAttributes" invalidates "DescribeImages" and
+        "DeleteSecurityGroups" invalidates "DescribeSecurityGroups" and
+        "DescribeSecurityGroupRules". `invalidates` adds other types.
+
+        The responses are kept as their raw body, every hit returns a new
+        object so that callers can modify it.
+    """
+
+    def __init__(self, ttl=60, maxsize=1024, action_ttls=None,
+                 invalidates=None):
+        """
+        @param ttl - seconds a "Describe" response is cached, not cached if 0
+        @param maxsize - the maximum number of responses cached, the least
+                         recently used ones are evicted first
+        @param action_ttls - dict of the TTLs of actions, e.g.
+                             {'DescribeZones': 3600, 'DescribeJobs': 0}
+        @param invalidates - dict of the other resource types changed by
+                             actions, e.g. {'AttachVolumes': ['DescribeInstances']}
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.action_ttls = action_ttls or {}
+        self.invalidates = invalidates or {}
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # incremented by each invalidation, so that a response requested
+        # before it is not cached after it
+        self.generation = 0
+        self.stats_counter = dict.fromkeys(
+            ('hits', 'misses', 'expired', 'evicted', 'invalidated'), 0)
+
+    def get_ttl(self, action):
+        if action in self.action_ttls:
+            return self.action_ttls[action]
+        return self.ttl if action.startswith('Describe') else 0
+
+    def is_read_only(self, action):
+        return action.startswith(READ_ONLY_PREFIXES) or \
+            action in self.action_ttls
+
+    def get(self, action, body, scope=None):
+        """ Look up the response of a request, a request changing resources
+            invalidates the cached responses of their type
+            @param scope - the signing identity and the endpoint of the request
+            @return (key, raw body), the key is `None` if the response is
+                    not cached and the raw body if there is no hit
+        """
+        if not self.is_read_only(action):
+            self.invalidate(action)
+            return None, None
+        if not self.get_ttl(action):
+            return None, None
+        key = request_key(action, body, scope)
+        if key is None:
+            return None, None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    # the most recently used
+                    self.entries[key] = self.entries.pop(key)
+                    self.stats_counter['hits'] += 1
+                    return key, entry[1]
+                del self.entries[key]
+                self.stats_counter['expired'] += 1
+            self.stats_counter['misses'] += 1
+            return key + (self.generation, ), None
+
+    def put(self, action, key, data, resp):
+        """ Cache the response of a request looked up with `get`
+        @param key - the key returned by `get`
+        @param data - the raw body of the response
+        @param resp - the parsed response
+        """
+        if key is None:
+            if not self.is_read_only(action):
+                # resources may have changed while the request was sent
+                self.invalidate(action)
+            return
+        if not isinstance(resp, dict) or resp.get('ret_code') != 0:
+            return
+        expires = time.time() + self.get_ttl(action)
+        with self.lock:
+            if key[3] != self.generation:
+                return
+            self.entries[key[:3]] = (expires, data)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.stats_counter['evicted'] += 1
+
+    def invalidate(self, action=None):
+        """ Remove the cached responses of the resource types changed by
+            `action`, all of them if `None`
+        """
+        with self.lock:
+            self.generation += 1
+            if action is None:
+                keys = list(self.entries)
+            else:
+                matches = self._matcher(action)
+                keys = [key for key in self.entries if matches(key[0])]
+            for key in keys:
+                del self.entries[key]
+            self.stats_counter['invalidated'] += len(keys)
+
+    def _matcher(self, action):
+        words = resource_words(action)
+        others = set(self.invalidates.get(action, ()))
+
+        def matches(cached_action):
+            if cached_action in others:
+                return True
+            # one type is a part of the other, e.g. security group rules
+            # of security groups
+            cached_words = resource_words(cached_action)
+            n = min(len(words), len(cached_words))
+            return n > 0 and words[:n] == cached_words[:n]
+        return matches
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self):
+        """ Get a snapshot of the cache statistics, such as:
+            {
+                'hits': 90, 'misses': 10, 'expired': 2, 'evicted': 0,
+                'invalidated': 3, 'size': 8, 'hit_rate': 0.9,
+            }
+        """
+        with self.lock:
+            stats = dict(self.stats_counter, size=len(self.entries))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = float(stats['hits']) / lookups if lookups else 0.0
+        return stats
@@ -18,46 +18,38 @@ import sys
 import time
 import uuid
 
-from qingcloud.iaas.actions.instance import InstanceAction
-from qingcloud.iaas.actions.instance_groups import InstanceGroupsAction
-from qingcloud.iaas.actions.volume import VolumeAction
-from qingcloud.iaas.actions.eip import EipAction
-from qingcloud.iaas.actions.router import RouterAction
-from qingcloud.iaas.actions.vxnet import VxnetAction
-from qingcloud.iaas.actions.keypair import KeypairAction
-from qingcloud.iaas.actions.image import ImageAction
-from qingcloud.iaas.actions.loadbalancer import LoadBalancerAction
-from qingcloud.iaas.actions.security_group import SecurityGroupAction
-from qingcloud.iaas.actions.snapshot import SnapshotAction
-from qingcloud.iaas.actions.tag import TagAction
-from qingcloud.iaas.actions.alarm_policy import AlarmPolicy
-from qingcloud.iaas.actions.cluster import ClusterAction
-from qingcloud.iaas.actions.nic import NicAction
-from qingcloud.iaas.actions.s2 import S2Action
-from qingcloud.iaas.actions.sdwan import SdwanAction
-from qingcloud.iaas.actions.migrate import MigrateAction
-from qingcloud.iaas.actions.vpc_border import VpcBorder
+from qingcloud.iaas.actions import ACTIONS, ACTION_INDEX, get_action_class
 
 from qingcloud.conn.auth import QuerySignatureAuthHandler
+from qingcloud.conn.credentials import get_credential_provider
 from qingcloud.conn.connection import HttpConnection, HTTPRequest
 from qingcloud.misc.json_tool import json_load, json_dump
 from qingcloud.misc.utils import filter_out_none
 from . import constants as const
+from .cache import READ_ONLY_PREFIXES, request_key
 from .consolidator import RequestChecker
+from .loader import ResourceLoader
 from .monitor import MonitorProcessor
-from .errors import InvalidAction
+from .singleflight import SingleFlight
+from .errors import APIError, InvalidAction, InvalidParameterError
 
 
 class APIConnection(HttpConnection):
     """ Public connection to qingcloud service
     """
     req_checker = RequestChecker()
+    single_flight_class = SingleFlight
+    loader_class = ResourceLoader
 
     def __init__(self, qy_access_key_id, qy_secret_access_key, zone,
                  host="api.qingcloud.com", port=443, protocol="https",
                  pool=None, expires=None,
                  retry_time=2, http_socket_timeout=60, debug=False,
-                 credential_proxy_host="169.254.169.254", credential_proxy_port=80):
+                 credential_proxy_host="169.254.169.254", credential_proxy_port=80,
+                 ssl_context=None, tls_session_cache=True, socket_options=None,
+                 dns_cache=None, compress_response=False, credential_provider=None,
+                 credential_cache_path=None, rate_limiter=None,
+                 response_cache=None, single_flight=None):
         """
         @param qy_access_key_id - the access key id
         @param qy_secret_access_key - the secret access key
@@ -67,87 +59,163 @@ class APIConnection(HttpConnection):
         @param protocol - the protocol to access to web server, "http" or "https"
         @param pool - the connection pool
         @param retry_time - the retry_time when message send fail
+        @param ssl_context - the `ssl.SSLContext` shared by https connections
+        @param tls_session_cache - resume TLS sessions for new connections
+        @param socket_options - list of (level, optname, value) set on new sockets
+        @param dns_cache - the `DNSCache` used to resolve hosts, `True` for the shared one
+        @param compress_response - ask for gzip or deflate compressed responses
+        @param credential_provider - the provider of IAM credentials used when no
+                                     access key is given, the metadata service at
+                                     (credential_proxy_host, credential_proxy_port)
+                                     shared in the process if `None`
+        @param credential_cache_path - the file caching the IAM credentials of the
+                                       shared provider across processes, so that
+                                       prefork workers fetch them only once
+        @param rate_limiter - the `RateLimiter` delaying the requests, it may be
+                              shared by connections to be limited together
+        @param response_cache - the `ResponseCache` of the responses of read-only
+                                actions, it may be shared by connections
+        @param single_flight - `True` to send the identical read-only requests in
+                               flight at the same time only once, or the
+                               `SingleFlight` shared by connections
         """
         # Set default zone
         self.zone = zone
         # Set retry times
         self.retry_time = retry_time
+        self.rate_limiter = rate_limiter
+        self.response_cache = response_cache
+        if single_flight is True:
+            single_flight = self.single_flight_class()
+        self.single_flight = single_flight
 
         super(APIConnection, self).__init__(
             qy_access_key_id, qy_secret_access_key, host, port, protocol,
-            pool, expires, http_socket_timeout, debug, credential_proxy_host, credential_proxy_port)
+            pool, expires, http_socket_timeout, debug, credential_proxy_host, credential_proxy_port,
+            ssl_context=ssl_context, tls_session_cache=tls_session_cache,
+            socket_options=socket_options, dns_cache=dns_cache,
+            compress_response=compress_response,
+            credential_provider=credential_provider)
 
         if not self.qy_access_key_id and not self.qy_secret_access_key:
-            self._check_token()
+            if self.credential_provider is None:
+                self.credential_provider = get_credential_provider(
+                    credential_proxy_host, credential_proxy_port,
+                    credential_cache_path)
+            # fetched in the background, the first request waits for it
+            self.credential_provider.prefetch()
 
         else:
             self._auth_handler = QuerySignatureAuthHandler(self.host,
                                                            self.qy_access_key_id, self.qy_secret_access_key)
 
-        # other apis
-        self.actions = [
-            InstanceAction(self),
-            InstanceGroupsAction(self),
-            VolumeAction(self),
-            EipAction(self),
-            RouterAction(self),
-            VxnetAction(self),
-            LoadBalancerAction(self),
-            KeypairAction(self),
-            SecurityGroupAction(self),
-            SnapshotAction(self),
-            ImageAction(self),
-            TagAction(self),
-            NicAction(self),
-            AlarmPolicy(self),
-            S2Action(self),
-            ClusterAction(self),
-            SdwanAction(self),
-            MigrateAction(self),
-            VpcBorder(self),
-        ]
+        # other apis, created on first use
+        self._actions = {}
+        self._action_list = None
+        self._loaders = {}
 
-    def send_request(self, action, body, url="/iaas/", verb="GET"):
-        """ Send request
-        """
+    def _prepare_request_body(self, action, body):
         request = body
         request['action'] = action
         request.setdefault('zone', self.zone)
         if self.debug:
-            print(json_dump(request))
+            print(json_dump(request, sort_keys=False))
             sys.stdout.flush()
         if self.expires:
             request['expires'] = self.expires
+        return request
 
+    def send_request(self, action, body, url="/iaas/", verb="GET"):
+        """ Send request
+        """
+        request = self._prepare_request_body(action, body)
+        scope = None
+        if self.response_cache is not None or self.single_flight is not None:
+            scope = self._request_scope(url, verb)
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key, cached = self.response_cache.get(action, request, scope)
+            if cached is not None:
+                return json_load(cached)
+
+        if self.single_flight is not None and \
+                action.startswith(READ_ONLY_PREFIXES):
+            key = request_key(action, request, scope)
+            if key is not None:
+                return self.single_flight.do(
+                    key, lambda: self._send_request(
+                        action, request, url, verb, cache_key))
+        return self._send_request(action, request, url, verb, cache_key)[1]
+
+    def _request_scope(self, url, verb):
+        """ The signing identity and the endpoint of a request, the responses
+            are only shared by the requests of the same scope
+        """
+        if not self.qy_access_key_id and not self.qy_secret_access_key:
+            self._check_token()
+        return (self.qy_access_key_id or self.iam_access_key,
+                self.host, self.port, url, verb)
+
+    def _send_request(self, action, request, url, verb, cache_key):
+        """ Send request with retries, the steps are shared with
+            `AsyncAPIConnection._send_request`
+            @return (the raw body of the response, the parsed response),
+                    (None, None) if no attempt is answered with status 200,
+                    the error of the last attempt is raised
+        """
         retry_time = 0
         while retry_time < self.retry_time:
-            # Use binary exponential backoff to desynchronize client requests
-            next_sleep = random.random() * (2 ** retry_time)
+            next_sleep = self._backoff(retry_time)
+            response = None
             try:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire(action)
+                # `send` closes the connection of a failed request
                 response = self.send(verb, url, request)
                 if response.status == 200:
-                    resp_str = response.read()
-                    if type(resp_str) != str:
-                        resp_str = resp_str.decode()
-                    if self.debug:
-                        print(resp_str)
-                        sys.stdout.flush()
-                    if resp_str and json_load(resp_str).get("ret_code") in (5000, 5100) and retry_time < self.retry_time - 1:
-                        # 5000: INTERNAL ERROR
-                        # 5100: SERVER BUSY
-                        self._get_conn(self.host, self.port)
-                        time.sleep(next_sleep)
-                        retry_time += 1
-                        continue
-                    return json_load(resp_str) if resp_str else ""
+                    result = self._handle_response(
+                        action, response.read(), retry_time, cache_key)
+                    if result is not None:
+                        return result
             except Exception:
-                if retry_time < self.retry_time - 1:
-                    self._get_conn(self.host, self.port)
-                else:
+                if response is not None:
+                    # the body may be partly read, its connection
+                    # is not reused
+                    response.abort()
+                if self._is_last_attempt(retry_time):
                     raise
 
             time.sleep(next_sleep)
             retry_time += 1
+        return None, None
+
+    def _backoff(self, retry_time):
+        # Use binary exponential backoff to desynchronize client requests
+        return random.random() * (2 ** retry_time)
+
+    def _is_last_attempt(self, retry_time):
+        return retry_time >= self.retry_time - 1
+
+    def _handle_response(self, action, resp_body, retry_time, cache_key):
+        """ Parse the body of a response with status 200
+            @return (the raw body, the parsed response),
+                    or `None` if the request should be retried
+        """
+        if self.debug:
+            print(resp_body.decode() if isinstance(resp_body, bytes) else resp_body)
+            sys.stdout.flush()
+        # parsed once, straight from the bytes
+        resp = json_load(resp_body) if resp_body else ""
+        if resp_body and self.rate_limiter is not None:
+            self.rate_limiter.feedback(action, resp.get("ret_code"))
+        if resp_body and resp.get("ret_code") in (5000, 5100) and \
+                not self._is_last_attempt(retry_time):
+            # 5000: INTERNAL ERROR
+            # 5100: SERVER BUSY
+            return None
+        if self.response_cache is not None:
+            self.response_cache.put(action, cache_key, resp_body, resp)
+        return resp_body, resp
 
     def _gen_req_id(self):
         return uuid.uuid4().hex
@@ -176,6 +244,131 @@ class APIConnection(HttpConnection):
         return HTTPRequest(verb, self.protocol, headers, self.host, self.port,
                            url, params)
 
+    def paginate(self, action_name, page_size=100, result_key=None,
+                 workers=1, ordered=True, **filters):
+        """ Iterate over the items of a describe action, the pages are
+            requested lazily so that only one page is kept in memory.
+
+            Items created or deleted while iterating may be missed or
+            yielded twice, as the pages are requested by offset.
+
+        @param action_name - the name of the method, e.g. "describe_instances"
+        @param page_size - the number of items requested per page
+        @param result_key - the key of the items in the responses,
+                            e.g. "instance_set", found in the first page if `None`
+        @param workers - the number of pages requested concurrently in threads
+                         once the first page tells the total count
+        @param ordered - yield the items in order, otherwise the pages are
+                         yielded as soon as they are received
+        @param filters - the other parameters of the action
+        """
+        method = getattr(self, action_name)
+        offset = filters.pop('offset', None) or 0
+        filters.pop('limit', None)
+        while offset is not None:
+            resp = method(offset=offset, limit=page_size, **filters)
+            items, result_key, total_count = self._read_page(
+                action_name, resp, result_key)
+            for item in items:
+                yield item
+            if workers > 1 and items and total_count is not None:
+                break
+            offset = self._next_offset(offset, page_size, items, total_count)
+        else:
+            return
+
+        # the other pages are independent, they have the size of the first
+        # one as the service may return less items than asked
+        size = len(items)
+
+        def fetch(offset):
+            resp = method(offset=offset, limit=size, **filters)
+            return self._read_page(action_name, resp, result_key)[0]
+
+        offsets = range(offset + size, total_count, size)
+        for items in self._fetch_pages(fetch, offsets, workers, ordered):
+            for item in items:
+                yield item
+
+    def _fetch_pages(self, fetch, offsets, workers, ordered):
+        """ Fetch the pages at `offsets` in a pool of threads,
+            at most `workers` pages are requested or waiting to be yielded
+        """
+        # "futures" is a backport on python 2
+        from concurrent import futures
+        from .batch import run_bounded
+
+        executor = futures.ThreadPoolExecutor(max_workers=workers)
+        pages = run_bounded(lambda offset: executor.submit(fetch, offset),
+                            offsets, workers, ordered)
+        try:
+            for future in pages:
+                yield future.result()
+        finally:
+            # the pages not requested yet are cancelled
+            pages.close()
+            executor.shutdown(wait=False)
+
+    def loader(self, action_name, **options):
+        """ Get the `ResourceLoader` of a describe action shared by the
+            callers with the same options, e.g.
+            `conn.loader("describe_instances", verbose=1).load("i-12345678")`
+
+        @param action_name - the name of the method, e.g. "describe_instances"
+        @param options - the options of `ResourceLoader` and the other
+                         parameters of the action, they must be
+                         serializable to JSON
+        """
+        key = (action_name, json_dump(options))
+        if key[1] is None:
+            raise InvalidParameterError(
+                'options of [%s] can not be serialized: %s'
+                % (action_name, options))
+        loader = self._loaders.get(key)
+        if loader is None:
+            loader = self._loaders.setdefault(
+                key, self.loader_class(self, action_name, **options))
+        return loader
+
+    def _read_page(self, action_name, resp, result_key):
+        """ Read a page of `paginate`
+            @return (items, result_key, total_count)
+        """
+        if not resp:
+            raise APIError(None, '%s returns no response' % action_name)
+        if resp.get('ret_code'):
+            raise APIError(resp['ret_code'], resp.get('message'))
+        if result_key is None:
+            result_key = self._find_result_key(action_name, resp)
+        return resp.get(result_key) or [], result_key, resp.get('total_count')
+
+    def _find_result_key(self, action_name, resp):
+        keys = [key for (key, value) in resp.items()
+                if key.endswith('_set') and isinstance(value, list)]
+        if len(keys) <= 1:
+            return keys[0] if keys else None
+        # e.g. "instance_set" of "describe_instances" and of
+        # "describe_vxnet_instances", "cache_set" of "describe_caches"
+        words = action_name.split('_')[1:]
+        for i in range(len(words)):
+            noun = '_'.join(words[i:])
+            for singular in (noun[:-1], noun[:-2], noun):
+                if singular + '_set' in keys:
+                    return singular + '_set'
+        raise InvalidParameterError(
+            'result_key of [%s] should be one of %s' % (action_name, keys))
+
+    def _next_offset(self, offset, page_size, items, total_count):
+        """ The offset of the next page, or `None` after the last page
+        """
+        offset += len(items)
+        if not items:
+            return None
+        if total_count is not None:
+            # the service may return less items than asked per page
+            return offset if offset < total_count else None
+        return offset if len(items) >= page_size else None
+
     def describe_access_keys(self,
                              access_keys=None,
                              status=None,
@@ -508,7 +701,7 @@ class APIConnection(HttpConnection):
             return None
 
         resp = self.send_request(action, body)
-        if resp and resp.get('meter_set') and decompress:
+        if decompress and resp and resp.get('meter_set'):
             p = MonitorProcessor(resp['meter_set'], start_time, end_time, step)
             resp['meter_set'] = p.decompress_monitoring_data()
         return resp
@@ -541,7 +734,7 @@ class APIConnection(HttpConnection):
             return None
 
         resp = self.send_request(action, body)
-        if resp and resp.get('meter_set') and decompress:
+        if decompress and resp and resp.get('meter_set'):
             p = MonitorProcessor(resp['meter_set'], start_time, end_time, step)
             resp['meter_set'] = p.decompress_lb_monitoring_data()
         return resp
@@ -1382,15 +1575,54 @@ class APIConnection(HttpConnection):
 
         return self.send_request(action, body)
 
+    @property
+    def actions(self):
+        """ All the action objects, in the order methods are looked up
+        """
+        if self._action_list is None:
+            self._action_list = [self._get_action(module, name)
+                                 for (module, name, _) in ACTIONS]
+        return self._action_list
+
+    def __dir__(self):
+        names = set(dir(type(self)))
+        names.update(self.__dict__)
+        names.update(ACTION_INDEX)
+        return sorted(names)
+
     def __getattr__(self, attr):
         """ Get api functions from each Action class
         """
-        for action in self.actions:
+        if '_actions' not in self.__dict__:
+            # not initialized yet
+            raise InvalidAction(attr)
+        method = self._bind_action(self._find_action(attr))
+        # cached on the instance, next lookups do not get here
+        self.__dict__[attr] = method
+        return method
+
+    def _get_action(self, module, name):
+        action = self._actions.get(name)
+        if action is None:
+            action = get_action_class(module, name)(self)
+            self._actions[name] = action
+        return action
+
+    def _find_action(self, attr):
+        if attr in ACTION_INDEX:
+            return getattr(self._get_action(*ACTION_INDEX[attr]), attr)
+        # actions added to `actions`
+        for action in self._action_list or ():
             if hasattr(action, attr):
                 return getattr(action, attr)
 
         raise InvalidAction(attr)
 
+    def _bind_action(self, method):
+        """ Adapt an action method before it's cached
+        """
+        return method
+
     def get_balance(self, **ignore):
         """Get the balance information filtered by conditions.
         """
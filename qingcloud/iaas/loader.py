@@ -0,0 +1,201 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Batching of the lookups of resources by ID.
+"""
+
+import threading
+from copy import deepcopy
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .cache import singular
+
+
+class ResourceLoader(object):
+    """ Merge the lookups of resources by ID into describe calls with a list
+        of IDs, like a DataLoader. It's thread-safe
+
+        The IDs looked up within `window` seconds, or within a `batch`
+        context, are described together, `max_batch` IDs per call. Each
+        caller gets its own resource, or `None` if it's not found.
+
+        Example:
+            loader = conn.loader('describe_instances', verbose=1)
+            instance = loader.load('i-12345678')
+
+            with loader.batch():
+                futures = [loader.submit(i) for i in instance_ids]
+            instances = [f.result() for f in futures]
+    """
+
+    def __init__(self, conn, action_name, id_param=None, id_key=None,
+                 result_key=None, max_batch=100, window=0.005, **filters):
+        """
+        @param conn - the `APIConnection`
+        @param action_name - the describe method, e.g. "describe_instances"
+        @param id_param - the list parameter of the IDs, e.g. "instances",
+                          the resource type of the action if `None`
+        @param id_key - the key of the IDs in the resources, e.g. "instance_id",
+                        the singular of `id_param` with "_id" if `None`
+        @param result_key - the key of the resources in the responses,
+                            e.g. "instance_set", found in the first one if `None`
+        @param max_batch - the maximum number of IDs per call
+        @param window - seconds the lookups are collected before they are sent
+        @param filters - the other parameters of the describe calls
+        """
+        self.conn = conn
+        self.action_name = action_name
+        self.id_param = id_param or action_name.split('_', 1)[1]
+        self.id_key = id_key or singular(self.id_param) + '_id'
+        self.result_key = result_key
+        self.max_batch = max_batch
+        self.window = window
+        self.filters = filters
+        self.lock = threading.Lock()
+        # the futures of the callers of each ID
+        self.pending = OrderedDict()
+        self.batches = 0
+        self.timer = None
+        self.loads = 0
+        self.calls = 0
+
+    def submit(self, resource_id):
+        """ Look up a resource without waiting
+            @return the `Future` of the resource
+        """
+        future = self._new_future()
+        with self.lock:
+            self.loads += 1
+            self.pending.setdefault(resource_id, []).append(future)
+            if not self.batches and self.timer is None:
+                self.timer = self._schedule()
+        return future
+
+    def load(self, resource_id):
+        """ Look up a resource, a `load` in a `batch` context sends the
+            lookups submitted so far
+            @return the resource or `None` if it's not found
+        """
+        future = self.submit(resource_id)
+        if self.batches:
+            self.dispatch()
+        return future.result()
+
+    def load_many(self, resource_ids):
+        """ Look up resources at once
+            @return the list of the resources, `None` for the ones not found
+        """
+        futures = [self.submit(resource_id) for resource_id in resource_ids]
+        self.dispatch()
+        return [future.result() for future in futures]
+
+    @contextmanager
+    def batch(self):
+        """ Collect the lookups until the end of the context,
+            they are sent together when it exits
+        """
+        with self.lock:
+            self.batches += 1
+            self._cancel_timer()
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batches -= 1
+                last = not self.batches
+            if last:
+                self.dispatch()
+
+    def dispatch(self):
+        """ Send the pending lookups now
+        """
+        for (chunk, pending) in self._take_chunks():
+            try:
+                resp = getattr(self.conn, self.action_name)(
+                    **self._params(chunk))
+            except Exception as e:
+                self._resolve(chunk, pending, error=e)
+            else:
+                self._resolve(chunk, pending, resp)
+
+    def _new_future(self):
+        # "futures" is a backport on python 2
+        from concurrent.futures import Future
+        return Future()
+
+    def _schedule(self):
+        timer = threading.Timer(self.window, self.dispatch)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def _cancel_timer(self):
+        # caller should hold `lock`
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def _take_chunks(self):
+        with self.lock:
+            pending, self.pending = self.pending, OrderedDict()
+            self._cancel_timer()
+        ids = list(pending)
+        chunks = [ids[i:i + self.max_batch]
+                  for i in range(0, len(ids), self.max_batch)]
+        with self.lock:
+            self.calls += len(chunks)
+        return [(chunk, pending) for chunk in chunks]
+
+    def _params(self, chunk):
+        params = dict(self.filters)
+        params[self.id_param] = chunk
+        params['limit'] = self.max_batch
+        return params
+
+    def _resolve(self, chunk, pending, resp=None, error=None):
+        """ Set the resources of `chunk` on the futures of their callers
+        """
+        items = []
+        if error is None:
+            try:
+                items, self.result_key, _ = self.conn._read_page(
+                    self.action_name, resp, self.result_key)
+            except Exception as e:
+                error = e
+        resources = dict((item.get(self.id_key), item) for item in items)
+        for resource_id in chunk:
+            resource = resources.get(resource_id)
+            for (i, future) in enumerate(pending[resource_id]):
+                if future.done():
+                    # cancelled by its caller
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    # the callers of the same ID get their own copy
+                    future.set_result(resource if i == 0 else
+                                      deepcopy(resource))
+
+    def stats(self):
+        """ Get a snapshot of the statistics, such as:
+            {'loads': 1000, 'calls': 10, 'pending': 0}
+            `loads` counts the lookups and `calls` the describe calls.
+        """
+        with self.lock:
+            return {'loads': self.loads, 'calls': self.calls,
+                    'pending': len(self.pending)}
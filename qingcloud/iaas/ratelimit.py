@@ -0,0 +1,200 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Client-side rate limiting of API requests.
+"""
+
+import math
+import time
+import threading
+
+
+class TokenBucket(object):
+    """ Token bucket refilled at `rate` tokens per second.
+        It's thread-safe
+
+        Tokens are reserved ahead, the bucket goes into debt when callers
+        are waiting so that `reserve` tells how long to wait without
+        blocking, for threads and event loops alike.
+
+        The rate adapts AIMD-style: `throttled` cuts it by a factor and
+        `recover` increases it linearly with time, up to `max_rate`.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None):
+        """
+        @param rate - the maximum number of tokens per second
+        @param burst - the capacity of the bucket, `rate` or 1 if `None`
+        @param min_rate - the rate is never cut below it, 1% of `rate` if `None`
+        """
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.burst = burst or max(self.max_rate, 1)
+        self.min_rate = min_rate or self.max_rate / 100
+        self.tokens = float(self.burst)
+        self.lock = threading.Lock()
+        self.last_refill = self.last_recover = time.time()
+        self.last_decrease = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def reserve(self, tokens=1):
+        """ Take `tokens` out of the bucket
+            @return the seconds to wait before using them
+        """
+        with self.lock:
+            self._refill(time.time())
+            self.tokens -= tokens
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def waiting(self):
+        """ The number of tokens reserved but not available yet, as many
+            as callers waiting for a token of their own
+        """
+        with self.lock:
+            self._refill(time.time())
+            return max(0, int(math.ceil(-self.tokens)))
+
+    def throttled(self, factor=0.5, cooldown=1.0):
+        """ Cut the rate by `factor`, at most once per `cooldown` seconds
+            as the requests in flight are throttled at once
+        """
+        with self.lock:
+            now = time.time()
+            if now - self.last_decrease < cooldown:
+                return
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * factor)
+            self.last_decrease = self.last_recover = now
+
+    def recover(self, increase):
+        """ Increase the rate by `increase` tokens per second of the time
+            elapsed since the rate was last changed, up to `max_rate`
+        """
+        if self.rate >= self.max_rate:
+            return
+        with self.lock:
+            now = time.time()
+            self._refill(now)
+            self.rate = min(self.max_rate,
+                            self.rate + (now - self.last_recover) * increase)
+            self.last_recover = now
+
+
+class RateLimiter(object):
+    """ Rate limiter of API requests, adapting to the throttling of the
+        service. It's thread-safe, and can be shared by connections so
+        that they are limited together.
+
+        Every request takes a token of the bucket of all the actions and
+        one of the bucket of its action, if any. When a response has one
+        of `throttle_codes` the rates of both buckets are cut by
+        `decrease`, they recover by `increase` of their maximum rate
+        per second while requests succeed.
+
+        Example:
+            limiter = RateLimiter(rate=20, action_rates={'RunInstances': 1})
+            conn = APIConnection(..., rate_limiter=limiter)
+    """
+
+    def __init__(self, rate=10, burst=None, action_rates=None,
+                 throttle_codes=(5100, ), decrease=0.5, increase=0.05,
+                 cooldown=1.0, min_rate=None):
+        """
+        @param rate - the maximum number of requests per second
+        @param burst - the number of requests sent at once after idling
+        @param action_rates - dict of the maximum requests per second of
+                              actions, e.g. {'RunInstances': 1}
+        @param throttle_codes - the ret codes of throttled requests
+        @param decrease - the factor the rates are cut by when throttled
+        @param increase - the fraction of the maximum rate recovered per second
+        @param cooldown - the seconds the rates are not cut again after a cut
+        @param min_rate - the rates are never cut below it
+        """
+        self.bucket = TokenBucket(rate, burst, min_rate)
+        self.action_buckets = {}
+        for (action, action_rate) in (action_rates or {}).items():
+            self.action_buckets[action] = TokenBucket(
+                action_rate, min_rate=min_rate)
+        self.throttle_codes = throttle_codes
+        self.decrease = decrease
+        self.increase = increase
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.throttled_count = 0
+        self.wait_time = 0.0
+
+    def _buckets(self, action):
+        bucket = self.action_buckets.get(action)
+        return (self.bucket, bucket) if bucket else (self.bucket, )
+
+    def reserve(self, action):
+        """ Take the tokens of a request of `action`
+            @return the seconds to wait before sending it
+        """
+        delay = max([bucket.reserve() for bucket in self._buckets(action)])
+        if delay:
+            with self.lock:
+                self.wait_time += delay
+        return delay
+
+    def acquire(self, action):
+        """ Wait until a request of `action` can be sent
+        """
+        delay = self.reserve(action)
+        if delay:
+            time.sleep(delay)
+
+    def feedback(self, action, ret_code):
+        """ Adapt the rates to the ret code of a response of `action`
+        """
+        if ret_code in self.throttle_codes:
+            with self.lock:
+                self.throttled_count += 1
+            for bucket in self._buckets(action):
+                bucket.throttled(self.decrease, self.cooldown)
+        else:
+            for bucket in self._buckets(action):
+                bucket.recover(self.increase * bucket.max_rate)
+
+    def stats(self):
+        """ Get a snapshot of the limiter metrics, such as:
+            {
+                'rate': 5.0, 'max_rate': 10.0, 'waiting': 3,
+                'throttled': 2, 'wait_time': 12.5,
+                'actions': {
+                    'RunInstances': {'rate': 1.0, 'max_rate': 1.0, 'waiting': 0},
+                },
+            }
+            `waiting` is the queue depth, the requests waiting for a token,
+            `throttled` counts the throttled responses and `wait_time` the
+            seconds requests were delayed in total.
+        """
+        stats = self._bucket_stats(self.bucket)
+        stats['throttled'] = self.throttled_count
+        stats['wait_time'] = self.wait_time
+        stats['actions'] = dict((action, self._bucket_stats(bucket))
+                                for (action, bucket)
+                                in self.action_buckets.items())
+        return stats
+
+    def _bucket_stats(self, bucket):
+        return {'rate': bucket.rate, 'max_rate': bucket.max_rate,
+                'waiting': bucket.waiting()}
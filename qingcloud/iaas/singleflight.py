@@ -0,0 +1,110 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+"""
+Coalescing of identical requests in flight.
+"""
+
+import threading
+
+from qingcloud.misc.json_tool import json_load
+
+
+class Flight(object):
+    """ A request in flight and the callers waiting for it
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """ Share one request among the identical read-only requests in
+        flight at the same time. It's thread-safe, and can be shared by
+        connections.
+
+        The first caller sends the request, the others wait for its
+        response, or its error. Unless `share` is set, each of them gets
+        its own object parsed from the raw body so that callers can
+        modify it.
+
+        Requests are keyed like the responses of `ResponseCache`, on the
+        access key and the endpoint of the connection too, so that
+        connections of different accounts never share a flight.
+    """
+
+    def __init__(self, share=False):
+        """
+        @param share - the callers get the same parsed response,
+                       which they must not modify
+        """
+        self.share = share
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, func):
+        """ Call `func`, or wait for the call in flight with the same key
+        @param func - sends the request,
+                      returns (raw body, parsed response)
+        @return the parsed response
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is None:
+                flight = self.flights[key] = Flight()
+                self.calls += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return self._copy(*flight.result)
+
+        try:
+            flight.result = func()
+        except BaseException as e:
+            # e.g. KeyboardInterrupt, the waiting callers get it too
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.result[1]
+
+    def _copy(self, body, resp):
+        # the response of a caller waiting for the request of another one
+        if self.share or not body:
+            return resp
+        return json_load(body)
+
+    def stats(self):
+        """ Get a snapshot of the statistics, such as:
+            {'calls': 10, 'shared': 90, 'in_flight': 1}
+            `calls` counts the requests sent and `shared` the callers which
+            got the response of a request in flight.
+        """
+        with self.lock:
+            return {'calls': self.calls, 'shared': self.shared,
+                    'in_flight': len(self.flights)}
@@ -18,8 +18,78 @@
 import json as jsmod
 
 
-def json_dump(obj, indent=None):
+class JSONBackend(object):
+    """ JSON codec used by `json_load`, `loads` accepts str and utf-8 bytes
+    """
+
+    def __init__(self, name, loads):
+        self.name = name
+        self.loads = loads
+
+    def __repr__(self):
+        return '<JSONBackend: %s>' % self.name
+
+
+def _orjson_backend():
+    import orjson
+    return JSONBackend('orjson', orjson.loads)
+
+
+def _ujson_backend():
+    import ujson
+    return JSONBackend('ujson', ujson.loads)
+
+
+# the single stdlib backend, which `json_load` falls back to
+_stdlib = JSONBackend('json', jsmod.loads)
+
+
+def _stdlib_backend():
+    return _stdlib
+
+
+# backends by name, the faster ones are tried first by default
+BACKENDS = {
+    'orjson': _orjson_backend,
+    'ujson': _ujson_backend,
+    'json': _stdlib_backend,
+}
+DEFAULT_BACKENDS = ('orjson', 'json')
+
+_backend = None
+
+
+def set_json_backend(backend=None):
+    """ Set the codec used by `json_load`
+        @param backend - the name of a codec in `BACKENDS`, a `JSONBackend`,
+                         or `None` for the first installed of `DEFAULT_BACKENDS`
+        @return the `JSONBackend` set
+    """
+    global _backend
+    if isinstance(backend, JSONBackend):
+        _backend = backend
+    elif backend is not None:
+        _backend = BACKENDS[backend]()
+    else:
+        for name in DEFAULT_BACKENDS:
+            try:
+                _backend = BACKENDS[name]()
+                break
+            except ImportError:
+                continue
+    return _backend
+
+
+def get_json_backend():
+    return _backend
+
+
+set_json_backend()
+
+
+def json_dump(obj, indent=None, sort_keys=True):
     """ Dump an object to json string, only basic types are supported.
+        @param sort_keys - sort the keys of dicts, for a stable output
         @return json string or `None` if failed
 
         >>> json_dump({'int': 1, 'none': None, 'str': 'string'})
@@ -27,23 +97,29 @@ def json_dump(obj, indent=None):
     """
     try:
         jstr = jsmod.dumps(obj, separators=(',', ':'),
-                           indent=indent, sort_keys=True)
+                           indent=indent, sort_keys=sort_keys)
     except:
         jstr = None
     return jstr
 
 
 def json_load(json):
-    """ Load from json string and create a new python object
+    """ Load from json string or utf-8 bytes and create a new python object
         @return object or `None` if failed
 
         >>> json_load('{"int":1,"none":null,"str":"string"}')
         {u'int': 1, u'none': None, u'str': u'string'}
     """
     try:
-        obj = jsmod.loads(json)
+        obj = _backend.loads(json)
     except:
-        obj = None
+        if _backend is _stdlib:
+            return None
+        # faster codecs may reject what the stdlib accepts, e.g. big integers
+        try:
+            obj = _stdlib.loads(json)
+        except:
+            obj = None
     return obj
 
-__all__ = [json_dump, json_load]
+__all__ = ['json_dump', 'json_load', 'set_json_backend', 'get_json_backend']
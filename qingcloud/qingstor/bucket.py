@@ -95,6 +95,18 @@ class Bucket(object):
         """
         return Key(self, key_name)
 
+    def generate_presigned_urls(self, key_names, expires, method="GET"):
+        """ Generate presigned urls of objects within the bucket in bulk.
+        Returns: The list of urls, in the order of `key_names`
+
+        Keyword arguments:
+        key_names - The names of the objects
+        expires - The number of seconds the urls are valid for
+        method - The http method allowed by the urls (Default: "GET")
+        """
+        return self.connection.generate_presigned_urls(self.name, key_names,
+                                                       expires, method)
+
     def copy_key(self, key_name, source_bucket_name, source_key_name, headers=None):
         """ Create a new object within the bucket by copying from existing object.
 
@@ -70,7 +70,9 @@ class QSConnection(HttpConnection):
     def __init__(self, qy_access_key_id=None, qy_secret_access_key=None,
                  host="qingstor.com", port=443, protocol="https",
                  style_format_class=VirtualHostStyleFormat,
-                 retry_time=3, timeout=900, debug=False):
+                 retry_time=3, timeout=900, debug=False,
+                 ssl_context=None, tls_session_cache=True, socket_options=None,
+                 dns_cache=None):
         """
         @param qy_access_key_id - the access key id
         @param qy_secret_access_key - the secret access key
@@ -80,6 +82,10 @@ class QSConnection(HttpConnection):
         @param retry_time - the retry_time when message send fail
         @param timeout - blocking operations will timeout after that many seconds
         @param debug - debug mode
+        @param ssl_context - the `ssl.SSLContext` shared by https connections
+        @param tls_session_cache - resume TLS sessions for new connections
+        @param socket_options - list of (level, optname, value) set on new sockets
+        @param dns_cache - the `DNSCache` used to resolve hosts, `True` for the shared one
         """
 
         # Set default host
@@ -93,7 +99,9 @@ class QSConnection(HttpConnection):
 
         super(QSConnection, self).__init__(
             qy_access_key_id, qy_secret_access_key, host, port, protocol,
-            None, None, timeout, debug)
+            None, None, timeout, debug,
+            ssl_context=ssl_context, tls_session_cache=tls_session_cache,
+            socket_options=socket_options, dns_cache=dns_cache)
 
         if qy_access_key_id and qy_secret_access_key:
             self._auth_handler = QSSignatureAuthHandler(host, qy_access_key_id,
@@ -164,6 +172,42 @@ class QSConnection(HttpConnection):
             err = get_response_error(response)
             raise err
 
+    def generate_presigned_urls(self, bucket, keys, expires, method="GET"):
+        """ Generate presigned urls of objects, signed at once with the same
+        date, so that they can be handed out without the access key.
+        Returns: The list of urls, in the order of `keys`
+
+        Keyword arguments:
+        bucket - The name of the bucket
+        keys - The names of the objects
+        expires - The number of seconds the urls are valid for
+        method - The http method allowed by the urls (Default: "GET")
+        """
+        host = self.style_format.build_host(self.host, bucket)
+        if self.port != (443 if self.secure else 80):
+            host = "%s:%s" % (host, self.port)
+        base = "%s://%s" % (self.protocol, host)
+        paths = [self.style_format.build_path_base(bucket, key)
+                 for key in keys]
+        if self._auth_handler is None:
+            return [base + path for path in paths]
+
+        auth_paths = [self.style_format.build_auth_path(bucket, key)
+                      for key in keys]
+        auth_params = self._auth_handler.get_batch_auth_parameters(
+            method, auth_paths, expires)
+        if not auth_params:
+            return []
+        # only the signature differs between the urls
+        common = dict(auth_params[0])
+        del common["X-QS-Signature"]
+        query = "?%s&X-QS-Signature=" % self._build_params(common)
+        urls = []
+        for path, params in zip(paths, auth_params):
+            urls.append(base + path + query +
+                        quote_plus(params["X-QS-Signature"]))
+        return urls
+
     def _get_content_length(self, body):
         thelen = 0
         try:
@@ -227,8 +271,12 @@ class QSConnection(HttpConnection):
         return req
 
     def make_request(self, method, bucket="", key="", headers=None,
-                     data="", params=None, num_retries=3):
+                     data="", params=None, num_retries=3, stream=False):
         """ Make request
+
+        Keyword arguments:
+        stream - If ``True``, the response body is not cached, read it with
+            ``iter_chunks`` or ``readinto``. (Default: ``False``)
         """
         host = self.style_format.build_host(self.host, bucket)
         path = self.style_format.build_path_base(bucket, key)
@@ -253,7 +301,7 @@ class QSConnection(HttpConnection):
             next_sleep = random.random() * (2 ** retry_time)
             try:
                 response = self.send(method, path, params, headers, host,
-                                     auth_path, data)
+                                     auth_path, data, stream=stream)
                 if response.status == 307:
                     location = response.getheader("location")
                     host, path, params = self._urlparse(location)
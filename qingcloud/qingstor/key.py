@@ -33,15 +33,24 @@ class Key(object):
 
     def close(self):
         if self.resp:
-            self.resp.read()
+            if getattr(self.resp, 'cache_body', True):
+                self.resp.read()
+            else:
+                # the rest of a streamed body is not downloaded,
+                # its connection is closed instead of reused
+                self.resp.abort()
         self.resp = None
 
-    def open_read(self, headers=None):
+    def open_read(self, headers=None, stream=False):
         """ Open this key for reading.
+
+        Keyword arguments:
+        stream - If ``True``, the body is not cached in memory while read.
         """
         if self.resp is None:
             self.resp = self.bucket.connection.make_request(
-                "GET", self.bucket.name, self.name, headers=headers)
+                "GET", self.bucket.name, self.name, headers=headers,
+                stream=stream)
             if self.resp.status != 200 and self.resp.status != 206:
                 err = get_response_error(self.resp)
                 raise err
@@ -63,6 +72,32 @@ class Key(object):
             self.resp.close()
         return data
 
+    def iter_chunks(self, chunk_size=None, headers=None):
+        """ Iterate over the content of the object in chunks, memory usage
+        is bounded by the chunk size.
+
+        Keyword arguments:
+        chunk_size - The maximum size of each chunk
+        headers - The headers of the GET request, such as ``Range``
+        """
+        self.open_read(headers, stream=True)
+        try:
+            for chunk in self.resp.iter_chunks(chunk_size):
+                yield chunk
+        finally:
+            # also when the iteration is stopped early
+            self.close()
+
+    def readinto(self, buffer):
+        """ Read the next bytes of the object into a caller-owned buffer.
+        Returns: The number of bytes read, 0 at the end of the object.
+        """
+        self.open_read(stream=True)
+        size = self.resp.readinto(buffer)
+        if not size:
+            self.close()
+        return size
+
     def send_file(self, fp, content_type=None):
         """ Upload a file to a key into the bucket.
 
@@ -24,7 +24,6 @@ setup(
     packages=['qingcloud', 'qingcloud.conn', 'qingcloud.iaas', 'qingcloud.iaas.actions',
               'qingcloud.misc', 'qingcloud.qingstor', 'qingcloud.qai'],
     package_dir={'qingcloud-sdk': 'qingcloud'},
-    namespace_packages=['qingcloud'],
     include_package_data=True,
-    install_requires=['future', 'requests']
+    install_requires=['future', 'requests', 'futures; python_version<"3"']
 )
@@ -1,9 +1,59 @@
+import os
+import ssl
 import mock
 import unittest
+import threading
 try:
     import httplib
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
 except:
     import http.client as httplib
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+from qingcloud.conn.connection import HTTPResponse
+
+# self-signed certificate and key of "localhost" for local https servers
+LOCALHOST_PEM = os.path.join(os.path.dirname(__file__), 'data', 'localhost.pem')
+
+
+class LocalHTTPServer(ThreadingMixIn, HTTPServer):
+    """Local stand-in server running in a daemon thread."""
+    daemon_threads = True
+
+    def __init__(self, handler_class, tls=False):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), handler_class)
+        if tls:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(LOCALHOST_PEM)
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+        self.port = self.server_address[1]
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class LocalRequestHandler(BaseHTTPRequestHandler):
+    """Keep-alive handler answering every request with `body`."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    body = b'{"ret_code":0}'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
 
 
 class MockTestCase(unittest.TestCase):
@@ -32,7 +82,7 @@ class MockTestCase(unittest.TestCase):
         if body is None:
             body = ""
 
-        response = mock.Mock(spec=httplib.HTTPResponse)
+        response = mock.Mock(spec=HTTPResponse)
         response.status = status_code
         response.read.return_value = body
         response.length = len(body)
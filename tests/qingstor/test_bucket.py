@@ -1,5 +1,10 @@
 import json
 import unittest
+try:
+    from urllib.parse import parse_qsl, quote
+except ImportError:
+    from urllib import quote
+    from urlparse import parse_qsl
 
 from tests import MockTestCase
 from qingcloud.qingstor.connection import QSConnection
@@ -30,6 +35,26 @@ class TestQingStorBucket(MockTestCase):
         key = self.bucket.get_key("myobject")
         self.assertEqual(key.name, "myobject")
 
+    def test_bucket_generate_presigned_urls(self):
+        keys = ["myobject", "dir/my object"]
+        urls = self.bucket.generate_presigned_urls(keys, 3600)
+        self.assertEqual(len(urls), 2)
+        handler = self.connection._auth_handler
+        for key, url in zip(keys, urls):
+            (base, query) = url.split("?")
+            self.assertEqual(
+                base, "https://mybucket.qingstor.com/%s" % quote(key))
+            params = dict(parse_qsl(query))
+            self.assertEqual(params["X-QS-Expires"], "3600")
+            self.assertEqual(params["X-QS-Credential"], "access_key_id")
+            # same signature as signing the url alone
+            signature = params.pop("X-QS-Signature")
+            self.assertEqual(signature, handler._generate_signature(
+                "GET", "/mybucket/%s" % quote(key), list(params.items()), {}))
+        params = handler.get_auth_parameters("GET", "/mybucket/myobject", 60)
+        self.assertIn("X-QS-Signature", params)
+        self.assertEqual(params["X-QS-Expires"], "60")
+
     def test_bucket_delete_key(self):
         self.mock_http_response(status_code=204)
         self.bucket.delete_key("myobject")
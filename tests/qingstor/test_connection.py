@@ -52,5 +52,16 @@ class TestQingStorConnection(MockTestCase):
         buckets = self.conn.get_all_buckets()
         self.assertDictEqual(buckets, body)
 
+    def test_connection_pool_stats(self):
+        self.https_connection.host = "test-bucket.qingstor.com"
+        self.https_connection.port = 443
+        self.mock_http_response(status_code=200)
+        self.conn.get_bucket(bucket="test-bucket")
+        self.conn.get_bucket(bucket="test-bucket")
+        stats = self.conn._conn.stats()["hosts"]["test-bucket.qingstor.com:443"]
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["idle"], 1)
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,4 +1,5 @@
 import os
+import mock
 import unittest
 
 from tests import MockTestCase
@@ -27,6 +28,37 @@ class TestQingStorKey(MockTestCase):
         data = self.key.read()
         self.assertEqual(data, "hello world")
 
+    def test_key_iter_chunks(self):
+        self.mock_http_response(status_code=200)
+        response = self.https_connection.getresponse.return_value
+        response.iter_chunks = mock.Mock(return_value=iter([b"hello ", b"world"]))
+        self.assertEqual(list(self.key.iter_chunks(6)), [b"hello ", b"world"])
+        response.iter_chunks.assert_called_once_with(6)
+        self.assertIsNone(self.key.resp)
+
+    def test_key_iter_chunks_stopped(self):
+        self.mock_http_response(status_code=200)
+        response = self.https_connection.getresponse.return_value
+        response.abort = mock.Mock()
+        response.iter_chunks = mock.Mock(
+            return_value=iter([b"hello ", b"world"]))
+        for chunk in self.key.iter_chunks(6):
+            break
+        # the rest of the body is not downloaded
+        response.abort.assert_called_once_with()
+        self.assertFalse(response.read.called)
+        self.assertIsNone(self.key.resp)
+
+    def test_key_readinto(self):
+        self.mock_http_response(status_code=200)
+        response = self.https_connection.getresponse.return_value
+        response.readinto = mock.Mock(side_effect=[5, 0])
+        response.abort = mock.Mock()
+        buf = bytearray(5)
+        self.assertEqual(self.key.readinto(buf), 5)
+        self.assertEqual(self.key.readinto(buf), 0)
+        self.assertIsNone(self.key.resp)
+
     def test_key_send_file(self):
         with open(".test_key_send_file", "w+") as f:
             f.write("hello world")
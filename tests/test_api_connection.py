@@ -0,0 +1,254 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import os
+import sys
+import time
+import inspect
+import pkgutil
+import unittest
+import subprocess
+from importlib import import_module
+
+from qingcloud.iaas import actions
+from qingcloud.iaas.actions import ACTIONS, ACTION_INDEX, get_action_class
+from qingcloud.iaas.connection import APIConnection
+from qingcloud.iaas.errors import APIError, InvalidAction
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ActionDispatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = APIConnection('access_key_id', 'secret_access_key',
+                                  'pek3a')
+
+    def test_dispatch(self):
+        for action in self.conn.actions:
+            for name in dir(action):
+                if name.startswith('_') or name == 'conn':
+                    continue
+                # the first action defining the method, as a linear search
+                expected = [a for a in self.conn.actions if hasattr(a, name)][0]
+                method = getattr(self.conn, name)
+                self.assertIs(method.__self__, expected)
+                self.assertIs(method.__func__,
+                              getattr(type(expected), name))
+
+    def test_bound_method_cached(self):
+        method = self.conn.describe_instances
+        self.assertIs(self.conn.describe_instances, method)
+        self.assertIs(self.conn.create_vpc_borders,
+                      self.conn.create_vpc_borders)
+
+    def test_invalid_action(self):
+        self.assertRaises(InvalidAction, getattr, self.conn, 'no_such_action')
+
+    def test_action_added_later(self):
+        class CustomAction(object):
+            def custom_action(self):
+                return 'custom'
+        self.conn.actions.append(CustomAction())
+        self.assertEqual(self.conn.custom_action(), 'custom')
+
+    def test_action_index(self):
+        # the static index is up to date with the action classes
+        for module, name, methods in ACTIONS:
+            action_class = get_action_class(module, name)
+            self.assertEqual(methods, tuple(
+                n for n in vars(action_class) if not n.startswith('_')))
+        self.assertEqual(len(ACTION_INDEX),
+                         sum(len(methods) for (_, _, methods) in ACTIONS))
+
+    def test_action_index_complete(self):
+        # every class of the action modules is in the static index,
+        # so that a new action class or method is never undispatchable
+        classes = set()
+        for module_info in pkgutil.iter_modules(actions.__path__):
+            module = import_module('%s.%s' % (actions.__name__,
+                                              module_info[1]))
+            for name, obj in vars(module).items():
+                if inspect.isclass(obj) and obj.__module__ == module.__name__:
+                    classes.add((module_info[1], name))
+        self.assertEqual(set((module, name) for (module, name, _) in ACTIONS),
+                         classes)
+
+    def test_actions_created_lazily(self):
+        self.assertEqual(self.conn._actions, {})
+        self.conn.describe_vpc_borders
+        self.assertEqual(list(self.conn._actions), ['VpcBorder'])
+        self.assertEqual(len(self.conn.actions), len(ACTIONS))
+        self.assertIs(self.conn.actions[-1], self.conn._actions['VpcBorder'])
+
+    def test_dir(self):
+        names = dir(self.conn)
+        self.assertIn('describe_instances', names)
+        self.assertIn('create_vpc_borders', names)
+        self.assertIn('send_request', names)
+
+
+class PaginateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = APIConnection('access_key_id', 'secret_access_key',
+                                  'pek3a')
+        self.instances = [{'instance_id': 'i-%08d' % i} for i in range(250)]
+        self.requests = []
+        self.conn.send_request = self.send_request
+
+    def send_request(self, action, body, url="/iaas/", verb="GET"):
+        self.requests.append(dict(body))
+        # the service returns at most 100 items per page
+        limit = min(body['limit'], 100)
+        return {'action': action + 'Response', 'ret_code': 0,
+                'total_count': len(self.instances),
+                'instance_set': self.instances[body['offset']:
+                                               body['offset'] + limit]}
+
+    def test_paginate(self):
+        pages = self.conn.paginate('describe_instances', page_size=100,
+                                   status=['running'])
+        self.assertEqual(self.requests, [])
+        self.assertEqual(next(pages), self.instances[0])
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(list(pages), self.instances[1:])
+        self.assertEqual([(r['offset'], r['limit']) for r in self.requests],
+                         [(0, 100), (100, 100), (200, 100)])
+        self.assertEqual(self.requests[0]['status'], ['running'])
+
+    def test_page_size_capped(self):
+        self.assertEqual(
+            list(self.conn.paginate('describe_instances', page_size=1000)),
+            self.instances)
+        self.assertEqual([r['offset'] for r in self.requests], [0, 100, 200])
+
+    def test_empty(self):
+        self.instances = []
+        self.assertEqual(list(self.conn.paginate('describe_instances')), [])
+        self.assertEqual(len(self.requests), 1)
+
+    def test_error(self):
+        self.conn.send_request = lambda *args: {'ret_code': 1400,
+                                                'message': 'invalid'}
+        pages = self.conn.paginate('describe_instances')
+        self.assertRaises(APIError, next, pages)
+
+    def test_concurrent(self):
+        self.instances = self.instances * 4
+        pages = self.conn.paginate('describe_instances', page_size=100,
+                                   workers=4)
+        self.assertEqual(list(pages), self.instances)
+        self.assertEqual(sorted(r['offset'] for r in self.requests),
+                         list(range(0, 1000, 100)))
+
+    def test_concurrent_unordered(self):
+        send_request = self.send_request
+
+        def slow_first_page(action, body, *args):
+            if body['offset'] == 100:
+                time.sleep(0.2)
+            return send_request(action, body)
+
+        self.conn.send_request = slow_first_page
+        pages = self.conn.paginate('describe_instances', page_size=1000,
+                                   workers=2, ordered=False)
+        instances = list(pages)
+        # the service caps the pages to 100 items, following pages too
+        self.assertEqual(instances[:100], self.instances[:100])
+        self.assertEqual(instances[100:], self.instances[200:] +
+                         self.instances[100:200])
+        self.assertEqual([r['limit'] for r in self.requests],
+                         [1000, 100, 100])
+
+    def test_concurrent_error(self):
+        send_request = self.send_request
+
+        def fail(action, body, *args):
+            if body['offset'] == 100:
+                return {'ret_code': 5100, 'message': 'busy'}
+            return send_request(action, body)
+
+        self.conn.send_request = fail
+        pages = self.conn.paginate('describe_instances', workers=2)
+        self.assertEqual(len([next(pages) for _ in range(100)]), 100)
+        self.assertRaises(APIError, next, pages)
+
+    def test_find_result_key(self):
+        resp = {'instance_set': [], 'volume_set': [], 'total_count': 0}
+        self.assertEqual(
+            self.conn._find_result_key('describe_vxnet_instances', resp),
+            'instance_set')
+        self.assertEqual(
+            self.conn._find_result_key('describe_volumes', resp),
+            'volume_set')
+        self.assertEqual(
+            self.conn._find_result_key('describe_eips', {'eip_set': []}),
+            'eip_set')
+
+
+class ImportTimeTestCase(unittest.TestCase):
+
+    # generous budget of the cumulative import time of `qingcloud.iaas`
+    BUDGET_US = 2000000
+    # of `qingcloud` alone, importing pkg_resources took longer
+    NAMESPACE_BUDGET_US = 150000
+
+    def _importtime(self, code):
+        proc = subprocess.Popen(
+            [sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, err = proc.communicate()
+        self.assertEqual(proc.returncode, 0, err)
+        times = {}
+        for line in err.decode().splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            parts = line[len('import time:'):].split('|')
+            if parts[0].strip().isdigit():
+                times[parts[2].strip()] = int(parts[1])
+        return times
+
+    def test_actions_not_imported(self):
+        times = self._importtime(
+            "import qingcloud.iaas;"
+            "qingcloud.iaas.connect_to_zone('pek3a', 'key', 'secret')")
+        self.assertIn('qingcloud.iaas', times)
+        self.assertLess(times['qingcloud.iaas'], self.BUDGET_US)
+        self.assertEqual([name for name in times
+                          if name.startswith('qingcloud.iaas.actions.')], [])
+
+    def test_namespace_package(self):
+        # the namespace package must not import pkg_resources
+        times = self._importtime(
+            "import qingcloud.iaas, qingcloud.qingstor")
+        self.assertNotIn('pkg_resources', times)
+        self.assertLess(times['qingcloud'], self.NAMESPACE_BUDGET_US)
+        self.assertLess(times['qingcloud.iaas'], self.BUDGET_US)
+
+    def test_action_imported_on_use(self):
+        # `importlib.import_module` is not reported by -X importtime
+        proc = subprocess.Popen(
+            [sys.executable, '-c',
+             "import sys, qingcloud.iaas;"
+             "qingcloud.iaas.connect_to_zone('pek3a', 'key', 'secret')"
+             ".describe_vpc_borders;"
+             "print(sorted(m for m in sys.modules"
+             " if m.startswith('qingcloud.iaas.actions.')))"],
+            cwd=ROOT, stdout=subprocess.PIPE)
+        out, _ = proc.communicate()
+        self.assertEqual(out.decode().strip(),
+                         "['qingcloud.iaas.actions.vpc_border']")
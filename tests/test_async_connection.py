@@ -0,0 +1,238 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import ssl
+import gzip
+import json
+import asyncio
+import unittest
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
+
+from tests import LOCALHOST_PEM, LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas.async_connection import AsyncAPIConnection
+from qingcloud.iaas.connection import APIConnection
+from qingcloud.iaas.errors import InvalidParameterError
+
+
+class APIRequestHandler(LocalRequestHandler):
+    """Answer with the queued ret codes, then with 0."""
+    requests = []
+    ret_codes = []
+    statuses = []
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        self.requests.append(params)
+        if self.statuses:
+            self.send_error(self.statuses.pop(0))
+            return
+        ret_code = self.ret_codes.pop(0) if self.ret_codes else 0
+        body = json.dumps({
+            'action': params['action'][0] + 'Response',
+            'ret_code': ret_code,
+            'total_count': 1,
+            'instance_set': [{'instance_id': 'i-12345678'}],
+        }).encode()
+        self.send_response(200)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class AsyncAPIConnectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        APIRequestHandler.requests = []
+        APIRequestHandler.ret_codes = []
+        APIRequestHandler.statuses = []
+        self.server = LocalHTTPServer(APIRequestHandler)
+        self.conn = AsyncAPIConnection('access_key_id', 'secret_access_key',
+                                       'pek3a', host='127.0.0.1',
+                                       port=self.server.port, protocol='http')
+
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.run_async(self.conn.close())
+        self.loop.close()
+        self.server.stop()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_action(self):
+        resp = self.run_async(self.conn.describe_instances(
+            instances=['i-12345678'], verbose=1))
+        self.assertEqual(resp['action'], 'DescribeInstancesResponse')
+        params = APIRequestHandler.requests[0]
+        self.assertEqual(params['instances.1'], ['i-12345678'])
+        self.assertEqual(params['zone'], ['pek3a'])
+        self.assertIn('signature', params)
+
+    def test_api_method(self):
+        resp = self.run_async(self.conn.get_balance())
+        self.assertEqual(resp['action'], 'GetBalanceResponse')
+
+    def test_invalid_params(self):
+        coro = self.conn.describe_instances(offset='invalid')
+        self.assertTrue(asyncio.iscoroutine(coro))
+        self.assertRaises(InvalidParameterError, self.run_async, coro)
+        self.assertEqual(APIRequestHandler.requests, [])
+
+    def test_https_proxy_rejected(self):
+        self.assertRaises(ValueError, self.conn.set_proxy, 'proxy', 3128,
+                          protocol='https')
+        self.conn.set_proxy('proxy', 3128)
+        self.assertEqual(self.conn._proxy_protocol, 'http')
+
+    def test_retry(self):
+        APIRequestHandler.ret_codes = [5100]
+        resp = self.run_async(self.conn.describe_instances())
+        self.assertEqual(resp['ret_code'], 0)
+        self.assertEqual(len(APIRequestHandler.requests), 2)
+
+    def test_retry_keeps_pool(self):
+        # a ret code retry reuses the connection of the previous attempt
+        sync_conn = APIConnection('access_key_id', 'secret_access_key',
+                                  'pek3a', host='127.0.0.1',
+                                  port=self.server.port, protocol='http',
+                                  retry_time=3)
+        for conn, pool in ((sync_conn, sync_conn._conn),
+                           (self.conn, self.conn._async_conn)):
+            conn.retry_time = 3
+            conn._backoff = lambda retry_time: 0
+            APIRequestHandler.ret_codes = [5100] * 3
+            if conn is sync_conn:
+                resp = conn.describe_instances()
+            else:
+                resp = self.run_async(conn.describe_instances())
+            self.assertEqual(resp['ret_code'], 5100)
+            stats = pool.stats()
+            self.assertEqual((stats['hits'], stats['misses'],
+                              stats['created']), (2, 1, 1))
+
+    def test_retry_errors_like_sync(self):
+        # both connections raise the error of the last attempt,
+        # and return `None` when no attempt is answered with status 200
+        port = self.server.port
+        sync_conn = APIConnection('access_key_id', 'secret_access_key',
+                                  'pek3a', host='127.0.0.1', port=port,
+                                  protocol='http', retry_time=2)
+        for conn in (sync_conn, self.conn):
+            conn.retry_time = 2
+            conn._backoff = lambda retry_time: 0
+        APIRequestHandler.statuses = [500] * 4
+        self.assertIsNone(sync_conn.describe_instances())
+        self.assertIsNone(self.run_async(self.conn.describe_instances()))
+        self.assertEqual(len(APIRequestHandler.requests), 4)
+
+        self.server.stop()
+        self.assertRaises(IOError, sync_conn.describe_instances)
+        self.assertRaises(IOError, self.run_async,
+                          self.conn.describe_instances())
+        self.server = LocalHTTPServer(APIRequestHandler)
+
+    def test_concurrent_requests_reuse_connections(self):
+        async def describe():
+            for _ in range(5):
+                await self.conn.describe_instances()
+
+        async def run():
+            await asyncio.gather(*[describe() for _ in range(4)])
+
+        self.run_async(run())
+        self.assertEqual(len(APIRequestHandler.requests), 20)
+        stats = self.conn._async_conn.stats()
+        self.assertEqual(stats['created'], 4)
+        self.assertEqual(stats['hits'], 16)
+        self.assertEqual(stats['idle'], 4)
+        self.run_async(self.conn.close())
+        self.assertEqual(self.conn._async_conn.size(), 0)
+
+    def test_compress_response(self):
+        conn = AsyncAPIConnection('access_key_id', 'secret_access_key',
+                                  'pek3a', host='127.0.0.1',
+                                  port=self.server.port, protocol='http',
+                                  compress_response=True)
+        resp = self.run_async(conn.describe_instances())
+        self.assertEqual(resp['instance_set'], [{'instance_id': 'i-12345678'}])
+        self.run_async(conn.close())
+
+    def test_https(self):
+        server = LocalHTTPServer(APIRequestHandler, tls=True)
+        conn = AsyncAPIConnection(
+            'access_key_id', 'secret_access_key', 'pek3a', host='localhost',
+            port=server.port,
+            ssl_context=ssl.create_default_context(cafile=LOCALHOST_PEM))
+        try:
+            resp = self.run_async(conn.describe_instances())
+            self.assertEqual(resp['ret_code'], 0)
+            self.run_async(conn.close())
+        finally:
+            server.stop()
+
+    def test_paginate(self):
+        instances = [{'instance_id': 'i-%08d' % i} for i in range(5)]
+        requests = []
+
+        async def send_request(action, body, url="/iaas/", verb="GET"):
+            requests.append((body['offset'], body['limit']))
+            return {'ret_code': 0, 'total_count': len(instances),
+                    'instance_set': instances[body['offset']:
+                                              body['offset'] + body['limit']]}
+
+        async def collect():
+            return [instance async for instance in
+                    self.conn.paginate('describe_instances', page_size=2)]
+
+        self.conn.send_request = send_request
+        self.assertEqual(self.run_async(collect()), instances)
+        self.assertEqual(requests, [(0, 2), (2, 2), (4, 2)])
+
+    def test_paginate_concurrent(self):
+        instances = [{'instance_id': 'i-%08d' % i} for i in range(10)]
+        running = []
+
+        async def send_request(action, body, url="/iaas/", verb="GET"):
+            running.append(body['offset'])
+            # the second page is the last one received
+            await asyncio.sleep(0.1 if body['offset'] == 2 else 0.01)
+            return {'ret_code': 0, 'total_count': len(instances),
+                    'instance_set': instances[body['offset']:
+                                              body['offset'] + body['limit']]}
+
+        async def collect(ordered):
+            return [instance async for instance in self.conn.paginate(
+                'describe_instances', page_size=2, workers=3,
+                ordered=ordered)]
+
+        self.conn.send_request = send_request
+        self.assertEqual(self.run_async(collect(True)), instances)
+        self.assertEqual(sorted(running), [0, 2, 4, 6, 8])
+        unordered = self.run_async(collect(False))
+        self.assertEqual(sorted(unordered, key=lambda i: i['instance_id']),
+                         instances)
+        self.assertEqual(unordered[-2:], instances[2:4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import json
+import time
+import unittest
+from concurrent import futures
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas.batch import BatchExecutor, run_bounded
+from qingcloud.iaas.connection import APIConnection
+from qingcloud.iaas.errors import APIError
+
+
+class InstancesHandler(LocalRequestHandler):
+    """Answer after `delay` seconds, with an error for "i-error"."""
+    delay = 0.02
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        instance = params.get('instances.1', [''])[0]
+        if instance == 'i-slow':
+            time.sleep(0.2)
+        time.sleep(self.delay)
+        body = json.dumps({
+            'action': params['action'][0] + 'Response',
+            'ret_code': 1400 if instance == 'i-error' else 0,
+            'instance_set': [{'instance_id': instance}],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class BatchExecutorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalHTTPServer(InstancesHandler)
+        self.conn = APIConnection('access_key_id', 'secret_access_key',
+                                  'pek3a', host='127.0.0.1',
+                                  port=self.server.port, protocol='http')
+        self.executor = BatchExecutor(self.conn, workers=4)
+
+    def tearDown(self):
+        self.executor.close()
+        self.server.stop()
+
+    def calls(self, instances):
+        return [('describe_instances', {'instances': [instance]})
+                for instance in instances]
+
+    def instance_ids(self, results):
+        return [r.result['instance_set'][0]['instance_id'] for r in results]
+
+    def test_map(self):
+        instances = ['i-%08d' % i for i in range(40)]
+        results = self.executor.map(self.calls(instances))
+        self.assertEqual([r.index for r in results], list(range(40)))
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(self.instance_ids(results), instances)
+        # the calls share the connections of the pool, how many are
+        # created depends on the timing of the threads
+        stats = self.conn._conn.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 40)
+        self.assertGreater(stats['hits'], stats['created'])
+
+    def test_concurrency(self):
+        started = time.time()
+        self.executor.map(self.calls(['i-%08d' % i for i in range(20)]))
+        # 5 rounds of 4 calls rather than 20 calls in sequence
+        self.assertLess(time.time() - started, 20 * InstancesHandler.delay)
+
+    def test_as_completed(self):
+        instances = ['i-slow', 'i-1', 'i-2', 'i-3']
+        results = list(self.executor.run(self.calls(instances),
+                                         ordered=False))
+        self.assertEqual(results[-1].index, 0)
+        self.assertEqual(sorted(self.instance_ids(results)),
+                         sorted(instances))
+
+    def test_errors(self):
+        def fail(**kwargs):
+            raise ValueError('failed')
+
+        calls = self.calls(['i-1', 'i-error']) + [(fail, {})]
+        results = self.executor.map(calls)
+        self.assertTrue(results[0].ok)
+        self.assertIsInstance(results[1].error, APIError)
+        self.assertEqual(results[1].error.err_code, 1400)
+        self.assertEqual(results[1].result['ret_code'], 1400)
+        self.assertIsInstance(results[2].error, ValueError)
+
+    def test_stats(self):
+        self.executor.map(self.calls(['i-1', 'i-2', 'i-error']))
+        stats = self.executor.stats()
+        self.assertEqual(stats['calls'], 3)
+        self.assertEqual(stats['errors'], 1)
+        self.assertGreater(stats['throughput'], 0)
+        self.assertGreaterEqual(stats['latency_p50'], InstancesHandler.delay)
+        self.assertLessEqual(stats['latency_avg'], stats['latency_max'])
+        self.executor.reset_stats()
+        self.assertEqual(self.executor.stats()['calls'], 0)
+
+
+class RunBoundedTestCase(unittest.TestCase):
+
+    def test_window(self):
+        started = {}
+
+        def start(arg):
+            future = started[arg] = futures.Future()
+            if arg == 0:
+                future.set_result(arg)
+            return future
+
+        results = run_bounded(start, range(10), 3)
+        self.assertEqual(next(results).result(), 0)
+        # the next call is started when one is taken
+        self.assertEqual(sorted(started), [0, 1, 2, 3])
+        results.close()
+        self.assertEqual(sorted(started), [0, 1, 2, 3])
+        self.assertTrue(all(started[i].cancelled() for i in (1, 2, 3)))
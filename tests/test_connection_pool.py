@@ -0,0 +1,248 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import time
+import mock
+import unittest
+import threading
+
+from qingcloud.conn.connection import ConnectionQueue, ConnectionPool
+
+
+def _new_conn(ready=True):
+    conn = mock.Mock()
+    response = mock.Mock()
+    response.isclosed.return_value = ready
+    conn._HTTPConnection__response = response
+    return conn
+
+
+class ConnectionQueueTestCase(unittest.TestCase):
+
+    def test_get_conn_lifo(self):
+        queue = ConnectionQueue()
+        conns = [_new_conn() for _ in range(3)]
+        for conn in conns:
+            queue.put_conn(conn)
+        self.assertIs(queue.get_conn(), conns[2])
+        self.assertIs(queue.get_conn(), conns[1])
+        self.assertIs(queue.get_conn(), conns[0])
+        self.assertIsNone(queue.get_conn())
+
+    def test_get_conn_skips_not_ready(self):
+        queue = ConnectionQueue()
+        ready, busy = _new_conn(), _new_conn(ready=False)
+        queue.put_conn(ready)
+        queue.put_conn(busy)
+        self.assertIs(queue.get_conn(), ready)
+        self.assertEqual(queue.size(), 1)
+        self.assertIsNone(queue.get_conn())
+        self.assertEqual(queue.stats['not_ready'], 2)
+        # reused once its response has been read
+        busy._HTTPConnection__response.isclosed.return_value = True
+        self.assertIs(queue.get_conn(), busy)
+        self.assertFalse(busy.close.called)
+
+    def test_busy_conn_not_closed(self):
+        queue = ConnectionQueue(timeout=10, maxsize=1)
+        busy = _new_conn(ready=False)
+        queue.put_conn(busy)
+        queue.put_conn(_new_conn())
+        queue.put_conn(busy)
+        queue.queue[0] = (busy, time.time() - 20)
+        self.assertEqual(queue.clear(), 1)
+        self.assertFalse(busy.close.called)
+        self.assertEqual(queue.stats['evicted'], 2)
+
+    def test_put_conn_maxsize(self):
+        queue = ConnectionQueue(maxsize=2)
+        conns = [_new_conn() for _ in range(3)]
+        for conn in conns:
+            queue.put_conn(conn)
+        self.assertEqual(queue.size(), 2)
+        conns[0].close.assert_called_once_with()
+        self.assertIs(queue.get_conn(), conns[2])
+
+    def test_clear(self):
+        queue = ConnectionQueue(timeout=10)
+        old, new = _new_conn(), _new_conn()
+        queue.put_conn(old)
+        queue.put_conn(new)
+        queue.queue[0] = (old, time.time() - 20)
+        self.assertEqual(queue.clear(), 1)
+        old.close.assert_called_once_with()
+        self.assertIs(queue.get_conn(), new)
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+
+    def test_get_put_conn(self):
+        pool = ConnectionPool()
+        conn = _new_conn()
+        self.assertIsNone(pool.get_conn('host', 443))
+        pool.put_conn('host', 443, conn)
+        self.assertEqual(pool.size(), 1)
+        self.assertIsNone(pool.get_conn('host', 80))
+        self.assertIs(pool.get_conn('host', 443), conn)
+        self.assertEqual(pool.size(), 0)
+
+    def test_max_idle_per_host(self):
+        pool = ConnectionPool(max_idle_per_host=1)
+        for _ in range(3):
+            pool.put_conn('host', 443, _new_conn())
+        pool.put_conn('other', 443, _new_conn())
+        self.assertEqual(pool.size(), 2)
+
+    def test_max_idle(self):
+        pool = ConnectionPool(max_idle=2)
+        conns = [_new_conn() for _ in range(3)]
+        for conn in conns:
+            pool.put_conn('host', 443, conn)
+        self.assertEqual(pool.size(), 2)
+        conns[2].close.assert_called_once_with()
+        # a busy connection is dropped without closing its response
+        busy = _new_conn(ready=False)
+        pool.put_conn('host', 443, busy)
+        self.assertFalse(busy.close.called)
+        self.assertEqual(pool.stats()['evicted'], 2)
+
+    def test_max_idle_thread_safe(self):
+        pool = ConnectionPool(max_idle=4)
+        barrier = threading.Barrier(16)
+
+        def worker(host):
+            barrier.wait()
+            for _ in range(50):
+                pool.put_conn(host, 443, _new_conn())
+
+        threads = [threading.Thread(target=worker, args=('host-%d' % i,))
+                   for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(pool.size(), 4)
+        self.assertEqual(pool.stats()['idle'], 4)
+
+    def test_clear_expired(self):
+        pool = ConnectionPool(timeout=10)
+        pool.put_conn('host', 443, _new_conn())
+        queue = pool.pool[('host', 443)]
+        queue.queue[0] = (queue.queue[0][0], time.time() - 20)
+        pool.last_clear_time = 0
+        self.assertIsNone(pool.get_conn('host', 443))
+        self.assertEqual(pool.size(), 0)
+        self.assertTrue(queue.retired)
+
+    def test_thread_safe(self):
+        pool = ConnectionPool()
+        conns = [_new_conn() for _ in range(8)]
+
+        def worker(conn):
+            for _ in range(200):
+                pool.put_conn('host', 443, conn)
+                conn = pool.get_conn('host', 443)
+                self.assertIsNotNone(conn)
+
+        threads = [threading.Thread(target=worker, args=(conn,))
+                   for conn in conns]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(pool.size(), 0)
+
+    def test_reaper(self):
+        pool = ConnectionPool(timeout=10, reaper=True)
+        conn = _new_conn()
+        pool.put_conn('host', 443, conn)
+        reaper = pool._reaper
+        self.assertTrue(reaper.daemon)
+        self.assertTrue(reaper.is_alive())
+        queue = pool.pool[('host', 443)]
+        queue.queue[0] = (conn, time.time() - 20)
+        pool.last_clear_time = 0
+        # the request path does not clear expired connections
+        pool.get_conn('other', 443)
+        self.assertEqual(pool.size(), 1)
+        pool.clear_expired()
+        conn.close.assert_called_once_with()
+        self.assertEqual(pool.size(), 0)
+        self.assertTrue(queue.retired)
+        pool.close()
+        reaper.join(1)
+        self.assertFalse(reaper.is_alive())
+
+    def test_reaper_expires_in_background(self):
+        pool = ConnectionPool(timeout=0, reaper=True)
+        pool.CLEAR_INTERVAL = 0.01
+        conn = _new_conn()
+        pool.put_conn('host', 443, conn)
+        deadline = time.time() + 5
+        while pool.size() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(pool.size(), 0)
+        conn.close.assert_called_once_with()
+        pool.close()
+
+    def test_after_fork(self):
+        pool = ConnectionPool(reaper=True)
+        conn = _new_conn()
+        pool.put_conn('host', 443, conn)
+        reaper = pool._reaper
+        pool._pid = -1
+        self.assertIsNone(pool.get_conn('host', 443))
+        self.assertFalse(conn.close.called)
+        self.assertIsNone(pool._reaper)
+        reaper.stop()
+
+    def test_stats(self):
+        pool = ConnectionPool(timeout=10, max_idle_per_host=1)
+        events = []
+        pool.add_callback(lambda *args: events.append(args))
+        self.assertIsNone(pool.get_conn('host', 443))
+        pool.record('host', 443, 'created')
+        pool.put_conn('host', 443, _new_conn())
+        pool.put_conn('host', 443, _new_conn(ready=False))
+        self.assertIsNone(pool.get_conn('host', 443))
+        pool.put_conn('host', 443, _new_conn())
+        self.assertIsNotNone(pool.get_conn('host', 443))
+        pool.put_conn('other', 80, _new_conn())
+        pool.record('other', 80, 'dropped')
+        queue = pool.pool[('other', 80)]
+        queue.queue[0] = (queue.queue[0][0], time.time() - 20)
+        pool.clear_expired()
+
+        stats = pool.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['not_ready'], 1)
+        self.assertEqual(stats['evicted'], 2)
+        self.assertEqual(stats['dropped'], 1)
+        self.assertEqual(stats['expired'], 1)
+        self.assertEqual(stats['idle'], 0)
+        self.assertAlmostEqual(stats['hit_rate'], 1.0 / 3)
+        self.assertEqual(stats['hosts']['other:80']['expired'], 1)
+        self.assertEqual(stats['hosts']['host:443']['hits'], 1)
+        self.assertIn(('evicted', 'host', 443, 1), events)
+        self.assertIn(('expired', 'other', 80, 1), events)
+
+        # stats are kept when the host is used again
+        pool.put_conn('other', 80, _new_conn())
+        stats = pool.stats()
+        self.assertEqual(stats['hosts']['other:80']['expired'], 1)
+        self.assertEqual(stats['hosts']['other:80']['idle'], 1)
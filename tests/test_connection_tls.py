@@ -0,0 +1,75 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import ssl
+import unittest
+
+from tests import LOCALHOST_PEM, LocalHTTPServer, LocalRequestHandler
+from qingcloud.conn.connection import HttpConnection, TLSSessionCache
+
+
+class TLSConnectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalHTTPServer(LocalRequestHandler, tls=True)
+        self.context = ssl.create_default_context(cafile=LOCALHOST_PEM)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _request(self, conn):
+        conn.request('GET', '/')
+        response = conn.getresponse()
+        self.assertEqual(response.read(), LocalRequestHandler.body)
+        return conn.sock
+
+    def test_shared_ssl_context(self):
+        connection = HttpConnection('access_key', 'secret_key', 'localhost',
+                                    self.server.port, ssl_context=self.context)
+        conn1 = connection._new_conn('localhost', self.server.port)
+        conn2 = connection._new_conn('localhost', self.server.port)
+        self.assertIs(conn1._context, self.context)
+        self.assertIs(conn2._context, self.context)
+
+    def test_default_ssl_context_created_once(self):
+        connection = HttpConnection('access_key', 'secret_key', 'localhost')
+        self.assertIs(connection.ssl_context, connection.ssl_context)
+
+    def test_tls_session_resumption(self):
+        connection = HttpConnection('access_key', 'secret_key', 'localhost',
+                                    self.server.port, ssl_context=self.context)
+        sock = self._request(connection._new_conn('localhost', self.server.port))
+        self.assertFalse(sock.session_reused)
+        for _ in range(2):
+            conn = connection._new_conn('localhost', self.server.port)
+            self.assertTrue(self._request(conn).session_reused)
+            conn.close()
+
+    def test_tls_session_cache_disabled(self):
+        connection = HttpConnection('access_key', 'secret_key', 'localhost',
+                                    self.server.port, ssl_context=self.context,
+                                    tls_session_cache=False)
+        for _ in range(2):
+            conn = connection._new_conn('localhost', self.server.port)
+            self.assertFalse(self._request(conn).session_reused)
+            conn.close()
+
+    def test_tls_session_cache_maxsize(self):
+        cache = TLSSessionCache(maxsize=2)
+        for i in range(3):
+            cache.put(('host%d' % i, 443), i)
+        self.assertIsNone(cache.get(('host0', 443)))
+        self.assertEqual(cache.get(('host2', 443)), 2)
@@ -0,0 +1,293 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import os
+import json
+import asyncio
+import stat
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import multiprocessing
+try:
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from urllib.parse import urlparse, parse_qs
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.conn.auth import QuerySignatureAuthHandler
+from qingcloud.conn.credentials import Credentials, FileCredentialCache, \
+    InstanceMetadataProvider
+from qingcloud.iaas.connection import APIConnection
+from qingcloud.iaas.async_connection import AsyncAPIConnection
+
+
+class MetadataHandler(LocalRequestHandler):
+    """Stand-in of the metadata service, also answering api requests."""
+    status = 200
+    ttl = 3600
+    delay = 0
+    fetches = 0
+    requests = []
+
+    def do_GET(self):
+        if not self.path.startswith(InstanceMetadataProvider.PATH):
+            self.requests.append(self.path)
+            return LocalRequestHandler.do_GET(self)
+        MetadataHandler.fetches += 1
+        time.sleep(self.delay)
+        document = json.dumps({
+            'id_token': 'token-%d' % self.fetches,
+            'access_key': 'AK%d' % self.fetches,
+            'secret_key': 'secret',
+            'expiration': time.time() + self.ttl,
+        })
+        # the document is escaped in a JSON string
+        body = json.dumps(document).encode()
+        self.send_response(self.status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class InstanceMetadataProviderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        MetadataHandler.status = 200
+        MetadataHandler.ttl = 3600
+        MetadataHandler.delay = 0
+        MetadataHandler.fetches = 0
+        MetadataHandler.requests = []
+        self.server = LocalHTTPServer(MetadataHandler)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _provider(self, **kwargs):
+        provider = InstanceMetadataProvider('127.0.0.1', self.server.port,
+                                            **kwargs)
+        self.addCleanup(provider.close)
+        return provider
+
+    def test_from_metadata(self):
+        credentials = Credentials.from_metadata(
+            '{"access_key": "AK", "secret_key": "SK", "id_token": "T",'
+            ' "expiration": "2013-08-27T14:30:10Z"}')
+        self.assertEqual(credentials.access_key, 'AK')
+        self.assertEqual(credentials.token, 'T')
+        self.assertTrue(credentials.expired())
+
+    def test_get_credentials(self):
+        provider = self._provider(background=False)
+        credentials = provider.get_credentials()
+        self.assertEqual(credentials.access_key, 'AK1')
+        self.assertEqual(credentials.token, 'token-1')
+        self.assertFalse(credentials.expired())
+        # cached until the refresh time
+        self.assertIs(provider.get_credentials(), credentials)
+        self.assertEqual(MetadataHandler.fetches, 1)
+
+    def test_no_stampede(self):
+        MetadataHandler.delay = 0.2
+        provider = self._provider(background=False)
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(provider.get_credentials()))
+            for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(MetadataHandler.fetches, 1)
+        self.assertEqual(set(c.token for c in results), set(['token-1']))
+
+    def test_background_refresh(self):
+        MetadataHandler.ttl = 1
+        provider = self._provider(refresh_before=0.8, retry_interval=0.1)
+        provider.prefetch()
+        deadline = time.time() + 5
+        while MetadataHandler.fetches < 3 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertGreaterEqual(MetadataHandler.fetches, 3)
+        self.assertNotEqual(provider.get_credentials().token, 'token-1')
+
+    def test_stale_while_revalidate(self):
+        provider = self._provider(background=False, retry_interval=60)
+        credentials = provider.get_credentials()
+        MetadataHandler.status = 500
+        provider.refresh()
+        self.assertIsNotNone(provider.last_error)
+        self.assertIs(provider.get_credentials(), credentials)
+        MetadataHandler.status = 200
+        provider.refresh()
+        self.assertIsNone(provider.last_error)
+        self.assertEqual(provider.get_credentials().token, 'token-3')
+
+    def test_no_role(self):
+        MetadataHandler.status = 404
+        provider = self._provider(background=False)
+        self.assertIsNone(provider.get_credentials())
+
+    def test_api_connection(self):
+        MetadataHandler.ttl = 1
+        provider = self._provider(background=False, refresh_before=0.5,
+                                  retry_interval=0)
+        conn = APIConnection(None, None, 'pek3a', host='127.0.0.1',
+                             port=self.server.port, protocol='http',
+                             credential_provider=provider)
+        tokens = []
+        for _ in range(2):
+            self.assertEqual(conn.describe_instances()['ret_code'], 0)
+            request = urlparse(MetadataHandler.requests[-1])
+            self.assertEqual(request.path, '/iam/')
+            params = parse_qs(request.query)
+            tokens.append(params['token'][0])
+            self.assertEqual(params['access_key_id'][0],
+                             'AK%s' % tokens[-1].split('-')[1])
+            time.sleep(0.6)
+        # the token expiring was refreshed between the requests
+        self.assertEqual(tokens, ['token-1', 'token-2'])
+
+    def test_refresh_while_signing(self):
+        conn = APIConnection(None, None, 'pek3a', host='127.0.0.1',
+                             port=self.server.port, protocol='http',
+                             credential_provider=self._provider())
+        old = Credentials('AK1', 'SK1', 'token-1', None)
+        new = Credentials('AK2', 'SK2', 'token-2', None)
+        conn._check_token = lambda: conn._set_credentials(old)
+        build_http_request = conn.build_http_request
+
+        def refresh_and_build(*args):
+            # a background refresh lands while the request is built
+            conn._set_credentials(new)
+            return build_http_request(*args)
+
+        conn.build_http_request = refresh_and_build
+        request = conn._build_request('GET', '/iaas/',
+                                      {'action': 'DescribeInstances'})[0]
+        params = dict(request.params)
+        self.assertEqual((params['access_key_id'], params['token']),
+                         ('AK1', 'token-1'))
+        signature = params.pop('signature')
+        handler = QuerySignatureAuthHandler(conn.host, 'AK1', 'SK1')
+        self.assertEqual(handler._calc_signature(
+            params, 'GET', request.auth_path)[1], signature)
+        self.assertEqual(conn.iam_access_key, 'AK2')
+
+    def test_async_api_connection(self):
+        # the metadata service is requested out of the event loop
+        MetadataHandler.delay = 0.3
+        provider = self._provider(background=False)
+        conn = AsyncAPIConnection(None, None, 'pek3a', host='127.0.0.1',
+                                  port=self.server.port, protocol='http',
+                                  credential_provider=provider)
+        # fetched by the constructor, fetched again by the request
+        provider.credentials = None
+        provider.next_refresh = 0
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.time())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            ticker = asyncio.ensure_future(tick())
+            await asyncio.sleep(0)
+            resp = await conn.describe_instances()
+            ticker.cancel()
+            await conn.close()
+            return resp
+
+        loop = asyncio.new_event_loop()
+        try:
+            resp = loop.run_until_complete(run())
+        finally:
+            loop.close()
+        self.assertEqual(resp['ret_code'], 0)
+        self.assertEqual(MetadataHandler.fetches, 2)
+        self.assertGreater(len(ticks), 10)
+        request = urlparse(MetadataHandler.requests[-1])
+        self.assertEqual(parse_qs(request.query)['access_key_id'], ['AK2'])
+
+
+def _get_token(provider_args, path, queue):
+    provider = InstanceMetadataProvider(
+        *provider_args, background=False, cache=FileCredentialCache(path))
+    queue.put(provider.get_credentials().token)
+
+
+class FileCredentialCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        MetadataHandler.status = 200
+        MetadataHandler.ttl = 3600
+        MetadataHandler.delay = 0
+        MetadataHandler.fetches = 0
+        self.server = LocalHTTPServer(MetadataHandler)
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'credentials')
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_save_load(self):
+        cache = FileCredentialCache(self.path)
+        self.assertIsNone(cache.load())
+        cache.save(Credentials('AK', 'SK', 'T', 1700000000))
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        credentials = cache.load()
+        self.assertEqual((credentials.access_key, credentials.secret_key,
+                          credentials.token, credentials.expiration),
+                         ('AK', 'SK', 'T', 1700000000))
+        # no temporary file is left
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['credentials'])
+
+    def test_load_readable_by_others(self):
+        cache = FileCredentialCache(self.path)
+        cache.save(Credentials('AK', 'SK', 'T', 1700000000))
+        os.chmod(self.path, 0o644)
+        self.assertIsNone(cache.load())
+
+    def test_start_from_cache(self):
+        args = ('127.0.0.1', self.server.port)
+        first = InstanceMetadataProvider(
+            *args, background=False, cache=FileCredentialCache(self.path))
+        self.assertEqual(first.get_credentials().token, 'token-1')
+        second = InstanceMetadataProvider(
+            *args, background=False, cache=FileCredentialCache(self.path))
+        self.assertEqual(second.get_credentials().token, 'token-1')
+        self.assertEqual(MetadataHandler.fetches, 1)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork')
+    def test_one_process_refreshes(self):
+        MetadataHandler.delay = 0.2
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        args = ('127.0.0.1', self.server.port)
+        processes = [context.Process(target=_get_token,
+                                     args=(args, self.path, queue))
+                     for _ in range(8)]
+        for process in processes:
+            process.start()
+        tokens = [queue.get(timeout=10) for _ in processes]
+        for process in processes:
+            process.join()
+        self.assertEqual(set(tokens), set(['token-1']))
+        self.assertEqual(MetadataHandler.fetches, 1)
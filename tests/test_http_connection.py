@@ -0,0 +1,312 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import gzip
+import zlib
+import select
+import socket
+import unittest
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.conn.connection import (ConnectionPool, HttpConnection,
+                                       HTTPRequest, HTTPResponse,
+                                       keepalive_socket_options)
+
+
+class LargeBodyHandler(LocalRequestHandler):
+    body = b'0123456789' * 100000
+
+
+class CompressHandler(LocalRequestHandler):
+    """Compress the body with the encoding given in the path."""
+    body = b'{"ret_code":0,"instance_set":[%s]}' % b','.join(
+        [b'{"instance_id":"i-%08d"}' % i for i in range(20000)])
+    encoders = {
+        '/gzip': gzip.compress,
+        '/deflate': zlib.compress,
+        '/raw-deflate': lambda data: zlib.compress(data)[2:-4],
+    }
+
+    def do_GET(self):
+        accept = 'gzip' in self.headers.get('Accept-Encoding', '')
+        body = self.body
+        encoder = self.encoders.get(self.path)
+        if encoder and accept:
+            body = encoder(body)
+        self.send_response(200)
+        if encoder and accept:
+            self.send_header('Content-Encoding', self.path.strip('/').split('-')[-1])
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TunnelProxyHandler(LocalRequestHandler):
+    """Proxy which tunnels CONNECT requests to the local port asked."""
+    tunnels = []
+
+    def do_CONNECT(self):
+        (_, port) = self.path.rsplit(':', 1)
+        upstream = socket.create_connection(('127.0.0.1', int(port)))
+        self.tunnels.append(self.path)
+        self.send_response(200, 'Connection established')
+        self.end_headers()
+        socks = [self.connection, upstream]
+        while True:
+            readable = select.select(socks, [], [], 5)[0]
+            if not readable:
+                break
+            data = readable[0].recv(65536)
+            if not data:
+                break
+            other = upstream if readable[0] is self.connection else self.connection
+            other.sendall(data)
+        upstream.close()
+        self.close_connection = True
+
+
+class HttpConnectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalHTTPServer(LocalRequestHandler)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _connect(self, connection):
+        conn = connection._new_conn('127.0.0.1', self.server.port)
+        conn.request('GET', '/')
+        self.assertEqual(conn.getresponse().read(), LocalRequestHandler.body)
+        return conn
+
+    def test_default_socket_options(self):
+        connection = HttpConnection('access_key', 'secret_key', protocol='http')
+        sock = self._connect(connection).sock
+        self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+
+    @unittest.skipUnless(hasattr(socket, 'TCP_KEEPIDLE'), 'TCP_KEEPIDLE')
+    def test_keepalive_socket_options(self):
+        options = keepalive_socket_options(idle=120, interval=7, count=4)
+        connection = HttpConnection('access_key', 'secret_key', protocol='http',
+                                    socket_options=options)
+        sock = self._connect(connection).sock
+        self.assertEqual(
+            sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE), 120)
+        self.assertEqual(
+            sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL), 7)
+        self.assertEqual(
+            sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT), 4)
+
+    def test_no_socket_options(self):
+        connection = HttpConnection('access_key', 'secret_key', protocol='http',
+                                    socket_options=[])
+        sock = self._connect(connection).sock
+        self.assertFalse(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+
+    def test_socket_options_with_proxy(self):
+        # the options are set on the socket to the proxy
+        connection = HttpConnection('access_key', 'secret_key', protocol='http')
+        connection.set_proxy('127.0.0.1', self.server.port, protocol='https')
+        conn = connection._new_conn('127.0.0.1', self.server.port)
+        conn.set_tunnel('api.qingcloud.com', 443)
+        tunnels = []
+        conn._tunnel = lambda: tunnels.append(
+            conn.sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+        conn.connect()
+        self.assertEqual(len(tunnels), 1)
+        self.assertTrue(tunnels[0])
+        conn.close()
+
+
+class HTTPResponseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalHTTPServer(LargeBodyHandler)
+        self.connection = HttpConnection('access_key', 'secret_key',
+                                         protocol='http')
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _getresponse(self):
+        conn = self.connection._new_conn('127.0.0.1', self.server.port)
+        conn.request('GET', '/')
+        response = conn.getresponse()
+        self.assertIsInstance(response, HTTPResponse)
+        return response
+
+    def test_read_with_full_pool(self):
+        # the connection is not pooled, but its response is still readable
+        connection = HttpConnection('access_key', 'secret_key',
+                                    host='127.0.0.1', port=self.server.port,
+                                    protocol='http',
+                                    pool=ConnectionPool(max_idle=0))
+        connection.build_http_request = (
+            lambda method, path, params, auth_path, headers, host, data:
+            HTTPRequest(method, 'http', headers, host, self.server.port,
+                        path, params))
+        response = connection.send('GET', '/')
+        self.assertEqual(response.read(), LargeBodyHandler.body)
+
+    def _stream(self):
+        connection = HttpConnection('access_key', 'secret_key',
+                                    host='127.0.0.1', port=self.server.port,
+                                    protocol='http', pool=ConnectionPool())
+        connection.build_http_request = (
+            lambda method, path, params, auth_path, headers, host, data:
+            HTTPRequest(method, 'http', headers, host, self.server.port,
+                        path, params))
+        return connection, connection.send('GET', '/', stream=True)
+
+    def test_stream_pooled_after_read(self):
+        connection, response = self._stream()
+        self.assertEqual(connection._conn.size(), 0)
+        self.assertEqual(b''.join(response.iter_chunks()),
+                         LargeBodyHandler.body)
+        self.assertEqual(connection._conn.size(), 1)
+
+    def test_stream_abort(self):
+        connection, response = self._stream()
+        conn = response._conn
+        self.assertEqual(len(next(response.iter_chunks(100))), 100)
+        response.abort()
+        self.assertIsNone(conn.sock)
+        self.assertTrue(response.isclosed())
+        self.assertEqual(connection._conn.size(), 0)
+
+    def test_read_cached(self):
+        response = self._getresponse()
+        self.assertEqual(response.read(), LargeBodyHandler.body)
+        self.assertEqual(response.read(), LargeBodyHandler.body)
+
+    def test_read_not_cached(self):
+        response = self._getresponse()
+        response.cache_body = False
+        self.assertEqual(response.read(), LargeBodyHandler.body)
+        self.assertEqual(response.read(), b'')
+
+    def test_iter_chunks(self):
+        response = self._getresponse()
+        chunks = list(response.iter_chunks(300000))
+        self.assertEqual([len(chunk) for chunk in chunks],
+                         [300000, 300000, 300000, 100000])
+        self.assertEqual(b''.join(chunks), LargeBodyHandler.body)
+        self.assertEqual(response._cached_response, '')
+
+    def test_readinto(self):
+        response = self._getresponse()
+        buf = bytearray(65536)
+        view = memoryview(buf)
+        data = bytearray()
+        while True:
+            size = response.readinto(view)
+            if not size:
+                break
+            data += view[:size]
+        self.assertEqual(bytes(data), LargeBodyHandler.body)
+
+
+class CompressResponseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalHTTPServer(CompressHandler)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _send(self, path, compress_response=True, stream=False):
+        connection = HttpConnection('access_key', 'secret_key', '127.0.0.1',
+                                    self.server.port, protocol='http',
+                                    compress_response=compress_response)
+        connection.build_http_request = lambda method, path, *args: \
+            HTTPRequest(method, 'http', {}, '127.0.0.1', self.server.port,
+                        path, {})
+        return connection.send('GET', path, stream=stream)
+
+    def test_decode(self):
+        for path in ('/gzip', '/deflate', '/raw-deflate'):
+            response = self._send(path)
+            self.assertIsNotNone(response.getheader('Content-Encoding'))
+            self.assertLess(response.length, len(CompressHandler.body))
+            self.assertEqual(response.read(), CompressHandler.body)
+
+    def test_not_requested(self):
+        response = self._send('/gzip', compress_response=False)
+        self.assertIsNone(response.getheader('Content-Encoding'))
+        self.assertEqual(response.read(), CompressHandler.body)
+
+    def test_decode_incrementally(self):
+        response = self._send('/gzip', stream=True)
+        chunks = list(response.iter_chunks(4096))
+        self.assertTrue(all(len(chunk) == 4096 for chunk in chunks[:-1]))
+        self.assertEqual(b''.join(chunks), CompressHandler.body)
+
+    def test_decode_readinto(self):
+        response = self._send('/deflate', stream=True)
+        buf = bytearray(10000)
+        data = bytearray()
+        while True:
+            size = response.readinto(buf)
+            if not size:
+                break
+            data += buf[:size]
+        self.assertEqual(bytes(data), CompressHandler.body)
+
+
+class ProxyTunnelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalHTTPServer(LocalRequestHandler)
+        self.proxy = LocalHTTPServer(TunnelProxyHandler)
+        TunnelProxyHandler.tunnels = []
+
+    def tearDown(self):
+        self.proxy.stop()
+        self.server.stop()
+
+    def _connection(self):
+        connection = HttpConnection('access_key', 'secret_key', 'localhost',
+                                    self.server.port, protocol='http')
+        connection.set_proxy('127.0.0.1', self.proxy.port, protocol='https')
+        connection.build_http_request = lambda method, path, *args: \
+            HTTPRequest(method, 'http', {}, args[3], self.server.port,
+                        path, {})
+        return connection
+
+    def test_tunnel_reused(self):
+        connection = self._connection()
+        for _ in range(3):
+            response = connection.send('GET', '/')
+            self.assertEqual(response.read(), LocalRequestHandler.body)
+        self.assertEqual(TunnelProxyHandler.tunnels,
+                         ['localhost:%d' % self.server.port])
+        stats = connection._conn.stats()
+        self.assertEqual(stats['tunnels'], 1)
+        self.assertEqual(stats['tunnel_hits'], 2)
+        name = 'localhost:%d via 127.0.0.1:%d' % (self.server.port,
+                                                  self.proxy.port)
+        self.assertEqual(stats['hosts'][name]['hits'], 2)
+
+    def test_tunnel_per_target(self):
+        connection = self._connection()
+        for host in ('localhost', '127.0.0.1', 'localhost'):
+            response = connection.send('GET', '/', host=host)
+            self.assertEqual(response.read(), LocalRequestHandler.body)
+        self.assertEqual(sorted(TunnelProxyHandler.tunnels),
+                         ['127.0.0.1:%d' % self.server.port,
+                          'localhost:%d' % self.server.port])
+        self.assertEqual(connection._conn.stats()['tunnel_hits'], 1)
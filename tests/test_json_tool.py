@@ -15,7 +15,9 @@
 # =========================================================================
 
 import unittest
-from qingcloud.misc.json_tool import json_dump, json_load
+from qingcloud.misc import json_tool
+from qingcloud.misc.json_tool import json_dump, json_load, JSONBackend, \
+    get_json_backend, set_json_backend
 
 
 class JsonToolTestCase(unittest.TestCase):
@@ -49,3 +51,46 @@ class JsonToolTestCase(unittest.TestCase):
         string = '{"int":1,:null,"str":"string"}'
         expected = None
         self.assertEqual(json_load(string), expected)
+
+    def test_json_dump_not_sorted(self):
+        obj = {'b': 1, 'a': 2}
+        self.assertEqual(json_dump(obj), '{"a":2,"b":1}')
+        self.assertEqual(json_dump(obj, sort_keys=False), '{"b":1,"a":2}')
+
+    def test_json_load_bytes(self):
+        string = u'{"int":1,"str":"\u4e2d"}'.encode('utf-8')
+        expected = {'int': 1, 'str': u'\u4e2d'}
+        self.assertEqual(json_load(string), expected)
+
+
+class JsonBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = get_json_backend()
+
+    def tearDown(self):
+        set_json_backend(self.backend)
+
+    def test_default_backend(self):
+        self.assertIn(set_json_backend().name, ('orjson', 'json'))
+
+    def test_stdlib_backend(self):
+        # the single stdlib backend, invalid json is parsed only once
+        self.assertIs(set_json_backend('json'), json_tool._stdlib)
+        self.assertEqual(json_load(b'[1,2]'), [1, 2])
+        self.assertEqual(json_load('{bad'), None)
+
+    def test_custom_backend(self):
+        calls = []
+
+        def loads(json):
+            calls.append(json)
+            raise ValueError(json)
+        set_json_backend(JSONBackend('failing', loads))
+        # falls back to the stdlib when the backend fails
+        self.assertEqual(json_load('{"a":1}'), {'a': 1})
+        self.assertEqual(json_load('{bad'), None)
+        self.assertEqual(len(calls), 2)
+
+    def test_unknown_backend(self):
+        self.assertRaises(KeyError, set_json_backend, 'unknown')
@@ -0,0 +1,175 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import asyncio
+import threading
+import unittest
+
+from qingcloud.iaas.connection import APIConnection
+from qingcloud.iaas.async_connection import (AsyncAPIConnection,
+                                             AsyncResourceLoader)
+from qingcloud.iaas.errors import APIError, InvalidParameterError
+
+
+class FakeSendRequest(object):
+    """Describe the instances asked, but "i-missing"."""
+
+    def __init__(self):
+        self.requests = []
+
+    def response(self, body):
+        self.requests.append(dict(body))
+        if 'i-error' in body['instances']:
+            return {'ret_code': 1400, 'message': 'invalid'}
+        instances = [{'instance_id': i} for i in body['instances']
+                     if i != 'i-missing']
+        return {'ret_code': 0, 'total_count': len(instances),
+                'instance_set': instances[:body['limit']]}
+
+    def __call__(self, action, body, url="/iaas/", verb="GET"):
+        return self.response(body)
+
+
+class ResourceLoaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = APIConnection('access_key_id', 'secret_access_key',
+                                  'pek3a')
+        self.conn.send_request = self.send_request = FakeSendRequest()
+
+    def test_load(self):
+        loader = self.conn.loader('describe_instances', verbose=1)
+        self.assertEqual(loader.load('i-1'), {'instance_id': 'i-1'})
+        self.assertIsNone(loader.load('i-missing'))
+        self.assertEqual(self.send_request.requests[0]['verbose'], 1)
+        self.assertIs(self.conn.loader('describe_instances', verbose=1),
+                      loader)
+        self.assertIsNot(self.conn.loader('describe_instances'), loader)
+
+    def test_invalid_options(self):
+        self.assertRaises(InvalidParameterError, self.conn.loader,
+                          'describe_instances', tags=object())
+        self.assertEqual(self.conn._loaders, {})
+
+    def test_window(self):
+        loader = self.conn.loader('describe_instances', window=0.05)
+        results = {}
+        barrier = threading.Barrier(20)
+
+        def load(i):
+            barrier.wait()
+            results[i] = loader.load('i-%d' % (i % 10))
+
+        threads = [threading.Thread(target=load, args=(i, ))
+                   for i in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.send_request.requests), 1)
+        self.assertEqual(sorted(self.send_request.requests[0]['instances']),
+                         sorted('i-%d' % i for i in range(10)))
+        for i in range(20):
+            self.assertEqual(results[i], {'instance_id': 'i-%d' % (i % 10)})
+        # the callers of the same ID get their own copy
+        self.assertIsNot(results[0], results[10])
+        self.assertEqual(loader.stats(),
+                         {'loads': 20, 'calls': 1, 'pending': 0})
+
+    def test_batch(self):
+        loader = self.conn.loader('describe_instances', max_batch=100,
+                                  window=60)
+        with loader.batch():
+            futures = [loader.submit('i-%d' % i) for i in range(250)]
+            self.assertEqual(self.send_request.requests, [])
+        self.assertEqual([len(r['instances'])
+                          for r in self.send_request.requests],
+                         [100, 100, 50])
+        self.assertEqual([r['limit'] for r in self.send_request.requests],
+                         [100, 100, 100])
+        self.assertEqual([f.result() for f in futures],
+                         [{'instance_id': 'i-%d' % i} for i in range(250)])
+
+    def test_load_many(self):
+        loader = self.conn.loader('describe_volumes')
+        self.conn.send_request = lambda action, body: {
+            'ret_code': 0,
+            'volume_set': [{'volume_id': v} for v in body['volumes']]}
+        self.assertEqual(loader.load_many(['vol-1', 'vol-2']),
+                         [{'volume_id': 'vol-1'}, {'volume_id': 'vol-2'}])
+
+    def test_error(self):
+        loader = self.conn.loader('describe_instances', max_batch=2)
+        futures = [loader.submit(i) for i in ('i-1', 'i-error', 'i-2')]
+        loader.dispatch()
+        self.assertRaises(APIError, futures[0].result)
+        self.assertRaises(APIError, futures[1].result)
+        self.assertEqual(futures[2].result(), {'instance_id': 'i-2'})
+
+    def test_id_key(self):
+        self.conn.send_request = lambda action, body: {
+            'ret_code': 0,
+            'keypair_set': [{'keypair_id': k} for k in body['keypairs']]}
+        # the parameter of describe_key_pairs is "keypairs"
+        loader = self.conn.loader('describe_key_pairs', id_param='keypairs',
+                                  id_key='keypair_id')
+        self.assertEqual(loader.load('kp-1'), {'keypair_id': 'kp-1'})
+
+
+class AsyncResourceLoaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = AsyncAPIConnection('access_key_id', 'secret_access_key',
+                                       'pek3a')
+        self.send_request = FakeSendRequest()
+
+        async def send_request(action, body, url="/iaas/", verb="GET"):
+            await asyncio.sleep(0)
+            return self.send_request.response(body)
+
+        self.conn.send_request = send_request
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_window(self):
+        loader = self.conn.loader('describe_instances')
+        self.assertIsInstance(loader, AsyncResourceLoader)
+
+        async def run():
+            return await asyncio.gather(*[loader.load('i-%d' % i)
+                                          for i in range(10)])
+
+        results = self.loop.run_until_complete(run())
+        self.assertEqual(results, [{'instance_id': 'i-%d' % i}
+                                   for i in range(10)])
+        self.assertEqual(len(self.send_request.requests), 1)
+
+    def test_batch(self):
+        loader = self.conn.loader('describe_instances', max_batch=4)
+
+        async def run():
+            async with loader.batch():
+                futures = [loader.submit('i-%d' % i) for i in range(10)]
+            missing = await loader.load_many(['i-missing'])
+            return [await f for f in futures] + missing
+
+        results = self.loop.run_until_complete(run())
+        self.assertEqual(results, [{'instance_id': 'i-%d' % i}
+                                   for i in range(10)] + [None])
+        self.assertEqual([len(r['instances'])
+                          for r in self.send_request.requests], [4, 4, 2, 1])
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import mock
+import unittest
+try:
+    from urlparse import parse_qsl
+except ImportError:
+    from urllib.parse import parse_qsl
+
+from qingcloud.conn.auth import QuerySignatureAuthHandler, quote_key, \
+    quote_value
+from qingcloud.conn.connection import HTTPRequest
+
+ACCESS_KEY_ID = 'QYACCESSKEYIDEXAMPLE'
+SECRET_ACCESS_KEY = 'SECRETACCESSKEY'
+TIME_STAMP = '2013-08-27T14:30:10Z'
+
+# computed by the signer before quoting was memoized
+QUERY_STRING = 'access_key_id=QYACCESSKEYIDEXAMPLE&action=RunInstances&\
+count=2&image_id=centos7x64&instance_name=web%20server%2F%E4%B8%AD%E6%96%87\
+%20~-_.%2B%26%3D&login_passwd=Passw0rd%40%28%29&signature_method=HmacSHA256&\
+signature_version=1&time_stamp=2013-08-27T14%3A30%3A10Z&version=1&\
+vxnets.1=vxnet-0&vxnets.2=vxnet-abc&zone=pek3a'
+GET_SIGNATURE = 'Mc6mxPNtFLMEu6VNV59OWJpFLy2AvUqFUdNPminYwbs='
+POST_SIGNATURE = 'HyUxOp2cMBRlSRFSV98G5i56PEcxEk0sp6IeAq5TjlU='
+
+
+class QueryAuthTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = QuerySignatureAuthHandler('api.qingcloud.com',
+                                                 ACCESS_KEY_ID,
+                                                 SECRET_ACCESS_KEY)
+
+    def _sign(self, method):
+        params = {'action': 'RunInstances', 'zone': 'pek3a',
+                  'image_id': 'centos7x64',
+                  'instance_name': u'web server/中文 ~-_.+&=', 'count': 2,
+                  'vxnets.1': 'vxnet-0', 'vxnets.2': 'vxnet-abc',
+                  'login_passwd': 'Passw0rd@()'}
+        req = HTTPRequest(method, 'https', {}, 'api.qingcloud.com', 443,
+                          '/iaas/', params)
+        with mock.patch('qingcloud.conn.auth.get_ts', return_value=TIME_STAMP):
+            self.handler.add_auth(req)
+        return req
+
+    def test_get(self):
+        req = self._sign('GET')
+        self.assertEqual(req.params['signature'].decode(), GET_SIGNATURE)
+        self.assertEqual(req.path, '/iaas/?' + QUERY_STRING +
+                         '&signature=Mc6mxPNtFLMEu6VNV59OWJpFLy2AvUqFUdNPminYwbs%3D')
+        self.assertEqual(req.body, '')
+
+    def test_post(self):
+        req = self._sign('POST')
+        self.assertEqual(req.path, '/iaas/')
+        self.assertEqual(req.body, QUERY_STRING +
+                         '&signature=HyUxOp2cMBRlSRFSV98G5i56PEcxEk0sp6IeAq5TjlU%3D')
+        self.assertEqual(req.header['Content-Length'], str(len(req.body)))
+        # the form body carries the signed parameters
+        form = dict(parse_qsl(req.body))
+        self.assertEqual(form.pop('signature'), POST_SIGNATURE)
+        self.assertEqual(form, dict((k, str(v)) for k, v in req.params.items()))
+
+    def test_quote(self):
+        self.assertEqual(quote_key('vxnets.1'), 'vxnets.1')
+        self.assertEqual(quote_key('a b'), 'a%20b')
+        self.assertEqual(quote_value(10), '10')
+        self.assertEqual(quote_value('a-b_c.d~e'), 'a-b_c.d~e')
+        self.assertEqual(quote_value('a/b c\n'), 'a%2Fb%20c%0A')
@@ -0,0 +1,184 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import json
+import mock
+import asyncio
+import unittest
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas import ratelimit
+from qingcloud.iaas.ratelimit import RateLimiter, TokenBucket
+from qingcloud.iaas.connection import APIConnection
+from qingcloud.iaas.async_connection import AsyncAPIConnection
+
+
+class FakeTime(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class ClockTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeTime()
+        patcher = mock.patch.object(ratelimit, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TokenBucketTestCase(ClockTestCase):
+
+    def test_reserve(self):
+        bucket = TokenBucket(10, burst=2)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1)
+        self.assertAlmostEqual(bucket.reserve(), 0.2)
+        self.assertEqual(bucket.waiting(), 2)
+        self.clock.sleep(0.2)
+        self.assertEqual(bucket.waiting(), 0)
+        self.clock.sleep(10)
+        # not refilled above the burst
+        self.assertEqual([bucket.reserve() for _ in range(2)], [0, 0])
+        self.assertAlmostEqual(bucket.reserve(), 0.1)
+
+    def test_throttled(self):
+        bucket = TokenBucket(10)
+        bucket.throttled(0.5, cooldown=1)
+        self.assertEqual(bucket.rate, 5)
+        # the requests in flight are throttled together
+        bucket.throttled(0.5, cooldown=1)
+        self.assertEqual(bucket.rate, 5)
+        for _ in range(10):
+            self.clock.sleep(1)
+            bucket.throttled(0.5, cooldown=1)
+        self.assertEqual(bucket.rate, bucket.min_rate)
+
+    def test_recover(self):
+        bucket = TokenBucket(10)
+        bucket.throttled(0.5)
+        self.clock.sleep(2)
+        bucket.recover(1)
+        self.assertAlmostEqual(bucket.rate, 7)
+        self.clock.sleep(10)
+        bucket.recover(1)
+        self.assertEqual(bucket.rate, 10)
+
+
+class RateLimiterTestCase(ClockTestCase):
+
+    def test_acquire(self):
+        limiter = RateLimiter(rate=10, burst=1)
+        started = self.clock.now
+        for _ in range(11):
+            limiter.acquire('DescribeInstances')
+        self.assertAlmostEqual(self.clock.now - started, 1)
+        self.assertAlmostEqual(limiter.stats()['wait_time'], 1)
+
+    def test_action_rates(self):
+        limiter = RateLimiter(rate=10, action_rates={'RunInstances': 1})
+        self.assertEqual(limiter.reserve('RunInstances'), 0)
+        self.assertAlmostEqual(limiter.reserve('RunInstances'), 1)
+        self.assertEqual(limiter.reserve('DescribeInstances'), 0)
+        stats = limiter.stats()
+        self.assertEqual(stats['actions']['RunInstances']['waiting'], 1)
+        self.assertEqual(stats['waiting'], 0)
+
+    def test_feedback(self):
+        limiter = RateLimiter(rate=10, action_rates={'RunInstances': 2},
+                              increase=0.1)
+        limiter.feedback('RunInstances', 5100)
+        limiter.feedback('RunInstances', 5100)
+        stats = limiter.stats()
+        self.assertEqual(stats['rate'], 5)
+        self.assertEqual(stats['actions']['RunInstances']['rate'], 1)
+        self.assertEqual(stats['throttled'], 2)
+        self.clock.sleep(2)
+        limiter.feedback('DescribeInstances', 0)
+        self.assertAlmostEqual(limiter.stats()['rate'], 7)
+        # not throttled itself
+        self.assertEqual(
+            limiter.stats()['actions']['RunInstances']['rate'], 1)
+
+
+class ThrottleHandler(LocalRequestHandler):
+    """Answer with the queued ret codes, then with 0."""
+    ret_codes = []
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        ret_code = self.ret_codes.pop(0) if self.ret_codes else 0
+        body = json.dumps({'action': params['action'][0] + 'Response',
+                           'ret_code': ret_code}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ConnectionRateLimitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        ThrottleHandler.ret_codes = []
+        self.server = LocalHTTPServer(ThrottleHandler)
+        self.limiter = RateLimiter(rate=100, burst=1)
+        self.limiter.acquire = mock.Mock(wraps=self.limiter.acquire)
+        self.limiter.reserve = mock.Mock(wraps=self.limiter.reserve)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _connection(self, connection_class=APIConnection):
+        return connection_class('access_key_id', 'secret_access_key', 'pek3a',
+                                host='127.0.0.1', port=self.server.port,
+                                protocol='http', rate_limiter=self.limiter)
+
+    def test_limited(self):
+        ThrottleHandler.ret_codes = [5100]
+        conn = self._connection()
+        with mock.patch('time.sleep'):
+            resp = conn.describe_instances()
+        self.assertEqual(resp['ret_code'], 0)
+        # the retry is limited too
+        self.assertEqual(self.limiter.acquire.call_count, 2)
+        self.assertEqual(self.limiter.stats()['throttled'], 1)
+        # recovering since
+        self.assertLess(self.limiter.stats()['rate'], 51)
+
+    def test_async_limited(self):
+        ThrottleHandler.ret_codes = [5100]
+        conn = self._connection(AsyncAPIConnection)
+        loop = asyncio.new_event_loop()
+        try:
+            resp = loop.run_until_complete(conn.describe_instances())
+            loop.run_until_complete(conn.close())
+        finally:
+            loop.close()
+        self.assertEqual(resp['ret_code'], 0)
+        self.assertEqual(self.limiter.reserve.call_count, 2)
+        self.assertEqual(self.limiter.stats()['throttled'], 1)
@@ -0,0 +1,127 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import time
+import socket
+import unittest
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.conn.connection import HttpConnection
+from qingcloud.conn.resolver import DNSCache
+
+
+class FakeResolver(object):
+
+    def __init__(self, records):
+        self.records = records
+        self.lookups = []
+
+    def __call__(self, host, port, family=0, socktype=0):
+        self.lookups.append(host)
+        if host not in self.records:
+            raise socket.gaierror(socket.EAI_NONAME, 'not found')
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (ip, port))
+                for ip in self.records[host]]
+
+
+class DNSCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.resolver = FakeResolver({
+            'api.qingcloud.com': ['10.0.0.1', '10.0.0.2', '10.0.0.3'],
+            'bucket.qingstor.com': ['10.0.1.1'],
+        })
+
+    def _ips(self, addrs):
+        return [addr[4][0] for addr in addrs]
+
+    def test_resolve_cached(self):
+        cache = DNSCache(getaddrinfo=self.resolver)
+        cache.resolve('api.qingcloud.com', 443)
+        cache.resolve('api.qingcloud.com', 443)
+        self.assertEqual(self.resolver.lookups, ['api.qingcloud.com'])
+
+    def test_resolve_round_robin(self):
+        cache = DNSCache(getaddrinfo=self.resolver)
+        firsts = [self._ips(cache.resolve('api.qingcloud.com', 443))[0]
+                  for _ in range(4)]
+        self.assertEqual(firsts, ['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.1'])
+        self.assertEqual(self._ips(cache.resolve('api.qingcloud.com', 443)),
+                         ['10.0.0.2', '10.0.0.3', '10.0.0.1'])
+
+    def test_resolve_ttl(self):
+        cache = DNSCache(ttl=0.01, getaddrinfo=self.resolver)
+        cache.resolve('api.qingcloud.com', 443)
+        time.sleep(0.02)
+        cache.resolve('api.qingcloud.com', 443)
+        self.assertEqual(len(self.resolver.lookups), 2)
+
+    def test_negative_cache(self):
+        cache = DNSCache(getaddrinfo=self.resolver)
+        for _ in range(2):
+            self.assertRaises(socket.gaierror, cache.resolve, 'unknown', 443)
+        self.assertEqual(self.resolver.lookups, ['unknown'])
+
+        cache = DNSCache(negative_ttl=0, getaddrinfo=self.resolver)
+        for _ in range(2):
+            self.assertRaises(socket.gaierror, cache.resolve, 'unknown', 443)
+        self.assertEqual(len(self.resolver.lookups), 3)
+
+    def test_lru_eviction(self):
+        cache = DNSCache(maxsize=1, getaddrinfo=self.resolver)
+        cache.resolve('api.qingcloud.com', 443)
+        cache.resolve('bucket.qingstor.com', 443)
+        self.assertEqual(cache.size(), 1)
+        cache.resolve('api.qingcloud.com', 443)
+        self.assertEqual(self.resolver.lookups.count('api.qingcloud.com'), 2)
+
+    def test_invalidate(self):
+        cache = DNSCache(getaddrinfo=self.resolver)
+        cache.resolve('api.qingcloud.com', 443)
+        cache.resolve('bucket.qingstor.com', 443)
+        cache.invalidate('api.qingcloud.com')
+        self.assertEqual(cache.size(), 1)
+        cache.invalidate()
+        self.assertEqual(cache.size(), 0)
+
+    def test_create_connection(self):
+        server = LocalHTTPServer(LocalRequestHandler)
+        try:
+            resolver = FakeResolver({'api.qingcloud.com': ['127.0.0.1']})
+            cache = DNSCache(getaddrinfo=resolver)
+            connection = HttpConnection('access_key', 'secret_key',
+                                        protocol='http', dns_cache=cache)
+            for _ in range(2):
+                conn = connection._new_conn('api.qingcloud.com', server.port)
+                conn.request('GET', '/')
+                self.assertEqual(conn.getresponse().read(),
+                                 LocalRequestHandler.body)
+                conn.close()
+            self.assertEqual(resolver.lookups, ['api.qingcloud.com'])
+        finally:
+            server.stop()
+
+    def test_create_connection_failed(self):
+        # find a port nobody listens on
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        resolver = FakeResolver({'api.qingcloud.com': ['127.0.0.1']})
+        cache = DNSCache(getaddrinfo=resolver)
+        self.assertRaises(socket.error, cache.create_connection,
+                          ('api.qingcloud.com', port), 1)
+        self.assertEqual(cache.size(), 0)
@@ -0,0 +1,209 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import json
+import mock
+import asyncio
+import unittest
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas import cache
+from qingcloud.iaas.cache import ResponseCache, resource_words
+from qingcloud.iaas.connection import APIConnection
+from qingcloud.iaas.async_connection import AsyncAPIConnection
+
+
+class FakeTime(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def ok(body):
+    return {'ret_code': 0, 'body': body}
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeTime()
+        patcher = mock.patch.object(cache, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = ResponseCache(ttl=60, maxsize=3,
+                                   action_ttls={'DescribeZones': 3600,
+                                                'DescribeJobs': 0})
+
+    def cached(self, action, body, data=b'data'):
+        key, hit = self.cache.get(action, body)
+        if hit is None:
+            self.cache.put(action, key, data, ok(data))
+        return hit
+
+    def test_resource_words(self):
+        self.assertEqual(resource_words('DescribeSecurityGroups'),
+                         ['security', 'group'])
+        self.assertEqual(resource_words('ModifySecurityGroupAttributes'),
+                         ['security', 'group'])
+        self.assertEqual(resource_words('DescribeSecurityGroupIPSets'),
+                         ['security', 'group', 'ip', 'set'])
+        self.assertEqual(resource_words('DeleteDNSAliases'), ['dns', 'alias'])
+        self.assertEqual(resource_words('DeleteAlarmPolicies'),
+                         ['alarm', 'policy'])
+
+    def test_hit(self):
+        body = {'action': 'DescribeImages', 'zone': 'pek3a',
+                'images': ['img-1'], 'req_id': 'a', 'time_stamp': 't1'}
+        self.assertIsNone(self.cached('DescribeImages', body))
+        body.update(req_id='b', time_stamp='t2')
+        self.assertEqual(self.cached('DescribeImages', body), b'data')
+        # other scope, parameters or zone
+        self.assertIsNone(self.cache.get('DescribeImages', body,
+                                         ('other', 'host', 443))[1])
+        self.assertIsNone(self.cached('DescribeImages',
+                                      dict(body, zone='sh1a')))
+        self.assertIsNone(self.cached('DescribeImages',
+                                      dict(body, images=['img-2'])))
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 4))
+
+    def test_ttl(self):
+        self.cached('DescribeImages', {})
+        self.cached('DescribeZones', {})
+        self.clock.now += 61
+        self.assertIsNone(self.cached('DescribeImages', {}))
+        self.assertEqual(self.cached('DescribeZones', {}), b'data')
+        self.assertEqual(self.cache.stats()['expired'], 1)
+
+    def test_not_cached(self):
+        self.cached('DescribeJobs', {})
+        self.cached('GetBalance', {})
+        self.assertEqual(self.cache.stats()['size'], 0)
+        key, _ = self.cache.get('DescribeImages', {})
+        self.cache.put('DescribeImages', key, b'', {'ret_code': 1400})
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_lru(self):
+        for action in ('DescribeImages', 'DescribeVolumes', 'DescribeEips'):
+            self.cached(action, {})
+        self.cached('DescribeImages', {})
+        self.cached('DescribeZones', {})
+        self.assertEqual(self.cache.stats()['evicted'], 1)
+        self.assertEqual(self.cached('DescribeImages', {}), b'data')
+        self.assertIsNone(self.cached('DescribeVolumes', {}))
+
+    def test_invalidate(self):
+        self.cache.maxsize = 10
+        for action in ('DescribeSecurityGroups', 'DescribeSecurityGroupRules',
+                       'DescribeImages', 'DescribeInstances'):
+            self.cached(action, {})
+        self.cache.get('DeleteSecurityGroups', {})
+        self.assertEqual(self.cache.stats()['invalidated'], 2)
+        self.assertEqual(self.cached('DescribeImages', {}), b'data')
+        self.cache.get('ModifyImageAttributes', {})
+        self.assertIsNone(self.cached('DescribeImages', {}))
+        self.assertEqual(self.cached('DescribeInstances', {}), b'data')
+
+    def test_invalidates(self):
+        self.cache.invalidates = {'AttachVolumes': ['DescribeInstances']}
+        self.cached('DescribeInstances', {})
+        self.cache.get('AttachVolumes', {})
+        self.assertIsNone(self.cached('DescribeInstances', {}))
+
+    def test_invalidated_in_flight(self):
+        key, _ = self.cache.get('DescribeImages', {})
+        self.cache.get('DeleteImages', {})
+        self.cache.put('DescribeImages', key, b'stale', ok(b'stale'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+
+class ImagesHandler(LocalRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        self.requests.append(params['action'][0])
+        body = json.dumps({'action': params['action'][0] + 'Response',
+                           'ret_code': 0, 'image_set': [],
+                           'owner': params['access_key_id'][0]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ConnectionCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        ImagesHandler.requests = []
+        self.server = LocalHTTPServer(ImagesHandler)
+        self.cache = ResponseCache()
+        self.conn = APIConnection('access_key_id', 'secret_access_key',
+                                  'pek3a', host='127.0.0.1',
+                                  port=self.server.port, protocol='http',
+                                  response_cache=self.cache)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_cached(self):
+        resp = self.conn.describe_images(provider='system')
+        resp['image_set'].append('modified')
+        self.assertEqual(self.conn.describe_images(provider='system'),
+                         {'action': 'DescribeImagesResponse', 'ret_code': 0,
+                          'image_set': [], 'owner': 'access_key_id'})
+        self.conn.modify_image_attributes('img-1', image_name='name')
+        self.conn.describe_images(provider='system')
+        self.assertEqual(ImagesHandler.requests,
+                         ['DescribeImages', 'ModifyImageAttributes',
+                          'DescribeImages'])
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_accounts(self):
+        other = APIConnection('other_key_id', 'other_secret_access_key',
+                              'pek3a', host='127.0.0.1',
+                              port=self.server.port, protocol='http',
+                              response_cache=self.cache)
+        for _ in range(2):
+            self.assertEqual(self.conn.describe_images()['owner'],
+                             'access_key_id')
+            self.assertEqual(other.describe_images()['owner'],
+                             'other_key_id')
+        self.assertEqual(len(ImagesHandler.requests), 2)
+        self.assertEqual(self.cache.stats()['hits'], 2)
+
+    def test_async_cached(self):
+        conn = AsyncAPIConnection('access_key_id', 'secret_access_key',
+                                  'pek3a', host='127.0.0.1',
+                                  port=self.server.port, protocol='http',
+                                  response_cache=self.cache)
+        loop = asyncio.new_event_loop()
+        try:
+            for _ in range(3):
+                resp = loop.run_until_complete(conn.describe_images())
+                self.assertEqual(resp['ret_code'], 0)
+            loop.run_until_complete(conn.close())
+        finally:
+            loop.close()
+        self.assertEqual(ImagesHandler.requests, ['DescribeImages'])
@@ -0,0 +1,215 @@
+# =========================================================================
+# Copyright 2012-present Yunify, Inc.
+# -------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========================================================================
+
+import json
+import time
+import asyncio
+import threading
+import unittest
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
+
+from tests import LocalHTTPServer, LocalRequestHandler
+from qingcloud.iaas.connection import APIConnection
+from qingcloud.iaas.singleflight import SingleFlight
+from qingcloud.iaas.async_connection import (AsyncAPIConnection,
+                                             AsyncSingleFlight)
+
+
+class SlowHandler(LocalRequestHandler):
+    requests = []
+    delay = 0.2
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        self.requests.append(params['action'][0])
+        time.sleep(self.delay)
+        body = json.dumps({'action': params['action'][0] + 'Response',
+                           'ret_code': 0,
+                           'instance_set': [{'instance_id': 'i-1'}],
+                           'owner': params['access_key_id'][0]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SingleFlightTestCase(unittest.TestCase):
+
+    def test_error(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise ValueError('failed')
+
+        def call(func):
+            try:
+                flight.do('key', func)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call, args=(fail, ))
+        leader.start()
+        started.wait()
+        call(lambda: (b'', {}))
+        leader.join()
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+        self.assertEqual(flight.stats(),
+                         {'calls': 1, 'shared': 1, 'in_flight': 0})
+
+
+    def test_base_exception(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def interrupted():
+            started.set()
+            time.sleep(0.1)
+            raise SystemExit(1)
+
+        def call(func):
+            try:
+                flight.do('key', func)
+            except SystemExit as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call, args=(interrupted, ))
+        leader.start()
+        started.wait()
+        call(lambda: (b'', {}))
+        leader.join()
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+
+
+class ConnectionSingleFlightTestCase(unittest.TestCase):
+
+    def setUp(self):
+        SlowHandler.requests = []
+        self.server = LocalHTTPServer(SlowHandler)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _connection(self, connection_class=APIConnection, single_flight=True,
+                    access_key_id='access_key_id'):
+        return connection_class(access_key_id, 'secret_access_key', 'pek3a',
+                                host='127.0.0.1', port=self.server.port,
+                                protocol='http', single_flight=single_flight)
+
+    def _describe_in_threads(self, conn, count=10):
+        barrier = threading.Barrier(count)
+        results = [None] * count
+
+        def describe(i):
+            barrier.wait()
+            results[i] = conn.describe_instances(instances=['i-1'], verbose=1)
+
+        threads = [threading.Thread(target=describe, args=(i, ))
+                   for i in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_coalesced(self):
+        conn = self._connection()
+        results = self._describe_in_threads(conn)
+        self.assertEqual(SlowHandler.requests, ['DescribeInstances'])
+        self.assertTrue(all(r == results[0] for r in results))
+        # each caller gets its own copy
+        self.assertEqual(len(set(id(r) for r in results)), 10)
+        self.assertEqual(conn.single_flight.stats(),
+                         {'calls': 1, 'shared': 9, 'in_flight': 0})
+        # not in flight anymore
+        conn.describe_instances(instances=['i-1'], verbose=1)
+        self.assertEqual(len(SlowHandler.requests), 2)
+
+    def test_shared(self):
+        conn = self._connection(single_flight=SingleFlight(share=True))
+        results = self._describe_in_threads(conn)
+        self.assertEqual(len(set(id(r) for r in results)), 1)
+
+    def test_accounts(self):
+        flight = SingleFlight()
+        conns = [self._connection(single_flight=flight, access_key_id=key)
+                 for key in ('key_a', 'key_b')]
+        barrier = threading.Barrier(4)
+        owners = []
+
+        def describe(conn):
+            barrier.wait()
+            owners.append((conn.qy_access_key_id,
+                           conn.describe_instances(instances=['i-1'])['owner']))
+
+        threads = [threading.Thread(target=describe, args=(conn, ))
+                   for conn in conns * 2]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(SlowHandler.requests), 2)
+        self.assertTrue(all(key == owner for (key, owner) in owners))
+        self.assertEqual(flight.stats()['shared'], 2)
+
+    def test_not_coalesced(self):
+        conn = self._connection()
+        SlowHandler.delay = 0.05
+        try:
+            barrier = threading.Barrier(2)
+
+            def modify():
+                barrier.wait()
+                conn.modify_instance_attributes('i-1', instance_name='name')
+
+            threads = [threading.Thread(target=modify) for _ in range(2)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            SlowHandler.delay = 0.2
+        self.assertEqual(len(SlowHandler.requests), 2)
+
+    def test_async_coalesced(self):
+        conn = self._connection(AsyncAPIConnection)
+        self.assertIsInstance(conn.single_flight, AsyncSingleFlight)
+
+        async def run():
+            results = await asyncio.gather(*[
+                conn.describe_instances(instances=['i-1'], verbose=1)
+                for _ in range(10)])
+            await conn.close()
+            return results
+
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(run())
+        finally:
+            loop.close()
+        self.assertEqual(SlowHandler.requests, ['DescribeInstances'])
+        self.assertTrue(all(r == results[0] for r in results))
+        self.assertEqual(len(set(id(r) for r in results)), 10)
+        self.assertEqual(conn.single_flight.stats()['shared'], 9)